@@ -0,0 +1,136 @@
+"""
+Check that `04_revenue_enrichment.py --backend duckdb` produces the same
+outputs as the default pandas backend.
+
+Both backends are run as subprocesses on the same data directory (generated
+Olist-shaped data by default, see run_benchmarks.py). Their outputs are then
+compared column by column: the dtypes they read back with must be equal,
+values are exact for ids, text, counts, flags and timestamps, and within
+--rtol for float aggregates (the engines sum in a different order). Exits
+non-zero on any mismatch.
+
+Usage:
+    python benchmarks/check_duckdb_parity.py --scale 1
+    python benchmarks/check_duckdb_parity.py --data-dir data --per-category
+"""
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from run_benchmarks import PROJECT_ROOT, TRANSFORM_DIR, prepare_dataset
+
+STAGE = TRANSFORM_DIR / "04_revenue_enrichment.py"
+OUTPUTS = {
+    "enriched_orders.parquet": None,
+    # ties in revenue may be ordered differently, so compare by category
+    "category_revenue_insights.parquet": "product_category_name",
+}
+
+
+def run_stage(script: Path, data_dir: Path, args: List[str]) -> None:
+    env = dict(os.environ, OLIST_DATA_DIR=str(data_dir))
+    proc = subprocess.run([sys.executable, str(script), *args], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script.name} failed ({' '.join(args)}):\n{proc.stderr[-2000:]}")
+
+
+def normalize(df: pd.DataFrame, sort_by: Optional[str]) -> pd.DataFrame:
+    if sort_by:
+        df = df.sort_values(sort_by, kind="stable")
+    df = df.reset_index(drop=True)
+    for c in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = df[c].astype("datetime64[ns]")
+        elif pd.api.types.is_bool_dtype(df[c]) or str(df[c].dtype) == "boolean":
+            df[c] = df[c].astype(bool)
+        elif pd.api.types.is_integer_dtype(df[c]):
+            df[c] = df[c].astype("int64")
+    return df
+
+
+def compare(expected: pd.DataFrame, actual: pd.DataFrame, rtol: float) -> List[str]:
+    problems = []
+    if list(expected.columns) != list(actual.columns):
+        return [f"columns differ: {list(expected.columns)} vs {list(actual.columns)}"]
+    if len(expected) != len(actual):
+        return [f"row counts differ: {len(expected)} vs {len(actual)}"]
+    for c in expected.columns:
+        try:
+            pd.testing.assert_series_equal(
+                expected[c], actual[c], check_dtype=False, check_exact=not pd.api.types.is_float_dtype(expected[c]),
+                rtol=rtol, atol=0,
+            )
+        except AssertionError as exc:
+            problems.append(f"{c}: {str(exc).splitlines()[0]}")
+    return problems
+
+
+def compare_dtypes(expected: pd.DataFrame, actual: pd.DataFrame) -> List[str]:
+    """Both backends must write the same schema, so the tables read back with the same dtypes."""
+    return [
+        f"{c}: dtype {expected[c].dtype} vs {actual[c].dtype}"
+        for c in expected.columns
+        if c in actual.columns and expected[c].dtype != actual[c].dtype
+    ]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare the duckdb and pandas enrichment backends.")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Data directory with raw/ and processed/ inputs (default: generated data).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale of the generated data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--per-category", action="store_true", help="Compare with per-category thresholds.")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for float columns.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    data_dir = args.data_dir or prepare_dataset(args.workdir, args.scale, args.seed)
+    if args.data_dir is None:
+        # the cleaned orders are an input of enrichment
+        run_stage(TRANSFORM_DIR / "03_clean_orders.py", data_dir, [])
+    extra = ["--per-category"] if args.per_category else []
+    processed = data_dir / "processed"
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        logging.info("Running pandas backend on %s", data_dir)
+        run_stage(STAGE, data_dir, extra)
+        for name in OUTPUTS:
+            shutil.copy2(processed / name, Path(tmp) / name)
+
+        logging.info("Running duckdb backend on %s", data_dir)
+        run_stage(STAGE, data_dir, ["--backend", "duckdb", *extra])
+
+        for name, sort_by in OUTPUTS.items():
+            expected, actual = pd.read_parquet(Path(tmp) / name), pd.read_parquet(processed / name)
+            problems = compare_dtypes(expected, actual)
+            problems += compare(normalize(expected, sort_by), normalize(actual, sort_by), args.rtol)
+            for p in problems:
+                logging.error("%s: %s", name, p)
+            if not problems:
+                logging.info("%s: %d rows match", name, len(expected))
+            failures.extend(problems)
+
+        # leave the default (pandas) outputs in place
+        for name in OUTPUTS:
+            shutil.copy2(Path(tmp) / name, processed / name)
+
+    logging.info("Parity %s", "FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Check that id encoding really encodes, and that it does not change outputs.
+
+First each enrichment input is compacted in-process: every hex id column
+must come out as int64 codes with an IdDictionary and as S16 values with
+binary_ids, and restore_frame must give back the original ids. Then
+`04_revenue_enrichment.py --encode-ids` is run next to a plain run on the
+same data directory (generated Olist-shaped data by default, see
+run_benchmarks.py) and their outputs are compared as in
+check_duckdb_parity.py. Exits non-zero on any mismatch.
+
+Usage:
+    python benchmarks/check_id_encoding.py --scale 1
+    python benchmarks/check_id_encoding.py --data-dir data
+"""
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+from check_duckdb_parity import OUTPUTS, compare, normalize, run_stage
+from run_benchmarks import PROJECT_ROOT, TRANSFORM_DIR, prepare_dataset
+
+sys.path.insert(0, str(TRANSFORM_DIR))
+from schema import ID_COLUMNS, IdDictionary, compact_frame, restore_frame  # noqa: E402
+from storage import find_table, read_table  # noqa: E402
+
+STAGE = TRANSFORM_DIR / "04_revenue_enrichment.py"
+INPUTS = [
+    Path("processed") / "orders_clean.parquet",
+    Path("raw") / "olist_order_items_dataset.csv",
+    Path("processed") / "products_cleaned.parquet",
+]
+
+
+def check_encoding(path: Path) -> List[str]:
+    """compact_frame must encode every id column of `path` and restore_frame must undo it."""
+    df = read_table(path)
+    id_cols = [c for c in ID_COLUMNS if c in df.columns]
+    original = df[id_cols].astype(object)
+    problems = []
+    ids = IdDictionary()
+    for label, encoded, expected in (
+        ("ids", compact_frame(df.copy(), ids=ids), "int64"),
+        ("binary_ids", compact_frame(df.copy(), binary_ids=True), "S16"),
+    ):
+        restored = restore_frame(encoded, ids if label == "ids" else None)
+        for c in id_cols:
+            if encoded[c].dtype != expected:
+                problems.append(f"{path.name} {c} ({label}): dtype {encoded[c].dtype}, expected {expected}")
+            elif not restored[c].astype(object).equals(original[c]):
+                problems.append(f"{path.name} {c} ({label}): restored ids differ")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check id encoding and compare --encode-ids with a plain run.")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Data directory with raw/ and processed/ inputs (default: generated data).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale of the generated data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for float columns.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    data_dir = args.data_dir or prepare_dataset(args.workdir, args.scale, args.seed)
+    if args.data_dir is None:
+        for script in ("02_clean_products.py", "03_clean_orders.py"):
+            run_stage(TRANSFORM_DIR / script, data_dir, [])
+    processed = data_dir / "processed"
+
+    failures = []
+    for rel in INPUTS:
+        problems = check_encoding(find_table(data_dir / rel))
+        if not problems:
+            logging.info("%s: ids encode to int64 and S16 and restore", rel.name)
+        failures.extend(problems)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logging.info("Running without --encode-ids on %s", data_dir)
+        run_stage(STAGE, data_dir, [])
+        for name in OUTPUTS:
+            shutil.copy2(processed / name, Path(tmp) / name)
+
+        logging.info("Running with --encode-ids on %s", data_dir)
+        run_stage(STAGE, data_dir, ["--encode-ids"])
+
+        for name, sort_by in OUTPUTS.items():
+            expected, actual = pd.read_parquet(Path(tmp) / name), pd.read_parquet(processed / name)
+            problems = compare(normalize(expected, sort_by), normalize(actual, sort_by), args.rtol)
+            if not problems:
+                logging.info("%s: %d rows match", name, len(expected))
+            failures.extend(f"{name}: {p}" for p in problems)
+
+        for name in OUTPUTS:
+            shutil.copy2(Path(tmp) / name, processed / name)
+
+    for p in failures:
+        logging.error("%s", p)
+    logging.info("Id encoding %s", "FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Check that `04_revenue_enrichment.py --incremental` matches a full rebuild
+after the inputs change.
+
+A copy of the data directory (generated Olist-shaped data by default, see
+run_benchmarks.py) gets a first --incremental run that records the state.
+Then the raw orders and items are edited in ways that exercise the delta
+logic: changed prices, removed items, removed orders (their items become
+orphans), a new order that 03_clean_orders drops as an impossible delivery,
+and an item without an order_id. The cleaning stage reruns, a plain full run
+rewrites the outputs without touching the state, and the inputs are edited
+once more before the --incremental run. Its outputs are then compared with a
+full rebuild of the same inputs. Exits non-zero on any mismatch.
+
+Outlier thresholds are reused from the run that recorded the state, while a
+full rebuild recomputes them, so the abnormal-item columns are left out of
+the enriched_orders comparison.
+
+Usage:
+    python benchmarks/check_incremental_parity.py --scale 0.1
+    python benchmarks/check_incremental_parity.py --data-dir data
+"""
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from check_duckdb_parity import compare, normalize, run_stage
+from run_benchmarks import PROJECT_ROOT, TRANSFORM_DIR, prepare_dataset
+
+STAGE = TRANSFORM_DIR / "04_revenue_enrichment.py"
+CLEAN_ORDERS = TRANSFORM_DIR / "03_clean_orders.py"
+ORDERS_CSV = Path("raw") / "olist_orders_dataset.csv"
+ITEMS_CSV = Path("raw") / "olist_order_items_dataset.csv"
+OUTPUTS = {
+    "enriched_orders.parquet": None,
+    "category_revenue_insights.parquet": "product_category_name",
+}
+THRESHOLD_COLUMNS = ["abnormal_items_count", "has_abnormal_item"]
+
+
+def edit_inputs(data_dir: Path, rng: np.random.Generator, round_no: int) -> None:
+    """Change prices, drop items and orders, add an impossible-delivery order and an item without order_id."""
+    orders = pd.read_csv(data_dir / ORDERS_CSV, dtype=str)
+    items = pd.read_csv(data_dir / ITEMS_CSV, dtype={"order_id": str})
+
+    bumped = rng.choice(len(items), size=50, replace=False)
+    items.loc[bumped, "price"] = items.loc[bumped, "price"] + 10.0
+
+    removed_items = rng.choice(items["order_id"].dropna().unique(), size=20, replace=False)
+    items = items.loc[~items["order_id"].isin(removed_items)]
+    removed_orders = rng.choice(orders["order_id"].unique(), size=10, replace=False)
+    orders = orders.loc[~orders["order_id"].isin(removed_orders)]
+
+    new_order = orders.dropna(subset=["order_delivered_customer_date"]).iloc[[0]].copy()
+    new_order["order_id"] = f"{round_no:032x}"
+    new_order["order_delivered_customer_date"] = "2016-01-01 00:00:00"
+    new_item = items.iloc[[0, 1]].copy()
+    new_item["order_id"] = [new_order["order_id"].iloc[0], np.nan]
+
+    orders = pd.concat([orders, new_order], ignore_index=True)
+    items = pd.concat([items, new_item], ignore_index=True)
+    orders.to_csv(data_dir / ORDERS_CSV, index=False)
+    items.to_csv(data_dir / ITEMS_CSV, index=False)
+    logging.info("Edited inputs (round %d): %d orders, %d items", round_no, len(orders), len(items))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare an incremental enrichment run with a full rebuild.")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Data directory with raw/ and processed/ inputs (default: generated data). It is copied, not changed.")
+    parser.add_argument("--scale", type=float, default=0.1, help="Scale of the generated data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--threshold-mode", choices=["exact", "sketch"], default="exact")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for float columns.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    source = args.data_dir or prepare_dataset(args.workdir, args.scale, args.seed)
+    extra = ["--threshold-mode", args.threshold_mode]
+    rng = np.random.default_rng(args.seed)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        shutil.copytree(source, data_dir)
+        processed = data_dir / "processed"
+        shutil.rmtree(processed / "state", ignore_errors=True)
+
+        logging.info("Recording the incremental state on %s", data_dir)
+        run_stage(CLEAN_ORDERS, data_dir, [])
+        run_stage(STAGE, data_dir, ["--incremental", *extra])
+
+        # a plain run between the two must not throw the state off
+        edit_inputs(data_dir, rng, 1)
+        run_stage(CLEAN_ORDERS, data_dir, [])
+        run_stage(STAGE, data_dir, extra)
+
+        edit_inputs(data_dir, rng, 2)
+        run_stage(CLEAN_ORDERS, data_dir, [])
+        logging.info("Running the incremental update")
+        run_stage(STAGE, data_dir, ["--incremental", *extra])
+        for name in OUTPUTS:
+            shutil.copy2(processed / name, Path(tmp) / name)
+
+        logging.info("Running the full rebuild")
+        run_stage(STAGE, data_dir, extra)
+
+        for name, sort_by in OUTPUTS.items():
+            expected = normalize(pd.read_parquet(processed / name), sort_by)
+            actual = normalize(pd.read_parquet(Path(tmp) / name), sort_by)
+            if name == "enriched_orders.parquet":
+                expected = expected.drop(columns=THRESHOLD_COLUMNS)
+                actual = actual.drop(columns=THRESHOLD_COLUMNS)
+            problems = compare(expected, actual, args.rtol)
+            for p in problems:
+                logging.error("%s: %s", name, p)
+            if not problems:
+                logging.info("%s: %d rows match", name, len(expected))
+            failures.extend(problems)
+
+    logging.info("Parity %s", "FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Check that the revenue rollup cube counts every order once.
+
+The rollup stage (and the stages it depends on) is run through pipeline.py on
+a data directory (generated Olist-shaped data by default, see
+run_benchmarks.py). `rollup.query` is then compared with a direct groupby of
+the distinct enriched orders: order counts, delivered orders and
+average_delivery_days overall, per customer state and per purchase month.
+Revenue and items are checked against the order items. Exits non-zero on any
+mismatch.
+
+Usage:
+    python benchmarks/check_rollup_totals.py --scale 1
+    python benchmarks/check_rollup_totals.py --data-dir data
+"""
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from run_benchmarks import PROJECT_ROOT, TRANSFORM_DIR, prepare_dataset
+
+sys.path.insert(0, str(TRANSFORM_DIR))
+from rollup import UNKNOWN, load_cube, purchase_months, query  # noqa: E402
+from storage import find_table, read_table  # noqa: E402
+
+MEASURES = ["orders", "delivered_orders", "average_delivery_days"]
+
+
+def build_rollup(data_dir: Path) -> None:
+    env = dict(os.environ, OLIST_DATA_DIR=str(data_dir))
+    cmd = [sys.executable, str(TRANSFORM_DIR / "pipeline.py"), "rollup"]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"pipeline failed:\n{proc.stderr[-2000:]}")
+
+
+def expected_orders(data_dir: Path) -> pd.DataFrame:
+    """Distinct enriched orders with at least one item, with the cube's customer_state and purchase_month."""
+    processed = data_dir / "processed"
+    orders = read_table(
+        find_table(processed / "enriched_orders.parquet"),
+        columns=["order_id", "customer_id", "order_purchase_timestamp", "delivery_days"],
+        parse_dates=["order_purchase_timestamp"],
+    )
+    customers = read_table(find_table(processed / "customers_cleaned.parquet"), columns=["customer_id", "customer_state"])
+    items = read_table(data_dir / "raw" / "olist_order_items_dataset.csv", columns=["order_id"])
+    orders = orders.loc[orders["order_id"].isin(items["order_id"])].drop_duplicates("order_id")
+    orders = orders.merge(customers.drop_duplicates("customer_id"), on="customer_id", how="left")
+    return orders.assign(
+        customer_state=orders["customer_state"].astype(object).fillna(UNKNOWN),
+        purchase_month=purchase_months(orders["order_purchase_timestamp"]).astype(object).fillna(UNKNOWN).to_numpy(),
+        delivery_days=pd.to_numeric(orders["delivery_days"], errors="coerce"),
+    )
+
+
+def direct(orders: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    grouped = orders.groupby(by, sort=True) if by else orders.assign(_all=0).groupby("_all")
+    result = grouped.agg(
+        orders=("order_id", "size"),
+        delivered_orders=("delivery_days", "count"),
+        average_delivery_days=("delivery_days", "mean"),
+    )
+    return result.reset_index(drop=not by)
+
+
+def compare(name: str, expected: pd.DataFrame, actual: pd.DataFrame, by: List[str], rtol: float) -> List[str]:
+    if by:
+        actual = actual.assign(**{d: actual[d].astype(str) for d in by}).sort_values(by).reset_index(drop=True)
+        expected = expected.assign(**{d: expected[d].astype(str) for d in by}).sort_values(by).reset_index(drop=True)
+        if not actual[by].equals(expected[by]):
+            return [f"{name}: groups differ"]
+    problems = []
+    for c in MEASURES:
+        try:
+            pd.testing.assert_series_equal(
+                expected[c].astype("float64"), actual[c].astype("float64"),
+                check_names=False, rtol=rtol, atol=1e-6,
+            )
+        except AssertionError as exc:
+            problems.append(f"{name} {c}: {str(exc).splitlines()[0]}")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare rollup cube totals with distinct enriched orders.")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Data directory with raw/ inputs (default: generated data).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale of the generated data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for the measures.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    data_dir = args.data_dir or prepare_dataset(args.workdir, args.scale, args.seed)
+    logging.info("Building the rollup on %s", data_dir)
+    build_rollup(data_dir)
+
+    cube = load_cube(data_dir / "processed" / "revenue_rollup.parquet")
+    orders = expected_orders(data_dir)
+    failures = []
+    for by in ([], ["customer_state"], ["purchase_month"], ["customer_state", "purchase_month"]):
+        name = " x ".join(by) or "total"
+        problems = compare(name, direct(orders, by), query(cube, by=by), by, args.rtol)
+        if not problems:
+            logging.info("%s: %d group(s) match", name, 1 if not by else orders.groupby(by).ngroups)
+        failures.extend(problems)
+
+    items = read_table(data_dir / "raw" / "olist_order_items_dataset.csv", columns=["order_id", "price"])
+    items = items.loc[items["order_id"].isin(orders["order_id"])]
+    total = query(cube).iloc[0]
+    if int(total["items"]) != len(items):
+        failures.append(f"items: {len(items)} vs {int(total['items'])}")
+    if abs(total["revenue"] - items["price"].sum()) > args.rtol * max(abs(items["price"].sum()), 1.0):
+        failures.append(f"revenue: {items['price'].sum():.2f} vs {total['revenue']:.2f}")
+
+    for p in failures:
+        logging.error("%s", p)
+    logging.info("Rollup totals %s", "FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
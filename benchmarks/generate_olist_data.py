@@ -0,0 +1,256 @@
+"""
+Deterministic generator for Olist-shaped test data.
+
+Writes the raw CSVs the pipeline reads (customers, orders, order_items,
+products, sellers, category translation) plus `processed/products_cleaned.csv`
+under OUT_DIR, using the real column names, key relationships and the quirks
+`codes/validation.py` looks for: missing timestamps, carrier dates after the
+customer delivery date, deliveries before purchase, zero prices, products
+without a category and repeat customers sharing a customer_unique_id.
+
+Scale 1 matches the size of the public Olist extract (99,441 orders).
+
+Usage:
+    python benchmarks/generate_olist_data.py OUT_DIR --scale 10 --seed 42
+"""
+from pathlib import Path
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+BASE_ROWS = {
+    "customers": 99_441,
+    "products": 32_951,
+    "sellers": 3_095,
+}
+ITEMS_PER_ORDER_P = [0.0078, 0.8930, 0.0760, 0.0130, 0.0102]  # 0..4 items per order
+
+# Quirk rates, taken from the counts in data_quality_report.md
+RATE_APPROVED_MISSING = 160 / 99_441
+RATE_CARRIER_MISSING = 1_783 / 99_441
+RATE_DELIVERED_MISSING = 2_965 / 99_441
+RATE_CARRIER_AFTER_CUSTOMER = 23 / 99_441
+RATE_DELIVERED_BEFORE_PURCHASE = 5 / 99_441
+RATE_ZERO_PRICE = 0.001
+RATE_REPEAT_CUSTOMER = 3_345 / 99_441
+RATE_PRODUCT_NO_CATEGORY = 610 / 32_951
+RATE_PRODUCT_NO_DIMENSIONS = 2 / 32_951
+
+ORDER_STATUSES = ["delivered", "shipped", "canceled", "unavailable", "invoiced", "processing", "created", "approved"]
+ORDER_STATUS_P = [0.9702, 0.0111, 0.0063, 0.0061, 0.0032, 0.0030, 0.0001, 0.0000]
+STATES = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "DF", "ES", "GO", "PE", "CE"]
+STATE_P = [0.48, 0.13, 0.12, 0.055, 0.05, 0.037, 0.034, 0.022, 0.02, 0.02, 0.017, 0.015]
+CITIES = ["sao paulo", "rio de janeiro", "belo horizonte", "curitiba", "porto alegre", "campinas", "franca"]
+FALLBACK_CATEGORIES = [
+    ("cama_mesa_banho", "bed_bath_table"),
+    ("beleza_saude", "health_beauty"),
+    ("esporte_lazer", "sports_leisure"),
+    ("moveis_decoracao", "furniture_decor"),
+    ("informatica_acessorios", "computers_accessories"),
+    ("utilidades_domesticas", "housewares"),
+    ("relogios_presentes", "watches_gifts"),
+    ("telefonia", "telephony"),
+]
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+START = np.datetime64("2016-09-04T00:00:00")
+SPAN_SECONDS = 725 * 86_400
+
+TRANSLATION_PATH = Path(__file__).resolve().parents[1] / "data" / "raw" / "product_category_name_translation.csv"
+
+
+def hex_ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n random 32-char lowercase hex ids, vectorized."""
+    raw = rng.bytes(16 * n).hex().encode("ascii")
+    return np.frombuffer(raw, dtype="S32").astype(str).astype(object)
+
+
+def format_ts(values: np.ndarray) -> pd.Series:
+    return pd.Series(pd.to_datetime(values)).dt.strftime(TS_FORMAT)
+
+
+def load_categories() -> pd.DataFrame:
+    if TRANSLATION_PATH.exists():
+        return pd.read_csv(TRANSLATION_PATH, encoding="utf-8-sig")
+    return pd.DataFrame(FALLBACK_CATEGORIES, columns=["product_category_name", "product_category_name_english"])
+
+
+def generate_sellers(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "seller_id": hex_ids(rng, n),
+        "seller_zip_code_prefix": rng.integers(1_000, 99_990, n),
+        "seller_city": rng.choice(CITIES, n),
+        "seller_state": rng.choice(STATES, n, p=STATE_P),
+    })
+
+
+def generate_products(rng: np.random.Generator, n: int, categories: pd.DataFrame) -> pd.DataFrame:
+    products = pd.DataFrame({
+        "product_id": hex_ids(rng, n),
+        "product_category_name": rng.choice(categories["product_category_name"].to_numpy(), n).astype(object),
+        "product_name_lenght": rng.integers(5, 77, n).astype("float64"),
+        "product_description_lenght": rng.integers(4, 3_993, n).astype("float64"),
+        "product_photos_qty": rng.integers(1, 7, n).astype("float64"),
+        "product_weight_g": np.round(rng.lognormal(6.6, 1.2, n)).clip(0, 40_425),
+        "product_length_cm": rng.integers(7, 106, n).astype("float64"),
+        "product_height_cm": rng.integers(2, 106, n).astype("float64"),
+        "product_width_cm": rng.integers(6, 119, n).astype("float64"),
+    })
+    no_category = rng.random(n) < RATE_PRODUCT_NO_CATEGORY
+    products.loc[no_category, [
+        "product_category_name", "product_name_lenght", "product_description_lenght", "product_photos_qty"
+    ]] = np.nan
+    no_dims = rng.random(n) < RATE_PRODUCT_NO_DIMENSIONS
+    products.loc[no_dims, ["product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"]] = np.nan
+    # a few zero weights, as in the public extract
+    products.loc[rng.random(n) < 0.0002, "product_weight_g"] = 0.0
+    return products
+
+
+def generate_customers(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    unique_ids = hex_ids(rng, n)
+    repeat = np.flatnonzero(rng.random(n) < RATE_REPEAT_CUSTOMER)
+    unique_ids[repeat] = unique_ids[rng.integers(0, n, len(repeat))]
+    return pd.DataFrame({
+        "customer_id": hex_ids(rng, n),
+        "customer_unique_id": unique_ids,
+        "customer_zip_code_prefix": rng.integers(1_000, 99_990, n),
+        "customer_city": rng.choice(CITIES, n),
+        "customer_state": rng.choice(STATES, n, p=STATE_P),
+    })
+
+
+def generate_orders(rng: np.random.Generator, customers: pd.DataFrame) -> pd.DataFrame:
+    n = len(customers)
+    second = np.timedelta64(1, "s")
+    purchase = START + rng.integers(0, SPAN_SECONDS, n) * second
+    approved = purchase + rng.integers(60, 2 * 86_400, n) * second
+    carrier = approved + rng.integers(3_600, 5 * 86_400, n) * second
+    delivered = carrier + rng.integers(3_600, 20 * 86_400, n) * second
+    estimated = (purchase + rng.integers(10, 40, n) * np.timedelta64(1, "D")).astype("datetime64[D]")
+
+    swapped = rng.random(n) < RATE_CARRIER_AFTER_CUSTOMER
+    carrier[swapped], delivered[swapped] = delivered[swapped], carrier[swapped]
+    before_purchase = rng.random(n) < RATE_DELIVERED_BEFORE_PURCHASE
+    delivered[before_purchase] = purchase[before_purchase] - rng.integers(3_600, 86_400, before_purchase.sum()) * second
+
+    orders = pd.DataFrame({
+        "order_id": hex_ids(rng, n),
+        "customer_id": customers["customer_id"].to_numpy()[rng.permutation(n)],
+        "order_status": rng.choice(ORDER_STATUSES, n, p=ORDER_STATUS_P),
+        "order_purchase_timestamp": format_ts(purchase),
+        "order_approved_at": format_ts(approved),
+        "order_delivered_carrier_date": format_ts(carrier),
+        "order_delivered_customer_date": format_ts(delivered),
+        "order_estimated_delivery_date": format_ts(estimated),
+    })
+    orders.loc[rng.random(n) < RATE_APPROVED_MISSING, "order_approved_at"] = np.nan
+    orders.loc[rng.random(n) < RATE_CARRIER_MISSING, "order_delivered_carrier_date"] = np.nan
+    orders.loc[rng.random(n) < RATE_DELIVERED_MISSING, "order_delivered_customer_date"] = np.nan
+    return orders
+
+
+def generate_order_items(
+    rng: np.random.Generator,
+    orders: pd.DataFrame,
+    products: pd.DataFrame,
+    sellers: pd.DataFrame,
+) -> pd.DataFrame:
+    counts = rng.choice(len(ITEMS_PER_ORDER_P), len(orders), p=ITEMS_PER_ORDER_P)
+    order_pos = np.repeat(np.arange(len(orders)), counts)
+    n = len(order_pos)
+
+    # item number within each order: position minus the start offset of its order
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    order_item_id = np.arange(n) - starts + 1
+
+    # popular products sell more often (Zipf-like)
+    product_pos = np.minimum(rng.zipf(1.3, n) - 1, len(products) - 1)
+    product_pos = rng.permutation(len(products))[product_pos]
+
+    purchase = pd.to_datetime(orders["order_purchase_timestamp"]).to_numpy()[order_pos]
+    shipping_limit = purchase + rng.integers(2, 8, n) * np.timedelta64(1, "D")
+
+    price = np.round(rng.lognormal(4.3, 0.9, n), 2)
+    price[rng.random(n) < RATE_ZERO_PRICE] = 0.0
+
+    return pd.DataFrame({
+        "order_id": orders["order_id"].to_numpy()[order_pos],
+        "order_item_id": order_item_id,
+        "product_id": products["product_id"].to_numpy()[product_pos],
+        "seller_id": sellers["seller_id"].to_numpy()[rng.integers(0, len(sellers), n)],
+        "shipping_limit_date": format_ts(shipping_limit),
+        "price": price,
+        "freight_value": np.round(rng.gamma(2.0, 10.0, n), 2),
+    })
+
+
+def clean_products_for_benchmark(products: pd.DataFrame) -> pd.DataFrame:
+    """Stand-in for the products cleaning stage, matching the columns of products_cleaned.csv."""
+    cleaned = products.rename(columns={
+        "product_name_lenght": "product_name_length",
+        "product_description_lenght": "product_description_length",
+    })
+    cleaned["product_category_name"] = cleaned["product_category_name"].fillna("unknown")
+    for col in cleaned.columns.drop(["product_id", "product_category_name"]):
+        cleaned[col] = cleaned[col].fillna(cleaned[col].median())
+    cleaned["product_photos_qty"] = cleaned["product_photos_qty"].astype("int64")
+    return cleaned
+
+
+def generate(scale: float = 1.0, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    categories = load_categories()
+    sellers = generate_sellers(rng, max(1, int(BASE_ROWS["sellers"] * scale)))
+    products = generate_products(rng, max(1, int(BASE_ROWS["products"] * scale)), categories)
+    customers = generate_customers(rng, max(1, int(BASE_ROWS["customers"] * scale)))
+    orders = generate_orders(rng, customers)
+    order_items = generate_order_items(rng, orders, products, sellers)
+    return {
+        "customers": customers,
+        "orders": orders,
+        "order_items": order_items,
+        "products": products,
+        "sellers": sellers,
+        "categories": categories,
+    }
+
+
+def write_dataset(out_dir: Path, scale: float = 1.0, seed: int = 42) -> dict:
+    """Generate and write a dataset laid out like `data/` under `out_dir`. Returns row counts."""
+    out_dir = Path(out_dir)
+    raw_dir = out_dir / "raw"
+    processed_dir = out_dir / "processed"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    frames = generate(scale, seed)
+    files = {
+        "customers": "olist_customers_dataset.csv",
+        "orders": "olist_orders_dataset.csv",
+        "order_items": "olist_order_items_dataset.csv",
+        "products": "olist_products_dataset.csv",
+        "sellers": "olist_sellers_dataset.csv",
+        "categories": "product_category_name_translation.csv",
+    }
+    for name, fname in files.items():
+        frames[name].to_csv(raw_dir / fname, index=False)
+        logging.info("Wrote %s (%d rows)", raw_dir / fname, len(frames[name]))
+
+    clean_products_for_benchmark(frames["products"]).to_csv(processed_dir / "products_cleaned.csv", index=False)
+    return {name: len(df) for name, df in frames.items()}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Generate Olist-shaped synthetic data.")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--scale", type=float, default=1.0, help="1 = size of the public Olist extract")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    counts = write_dataset(args.out_dir, args.scale, args.seed)
+    logging.info("Row counts: %s", counts)
+
+
+if __name__ == "__main__":
+    main()
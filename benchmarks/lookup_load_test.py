@@ -0,0 +1,190 @@
+"""
+Load test for src/transform/lookup_service.py.
+
+Replays a mix of order, customer and top-K lookups and reports p50/p90/p99/max
+latency per query kind, plus throughput. Keys are drawn from a Zipf-like
+distribution, so some keys are hot (as with real traffic) and the LRU cache
+is exercised. In-process mode times the service calls directly. --url sends
+the same requests to a running server from --concurrency threads.
+
+When --data-dir is not given, generated data is prepared and the clean and
+enrichment stages are run on it first (see run_benchmarks.py).
+
+Usage:
+    python benchmarks/lookup_load_test.py --scale 1 --requests 100000
+    python benchmarks/lookup_load_test.py --data-dir data --url http://127.0.0.1:8765 --concurrency 8
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from run_benchmarks import PROJECT_ROOT, TRANSFORM_DIR, prepare_dataset
+
+sys.path.insert(0, str(TRANSFORM_DIR))
+from lookup_service import LookupService  # noqa: E402
+
+# query kind -> share of the traffic
+QUERY_MIX = {"order": 0.6, "customer": 0.3, "customer_unique": 0.05, "top": 0.05}
+
+
+def build_dataset(data_dir: Path) -> None:
+    """Run the stages whose outputs the service reads."""
+    env = dict(os.environ, OLIST_DATA_DIR=str(data_dir))
+    cmd = [sys.executable, str(TRANSFORM_DIR / "pipeline.py"), "clean_customers", "enrich"]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"pipeline failed:\n{proc.stderr[-2000:]}")
+
+
+def zipf_sample(rng: np.random.Generator, keys: list, n: int, skew: float) -> list:
+    """n keys where the key of rank r is drawn with probability proportional to 1 / r**skew."""
+    weights = 1.0 / np.arange(1, len(keys) + 1) ** skew
+    picks = rng.choice(len(keys), size=n, p=weights / weights.sum())
+    shuffled = rng.permutation(len(keys))
+    return [keys[i] for i in shuffled[picks]]
+
+
+def make_workload(service: LookupService, n: int, skew: float, seed: int) -> List[Tuple[str, object]]:
+    rng = np.random.default_rng(seed)
+    snapshot = service.snapshot
+    keys = {
+        "order": list(snapshot.order_index),
+        "customer": list(snapshot.customer_index.get("customer_id", {})),
+        "customer_unique": list(snapshot.customer_index.get("customer_unique_id", {})),
+    }
+    mix = {kind: share for kind, share in QUERY_MIX.items() if kind == "top" or keys.get(kind)}
+    kinds = rng.choice(list(mix), size=n, p=np.array(list(mix.values())) / sum(mix.values()))
+    draws = {kind: iter(zipf_sample(rng, pool, n, skew)) for kind, pool in keys.items() if pool}
+    top_k = iter(rng.choice([5, 10, 50, 100], size=n))
+    return [(kind, int(next(top_k)) if kind == "top" else next(draws[kind])) for kind in kinds]
+
+
+def call_service(service: LookupService, kind: str, arg) -> None:
+    if kind == "order":
+        service.order(arg)
+    elif kind == "customer":
+        service.customer_orders(arg)
+    elif kind == "customer_unique":
+        service.customer_orders(arg, key="customer_unique_id")
+    else:
+        service.top_customers(arg)
+
+
+def request_path(kind: str, arg) -> str:
+    if kind == "order":
+        return f"/orders/{quote(arg)}"
+    if kind == "customer":
+        return f"/customers/{quote(arg)}/orders"
+    if kind == "customer_unique":
+        return f"/customers/unique/{quote(arg)}/orders"
+    return f"/top-customers?k={arg}"
+
+
+def call_http(url: str, kind: str, arg) -> None:
+    try:
+        with urlopen(url + request_path(kind, arg)) as response:
+            response.read()
+    except HTTPError as exc:
+        if exc.code != 404:
+            raise
+
+
+def timed(fn, *args) -> int:
+    start = time.perf_counter_ns()
+    fn(*args)
+    return time.perf_counter_ns() - start
+
+
+def run_workload(workload, service: LookupService, url: Optional[str], concurrency: int) -> Tuple[Dict[str, list], float]:
+    latencies: Dict[str, list] = {kind: [] for kind in QUERY_MIX}
+    start = time.perf_counter()
+    if url is None:
+        for kind, arg in workload:
+            latencies[kind].append(timed(call_service, service, kind, arg))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = pool.map(lambda q: (q[0], timed(call_http, url, *q)), workload)
+            for kind, ns in results:
+                latencies[kind].append(ns)
+    return latencies, time.perf_counter() - start
+
+
+def summarize(latencies: Dict[str, list], elapsed: float) -> dict:
+    report = {}
+    everything = []
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        everything.extend(values)
+        report[kind] = percentiles(values)
+    report["all"] = percentiles(everything)
+    report["all"]["throughput_per_s"] = round(len(everything) / elapsed, 1)
+    return report
+
+
+def percentiles(values: list) -> dict:
+    us = np.asarray(values, dtype="float64") / 1000
+    return {
+        "count": len(us),
+        "p50_us": round(float(np.percentile(us, 50)), 1),
+        "p90_us": round(float(np.percentile(us, 90)), 1),
+        "p99_us": round(float(np.percentile(us, 99)), 1),
+        "max_us": round(float(us.max()), 1),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure lookup_service latency percentiles.")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Data directory with processed/ outputs (default: generated data).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale of the generated data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the key popularity.")
+    parser.add_argument("--cache-size", type=int, default=10_000, help="LRU cache entries (0 disables).")
+    parser.add_argument("--url", default=None, help="Query a running server instead of calling in process.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Client threads for --url.")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the report as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = prepare_dataset(args.workdir, args.scale, args.seed)
+        build_dataset(data_dir)
+
+    processed = data_dir / "processed"
+    service = LookupService(processed / "enriched_orders.parquet", processed / "customers_cleaned.parquet",
+                            cache_size=args.cache_size)
+    workload = make_workload(service, args.requests, args.skew, args.seed)
+    url = args.url.rstrip("/") if args.url else None
+    logging.info("Running %d requests %s", len(workload), f"against {url}" if url else "in process")
+
+    latencies, elapsed = run_workload(workload, service, url, args.concurrency)
+    report = summarize(latencies, elapsed)
+    if url is None:
+        report["cache"] = service.health()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
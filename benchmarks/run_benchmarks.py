@@ -0,0 +1,182 @@
+"""
+Benchmark the transform stages on generated Olist-shaped data.
+
+For each scale factor a dataset is generated (once, then reused) under
+WORKDIR/scale_<s>/, and each selected stage is run as a fresh subprocess with
+OLIST_DATA_DIR pointing at it. Wall time, peak RSS of the stage process and
+rows/sec are reported as JSON. Passing --baseline compares against an
+earlier report and exits non-zero if any stage got slower than allowed.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 1 10 --output bench.json
+    python benchmarks/run_benchmarks.py --scales 1 --baseline bench.json --max-regression 0.15
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from generate_olist_data import write_dataset
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TRANSFORM_DIR = PROJECT_ROOT / "src" / "transform"
+
+# stage name -> (script, raw/processed table whose row count is the stage input, accepts --workers,
+#                fixed arguments; --force so unchanged-input skips don't short-circuit a timing run)
+STAGES: Dict[str, tuple] = {
+    "clean_customers": ("01_clean_customers.py", "raw/olist_customers_dataset.csv", False, ["--force"]),
+    "clean_products": ("02_clean_products.py", "raw/olist_products_dataset.csv", False, ["--force"]),
+    "clean_orders": ("03_clean_orders.py", "raw/olist_orders_dataset.csv", True, []),
+    "enrich": ("04_revenue_enrichment.py", "raw/olist_order_items_dataset.csv", True, []),
+}
+
+
+def peak_rss_mb(ru_maxrss: int) -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(ru_maxrss / divisor, 1)
+
+
+def count_rows(path: Path) -> int:
+    with open(path, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def prepare_dataset(workdir: Path, scale: float, seed: int) -> Path:
+    data_dir = workdir / f"scale_{scale:g}"
+    marker = data_dir / ".generated.json"
+    if marker.exists() and json.loads(marker.read_text()) == {"scale": scale, "seed": seed}:
+        logging.info("Reusing generated data in %s", data_dir)
+        return data_dir
+
+    logging.info("Generating scale %g data in %s", scale, data_dir)
+    write_dataset(data_dir, scale, seed)
+    marker.write_text(json.dumps({"scale": scale, "seed": seed}))
+    return data_dir
+
+
+def run_stage(stage: str, data_dir: Path, workers: int, extra_args: List[str]) -> dict:
+    script, input_table, accepts_workers, fixed_args = STAGES[stage]
+    cmd = [sys.executable, str(TRANSFORM_DIR / script), *fixed_args, *extra_args]
+    if accepts_workers and workers > 1:
+        cmd += ["--workers", str(workers)]
+
+    env = dict(os.environ, OLIST_DATA_DIR=str(data_dir))
+    start = time.perf_counter()
+    # stderr goes to a file: a pipe would fill up on a chatty stage and block it while we sit in wait4
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=err)
+        # wait4 gives the resource usage of this child alone, unlike RUSAGE_CHILDREN
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        err.seek(0)
+        stderr = err.read().decode(errors="replace")
+    # reaped by wait4 already; tell Popen so it does not try again
+    returncode = proc.returncode = os.waitstatus_to_exitcode(status)
+    if returncode != 0:
+        raise RuntimeError(f"Stage {stage} failed ({returncode}):\n{stderr[-2000:]}")
+
+    rows = count_rows(data_dir / input_table)
+    return {
+        "stage": stage,
+        "workers": workers,
+        "rows": rows,
+        "wall_seconds": round(wall, 3),
+        "peak_rss_mb": peak_rss_mb(usage.ru_maxrss),
+        "rows_per_sec": round(rows / wall, 1) if wall > 0 else None,
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], max_regression: float) -> List[str]:
+    """Return a message for every (stage, scale, workers) whose wall time regressed beyond the limit."""
+    key = lambda r: (r["stage"], r["scale"], r["workers"])
+    previous = {key(r): r for r in baseline}
+    failures = []
+    for r in results:
+        old = previous.get(key(r))
+        if old is None:
+            continue
+        change = r["wall_seconds"] / old["wall_seconds"] - 1 if old["wall_seconds"] else 0.0
+        r["wall_change_vs_baseline"] = round(change, 3)
+        if change > max_regression:
+            failures.append(
+                f"{r['stage']} @ scale {r['scale']:g}: {old['wall_seconds']}s -> {r['wall_seconds']}s "
+                f"(+{change:.0%}, limit {max_regression:.0%})"
+            )
+    return failures
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark transform stages on generated data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--stages", nargs="+", choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, default=PROJECT_ROOT / "benchmarks" / ".data")
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON report here (default: stdout).")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier JSON report to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed wall-time increase vs. --baseline, as a fraction (default: 0.2).")
+    parser.add_argument("--stage-args", nargs=argparse.REMAINDER, default=[],
+                        help="Extra arguments passed to every stage (must come last).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+
+    results = []
+    for scale in args.scales:
+        data_dir = prepare_dataset(args.workdir, scale, args.seed)
+        for stage in args.stages:
+            runs = [run_stage(stage, data_dir, args.workers, args.stage_args) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["wall_seconds"])
+            best["scale"] = scale
+            results.append(best)
+            logging.info("%s @ scale %g: %.2fs, %.0f MB peak, %.0f rows/s",
+                         stage, scale, best["wall_seconds"], best["peak_rss_mb"], best["rows_per_sec"] or 0)
+
+    report = {
+        "meta": {
+            "created_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    failures = []
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        failures = compare(results, baseline, args.max_regression)
+
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(text, encoding="utf-8")
+        logging.info("Wrote benchmark report to: %s", args.output)
+    else:
+        print(text)
+
+    for message in failures:
+        logging.error("Regression: %s", message)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
 import os
-import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "transform"))
+from profiling import profile_table
 
 RAW_DIR = "data/raw"
 DOCS_DIR = "docs"
@@ -15,37 +19,49 @@ FILES = {
     "products": "olist_products_dataset.csv"
 }
 
+PRIMARY_KEYS = {
+    "customers": ["customer_id"],
+    "orders": ["order_id"],
+    "order_items": ["order_id", "order_item_id"],
+    "products": ["product_id"],
+}
+
 def explore_table(name, filename):
     print(f"\nExploring {name}...")
 
+    # one chunked pass collects every statistic below
     path = os.path.join(RAW_DIR, filename)
-    df = pd.read_csv(path)
+    profile = profile_table(path, name=name, pk=PRIMARY_KEYS[name])
 
-    print("Shape:", df.shape)
-    print("Data types:\n", df.dtypes)
-    print("Missing values:\n", df.isnull().sum())
-    print("Duplicate rows:", df.duplicated().sum())
+    print("Shape:", (profile["rows"], profile["cols"]))
+    print("Data types:")
+    for col, dt in profile["dtypes"].items():
+        print(f"  {col}: {dt}")
+    print("Missing values:")
+    for col, n in profile["nulls"].items():
+        print(f"  {col}: {n}")
+    print("Duplicate rows:", profile["duplicate_rows"])
 
     # Primary key check
-    if "id" in df.columns[0]:
-        print("First column unique?:", df[df.columns[0]].is_unique)
+    is_unique, unique_count, total = profile["pk_check"]
+    print(f"Primary key {PRIMARY_KEYS[name]} unique?: {is_unique} ({unique_count} / {total})")
 
-    # Save sample for teammates
+    # Save a uniform random sample for teammates (head() is biased toward the oldest rows)
     sample_path = os.path.join(SAMPLES_DIR, f"{name}_sample.csv")
-    df.head(1000).to_csv(sample_path, index=False)
+    profile["sample"].to_csv(sample_path, index=False)
     print(f"Sample saved to {sample_path}")
 
-    return df
+    return profile
 
 summary_text = "# Data Understanding\n\n"
 
 for name, file in FILES.items():
-    df = explore_table(name, file)
+    profile = explore_table(name, file)
 
     summary_text += f"## {name}\n"
-    summary_text += f"- Rows: {df.shape[0]}\n"
-    summary_text += f"- Columns: {df.shape[1]}\n"
-    summary_text += f"- Duplicate rows: {df.duplicated().sum()}\n\n"
+    summary_text += f"- Rows: {profile['rows']}\n"
+    summary_text += f"- Columns: {profile['cols']}\n"
+    summary_text += f"- Duplicate rows: {profile['duplicate_rows']}\n\n"
 
 # Save data_understanding.md
 with open("docs/data_understanding.md", "w") as f:
@@ -54,10 +70,12 @@ with open("docs/data_understanding.md", "w") as f:
 # Create simple data contract file
 with open("docs/data_contract.md", "w") as f:
     f.write("# Data Contract\n\n")
-    f.write("Cleaned datasets must be saved in data/processed/\n")
+    f.write("Cleaned datasets must be saved in data/processed/ as zstd-compressed Parquet\n")
+    f.write("(CSV copies are only written when a stage is run with `--csv-export`):\n")
     f.write("- customers_cleaned.parquet\n")
     f.write("- products_cleaned.parquet\n")
-    f.write("- orders_cleaned.parquet\n")
-    f.write("- orders_enriched.parquet\n")
+    f.write("- orders_clean.parquet\n")
+    f.write("- enriched_orders.parquet\n")
+    f.write("- category_revenue_insights.parquet\n")
 
 print("\nDONE ✅ Documentation files created.")
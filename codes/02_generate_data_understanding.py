@@ -1,6 +1,10 @@
 # src/ingest/02_generate_data_understanding.py
 import os
-import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "transform"))
+from profiling import profile_table
 
 RAW_DIR = "data/raw"
 OUT_MD = "docs/data_understanding.md"
@@ -10,59 +14,26 @@ FILES = {
     "order_items": "olist_order_items_dataset.csv",
     "products": "olist_products_dataset.csv"
 }
+# candidate PKs
+PRIMARY_KEYS = {
+    "customers": ["customer_id"],
+    "orders": ["order_id"],
+    "order_items": ["order_id", "order_item_id"],
+    "products": ["product_id"],
+}
 
 os.makedirs(os.path.dirname(OUT_MD), exist_ok=True)
 
-def load_df(fname):
-    path = os.path.join(RAW_DIR, fname)
-    return pd.read_csv(path, low_memory=False)
-
-def pk_check(df, key_cols):
-    # returns (is_unique, unique_count, total_count)
-    if isinstance(key_cols, (list, tuple)):
-        unique_count = df.drop_duplicates(subset=key_cols).shape[0]
-    else:
-        unique_count = df[key_cols].nunique()
-    total = df.shape[0]
-    is_unique = unique_count == total
-    return is_unique, unique_count, total
-
-def basic_summary(df):
-    return {
-        "rows": df.shape[0],
-        "cols": df.shape[1],
-        "dtypes": df.dtypes.astype(str).to_dict(),
-        "nulls": df.isnull().sum().to_dict(),
-        "sample_head": df.head(5).to_dict(orient="records")
-    }
-
 summary = {}
 
 for name, fname in FILES.items():
+    path = os.path.join(RAW_DIR, fname)
     try:
-        df = load_df(fname)
+        # single chunked pass: rows, dtypes, nulls, PK check, distinct counts, ranges, sample
+        summary[name] = profile_table(path, name=name, pk=PRIMARY_KEYS[name], sample_size=5)
     except FileNotFoundError:
         print(f"Missing {fname} in {RAW_DIR}, skipping.")
         summary[name] = {"error": "file not found"}
-        continue
-
-    s = basic_summary(df)
-
-    # candidate PKs
-    if name == "customers":
-        s["pk"] = ("customer_id",)  # candidate
-        s["pk_check"] = pk_check(df, "customer_id")
-    elif name == "orders":
-        s["pk"] = ("order_id",)
-        s["pk_check"] = pk_check(df, "order_id")
-    elif name == "order_items":
-        s["pk"] = ("order_id", "order_item_id")
-        s["pk_check"] = pk_check(df, ["order_id", "order_item_id"])
-    elif name == "products":
-        s["pk"] = ("product_id",)
-        s["pk_check"] = pk_check(df, "product_id")
-
-    summary[name] = s
 
 # --- Write markdown file (skeleton + auto findings)
 with open(OUT_MD, "w", encoding="utf-8") as f:
@@ -93,9 +64,16 @@ with open(OUT_MD, "w", encoding="utf-8") as f:
         f.write("\n- dtypes (first 10):\n")
         for col, dt in list(s["dtypes"].items())[:10]:
             f.write(f"  - {col}: {dt}\n")
-        f.write("\n- Sample head (first 5 rows):\n")
+        f.write("\n- Approximate distinct values and range (first 10):\n")
+        for col in list(s["dtypes"])[:10]:
+            f.write(f"  - {col}: ~{s['distinct_approx'][col]} distinct, min {s['min'][col]}, max {s['max'][col]}\n")
+        if s["histograms"]:
+            f.write("\n- Numeric deciles (approximate):\n")
+            for col, edges in s["histograms"].items():
+                f.write(f"  - {col}: " + ", ".join(f"{e:g}" for e in edges) + "\n")
+        f.write("\n- Sample rows (5 random rows):\n")
         f.write("```\n")
-        for row in s["sample_head"]:
+        for row in s["sample"].to_dict(orient="records"):
             f.write(str(row) + "\n")
         f.write("```\n\n")
 
@@ -1,31 +1,54 @@
-import pandas as pd
-
-raw = "data/raw"
-customers = pd.read_csv(f"{raw}/olist_customers_dataset.csv")
-orders = pd.read_csv(f"{raw}/olist_orders_dataset.csv")
-order_items = pd.read_csv(f"{raw}/olist_order_items_dataset.csv")
-products = pd.read_csv(f"{raw}/olist_products_dataset.csv")
-
-# 1) Referential integrity counts
-missing_orders_customers = orders[~orders['customer_id'].isin(customers['customer_id'])].shape[0]
-missing_items_orders = order_items[~order_items['order_id'].isin(orders['order_id'])].shape[0]
-missing_items_products = order_items[~order_items['product_id'].isin(products['product_id'])].shape[0]
-
-print("orders.customer_id missing in customers:", missing_orders_customers)
-print("order_items.order_id missing in orders:", missing_items_orders)
-print("order_items.product_id missing in products:", missing_items_products)
-
-# 2) Duplicate checks
-print("customers duplicate customer_id:", customers['customer_id'].duplicated().sum())
-print("orders duplicate order_id:", orders['order_id'].duplicated().sum())
-print("order_items duplicate composite key:", order_items.duplicated(subset=['order_id','order_item_id']).sum())
-
-# 3) Negative price/freight
-print("order_items price <=0:", (order_items['price'] <= 0).sum())
-print("order_items freight_value < 0:", (order_items['freight_value'] < 0).sum())
-
-# 4) Date parsing failures example (orders)
-for col in ['order_purchase_timestamp','order_approved_at','order_delivered_customer_date','order_delivered_carrier_date','order_estimated_delivery_date']:
-    parsed = pd.to_datetime(orders[col], errors='coerce')
-    failures = parsed.isna().sum()
-    print(f"{col} parse failures (NaT):", failures)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "transform"))
+from validation_rules import ForeignKey, NotNull, Range, TimestampOrder, Unique, validate
+
+raw = Path("data/raw")
+summary_path = Path("docs/validation_results/raw_checks_summary.csv")
+
+tables = {
+    "customers": raw / "olist_customers_dataset.csv",
+    "orders": raw / "olist_orders_dataset.csv",
+    "order_items": raw / "olist_order_items_dataset.csv",
+    "products": raw / "olist_products_dataset.csv",
+}
+date_cols = ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_customer_date',
+             'order_delivered_carrier_date', 'order_estimated_delivery_date']
+
+rules = [
+    # 1) Referential integrity counts
+    ForeignKey("orders", "customer_id", "customers", name="orders.customer_id missing in customers"),
+    ForeignKey("order_items", "order_id", "orders", name="order_items.order_id missing in orders"),
+    ForeignKey("order_items", "product_id", "products", name="order_items.product_id missing in products"),
+    # 2) Duplicate checks
+    Unique("customers", "customer_id", name="customers duplicate customer_id"),
+    Unique("orders", "order_id", name="orders duplicate order_id"),
+    Unique("order_items", ["order_id", "order_item_id"], name="order_items duplicate composite key"),
+    # repeat buyers: expected, reported but not an error
+    Unique("customers", "customer_unique_id", name="customers duplicate customer_unique_id", severity="warn"),
+    NotNull("orders", "order_id", name="orders null order_id"),
+    NotNull("order_items", "product_id", name="order_items null product_id"),
+    # 3) Negative price/freight
+    Range("order_items", "price", min=0, min_inclusive=False, name="order_items price <=0"),
+    Range("order_items", "freight_value", min=0, name="order_items freight_value < 0"),
+    # 4) Timestamp order (swapped carrier/customer delivery dates)
+    TimestampOrder("orders", "order_purchase_timestamp", "order_approved_at",
+                   name="orders approved before purchase", severity="warn"),
+    TimestampOrder("orders", "order_delivered_carrier_date", "order_delivered_customer_date",
+                   name="orders delivered to customer before carrier", severity="warn"),
+]
+
+report = validate(tables, rules, timestamp_columns={"orders": date_cols}, workers=4)
+
+for r in report.results:
+    print(f"{r['rule']}:", r["failed"])
+
+# Date parsing failures (orders)
+for col, counts in report.parse_failures["orders"].items():
+    print(f"{col} parse failures (NaT):", counts["null"] + counts["invalid"], f"(missing: {counts['null']}, unparseable: {counts['invalid']})")
+
+summary_path.parent.mkdir(parents=True, exist_ok=True)
+report.to_frame().to_csv(summary_path, index=False)
+print("Saved validation summary to:", summary_path)
+print("Validation", "passed" if report.passed else "FAILED")
@@ -4,7 +4,7 @@ CREATE DATABASE ecommerce_project;
 SET search_path = public;  -- or ecommerce if you created that schema
 
 CREATE TABLE IF NOT EXISTS stg_customers (
-  customer_id               TEXT,
+  customer_id               TEXT PRIMARY KEY,
   customer_unique_id        TEXT,
   customer_zip_code_prefix  TEXT,
   customer_city             TEXT,
@@ -13,7 +13,7 @@ CREATE TABLE IF NOT EXISTS stg_customers (
 );
 
 CREATE TABLE IF NOT EXISTS stg_products (
-  product_id                 TEXT,
+  product_id                 TEXT PRIMARY KEY,
   product_category_name      TEXT,
   product_name_lenght        INT,
   product_description_lenght INT,
@@ -25,7 +25,7 @@ CREATE TABLE IF NOT EXISTS stg_products (
 );
 
 CREATE TABLE IF NOT EXISTS stg_orders (
-  order_id                        TEXT,
+  order_id                        TEXT PRIMARY KEY,
   customer_id                     TEXT,
   order_status                    TEXT,
   order_purchase_timestamp        TIMESTAMP,
@@ -40,4 +40,7 @@ CREATE TABLE IF NOT EXISTS stg_order_revenue (
   total_freight   NUMERIC,
   items_count     INT,
   avg_item_price  NUMERIC
-);
\ No newline at end of file
+);
+
+-- stg_orders.customer_id is the join key for the customer integrity check
+CREATE INDEX IF NOT EXISTS stg_orders_customer_id_idx ON stg_orders (customer_id);
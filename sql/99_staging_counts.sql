@@ -1,4 +1,5 @@
 -- one-row-per-check summary (returns text values so they export cleanly)
+-- src/transform/staging_checks.py runs each branch as its own query, in parallel
 SELECT 'current_database' AS check_name, current_database()::text AS value
 UNION ALL
 SELECT 'stg_customers_rows', COUNT(*)::text FROM stg_customers
@@ -13,6 +14,6 @@ SELECT 'missing_order_id', (SELECT COUNT(*) FROM stg_order_revenue WHERE order_i
 UNION ALL
 SELECT 'duplicate_order_ids_count', (SELECT COUNT(*) FROM (SELECT order_id FROM stg_order_revenue GROUP BY order_id HAVING COUNT(*)>1) t)::text
 UNION ALL
-SELECT 'revenue_not_in_orders', (SELECT COUNT(*) FROM stg_order_revenue r LEFT JOIN stg_orders o ON r.order_id=o.order_id WHERE o.order_id IS NULL)::text
+SELECT 'revenue_not_in_orders', (SELECT COUNT(*) FROM stg_order_revenue r WHERE NOT EXISTS (SELECT 1 FROM stg_orders o WHERE o.order_id=r.order_id))::text
 UNION ALL
-SELECT 'orders_with_missing_customer', (SELECT COUNT(*) FROM (SELECT DISTINCT customer_id FROM stg_orders) o LEFT JOIN stg_customers c ON o.customer_id=c.customer_id WHERE c.customer_id IS NULL)::text;
\ No newline at end of file
+SELECT 'orders_with_missing_customer', (SELECT COUNT(*) FROM (SELECT DISTINCT customer_id FROM stg_orders) o WHERE NOT EXISTS (SELECT 1 FROM stg_customers c WHERE c.customer_id=o.customer_id))::text;
\ No newline at end of file
@@ -0,0 +1,141 @@
+from pathlib import Path
+import argparse
+import os
+import pandas as pd
+import logging
+from typing import List, Optional, Tuple
+
+from instrumentation import StageMetrics
+from schema import compact_frame, restore_frame, zip_prefixes
+from storage import csv_path, find_table, read_table, stage_is_current, write_stage_manifest, write_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+RAW_DIR = DATA_DIR / "raw"
+PROCESSED_DIR = DATA_DIR / "processed"
+PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+CUSTOMERS_RAW = RAW_DIR / "olist_customers_dataset.csv"
+CUSTOMERS_CLEAN_PATH = PROCESSED_DIR / "customers_cleaned.parquet"
+
+HEX_ID_PATTERN = r"[0-9a-f]{32}"
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+
+def normalize_location(df: pd.DataFrame) -> pd.DataFrame:
+    """Lower-case city names, upper-case state codes and zero-pad the zip prefix to 5 digits."""
+    df["customer_city"] = df["customer_city"].astype("string").str.strip().str.lower().astype(object)
+    df["customer_state"] = df["customer_state"].astype("string").str.strip().str.upper().astype(object)
+    df["customer_zip_code_prefix"] = zip_prefixes(df["customer_zip_code_prefix"])
+    return df
+
+
+def validate_customer_ids(df: pd.DataFrame) -> Tuple[pd.DataFrame, int, int]:
+    ids = df["customer_id"].astype("string").str.strip().str.lower()
+    valid = ids.str.fullmatch(HEX_ID_PATTERN).fillna(False).to_numpy(dtype=bool)
+    invalid = int((~valid).sum())
+    df["customer_id"] = ids.astype(object)
+    df = df.loc[valid]
+    if invalid:
+        logging.warning("Invalid customer_id rows dropped: %d", invalid)
+
+    dup = int(df["customer_id"].duplicated().sum())
+    if dup:
+        logging.warning("Duplicate customer_id rows: %d (keeping first)", dup)
+        df = df.drop_duplicates(subset=["customer_id"], keep="first")
+    return df, invalid, dup
+
+
+def clean_customers(customers: pd.DataFrame, metrics: Optional[StageMetrics] = None) -> Tuple[pd.DataFrame, dict]:
+    metrics = metrics or StageMetrics("clean_customers")
+    rows_read = len(customers)
+
+    with metrics.step("standardize", rows_in=rows_read):
+        customers = standardize_columns(customers)
+        customers = normalize_location(customers)
+
+    with metrics.step("validate_ids", rows_in=len(customers)) as step:
+        customers, invalid, dup = validate_customer_ids(customers)
+        step.rows_out = len(customers)
+
+    # Repeat buyers share a customer_unique_id; these rows are kept on purpose
+    # for lifetime metrics (see data_quality_report.md)
+    repeat = int(customers["customer_unique_id"].duplicated().sum())
+    logging.info("Duplicate customer_unique_id (kept, repeat buyers): %d", repeat)
+
+    summary = {
+        "rows_read": rows_read,
+        "rows_kept": len(customers),
+        "invalid_ids": invalid,
+        "duplicates": dup,
+        "repeat_unique_ids": repeat,
+    }
+    return customers, summary
+
+
+def log_summary(summary: dict) -> None:
+    logging.info("----- SUMMARY -----")
+    logging.info("Rows processed: %d", summary["rows_read"])
+    logging.info("Rows kept: %d", summary["rows_kept"])
+    logging.info("Invalid customer_id dropped: %d", summary["invalid_ids"])
+    logging.info("Duplicate customer_id dropped: %d", summary["duplicates"])
+    logging.info("Duplicate customer_unique_id kept: %d", summary["repeat_unique_ids"])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Clean the raw Olist customers table.")
+    parser.add_argument(
+        "--csv-export", action="store_true",
+        help="Also write a CSV copy of the cleaned customers next to the Parquet output.",
+    )
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the input is unchanged.")
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    # the raw table may also come as Parquet/Arrow with the same stem
+    raw_path = find_table(CUSTOMERS_RAW)
+    # the stage script plus the helpers that shape its output
+    code = [Path(__file__)] + [Path(__file__).with_name(m) for m in ("schema.py", "storage.py")]
+    extra_outputs = [csv_path(CUSTOMERS_CLEAN_PATH)] if args.csv_export else []
+
+    if not args.force and stage_is_current([raw_path], CUSTOMERS_CLEAN_PATH, code, extra_outputs):
+        logging.info("Customers input unchanged, keeping: %s", CUSTOMERS_CLEAN_PATH)
+        return
+
+    metrics = StageMetrics("clean_customers")
+    logging.info("Loading customers: %s", raw_path)
+    with metrics.step("load", read_path=raw_path) as step:
+        # zip prefixes read as numbers lose their leading zeros; normalize_location pads them back
+        customers = read_table(raw_path)
+        step.rows_out = len(customers)
+
+    customers, summary = clean_customers(customers, metrics)
+    customers = compact_frame(customers)
+
+    with metrics.step("write", rows_in=len(customers), write_path=CUSTOMERS_CLEAN_PATH) as step:
+        write_table(restore_frame(customers), CUSTOMERS_CLEAN_PATH, csv_export=args.csv_export)
+        write_stage_manifest([raw_path], CUSTOMERS_CLEAN_PATH, code, extra_outputs)
+        step.rows_out = len(customers)
+    logging.info("Saved cleaned customers to: %s", CUSTOMERS_CLEAN_PATH)
+
+    log_summary(summary)
+    metrics.log_summary()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
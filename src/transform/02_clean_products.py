@@ -0,0 +1,156 @@
+from pathlib import Path
+import argparse
+import os
+import pandas as pd
+import logging
+from typing import List, Optional, Tuple
+
+from instrumentation import StageMetrics
+from schema import compact_frame, restore_frame
+from storage import csv_path, find_table, read_table, stage_is_current, write_stage_manifest, write_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+RAW_DIR = DATA_DIR / "raw"
+PROCESSED_DIR = DATA_DIR / "processed"
+PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+PRODUCTS_RAW = RAW_DIR / "olist_products_dataset.csv"
+PRODUCTS_CLEAN_PATH = PROCESSED_DIR / "products_cleaned.parquet"
+
+# The raw extract misspells "length"
+COLUMN_RENAMES = {
+    "product_name_lenght": "product_name_length",
+    "product_description_lenght": "product_description_length",
+}
+METADATA_COLS = ["product_name_length", "product_description_length", "product_photos_qty"]
+DIMENSION_COLS = ["product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"]
+UNKNOWN_CATEGORY = "unknown"
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.str.strip().str.lower()
+    return df.rename(columns=COLUMN_RENAMES)
+
+
+def normalize_category(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Trim/lower-case category names, join words with "_" and fill missing ones with "unknown"."""
+    cat = df["product_category_name"].astype("string").str.strip().str.lower().str.replace(r"\s+", "_", regex=True)
+    cat = cat.mask(cat == "")
+    missing = int(cat.isna().sum())
+    df["product_category_name"] = cat.fillna(UNKNOWN_CATEGORY).astype(object)
+    logging.info("Products with missing category (set to %r): %d", UNKNOWN_CATEGORY, missing)
+    return df, missing
+
+
+def impute_medians(df: pd.DataFrame, cols: List[str]) -> Tuple[pd.DataFrame, dict]:
+    filled = {}
+    for c in cols:
+        n = int(df[c].isna().sum())
+        if n:
+            df[c] = df[c].fillna(df[c].median())
+        filled[c] = n
+    logging.info("Median-imputed values: %s", filled)
+    return df, filled
+
+
+def validate_product_ids(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    dup = int(df["product_id"].duplicated().sum())
+    if dup:
+        logging.warning("Duplicate product_id rows: %d (keeping first)", dup)
+        df = df.drop_duplicates(subset=["product_id"], keep="first")
+    else:
+        logging.info("All product_id values are unique.")
+    return df, dup
+
+
+def clean_products(products: pd.DataFrame, metrics: Optional[StageMetrics] = None) -> Tuple[pd.DataFrame, dict]:
+    metrics = metrics or StageMetrics("clean_products")
+    rows_read = len(products)
+
+    with metrics.step("standardize", rows_in=rows_read):
+        products = standardize_columns(products)
+        products, missing_category = normalize_category(products)
+
+    with metrics.step("impute", rows_in=len(products)):
+        products = products.astype({c: "float64" for c in METADATA_COLS + DIMENSION_COLS})
+        products, filled = impute_medians(products, METADATA_COLS + DIMENSION_COLS)
+        products["product_photos_qty"] = products["product_photos_qty"].round().astype("int64")
+
+    with metrics.step("validate_ids", rows_in=len(products)) as step:
+        products, dup = validate_product_ids(products)
+        step.rows_out = len(products)
+
+    summary = {
+        "rows_read": rows_read,
+        "rows_kept": len(products),
+        "missing_category": missing_category,
+        "duplicates": dup,
+        "metadata_imputed": filled["product_name_length"],
+        "dimensions_imputed": filled["product_weight_g"],
+    }
+    return products, summary
+
+
+def log_summary(summary: dict) -> None:
+    logging.info("----- SUMMARY -----")
+    logging.info("Rows processed: %d", summary["rows_read"])
+    logging.info("Rows kept: %d", summary["rows_kept"])
+    logging.info("Missing category filled with %r: %d", UNKNOWN_CATEGORY, summary["missing_category"])
+    logging.info("Rows with imputed name/description/photos: %d", summary["metadata_imputed"])
+    logging.info("Rows with imputed weight/dimensions: %d", summary["dimensions_imputed"])
+    logging.info("Duplicate product_id dropped: %d", summary["duplicates"])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Clean the raw Olist products table.")
+    parser.add_argument(
+        "--csv-export", action="store_true",
+        help="Also write a CSV copy of the cleaned products next to the Parquet output.",
+    )
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the input is unchanged.")
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    # the raw table may also come as Parquet/Arrow with the same stem
+    raw_path = find_table(PRODUCTS_RAW)
+    # the stage script plus the helpers that shape its output
+    code = [Path(__file__)] + [Path(__file__).with_name(m) for m in ("schema.py", "storage.py")]
+    extra_outputs = [csv_path(PRODUCTS_CLEAN_PATH)] if args.csv_export else []
+
+    if not args.force and stage_is_current([raw_path], PRODUCTS_CLEAN_PATH, code, extra_outputs):
+        logging.info("Products input unchanged, keeping: %s", PRODUCTS_CLEAN_PATH)
+        return
+
+    metrics = StageMetrics("clean_products")
+    logging.info("Loading products: %s", raw_path)
+    with metrics.step("load", read_path=raw_path) as step:
+        products = read_table(raw_path)
+        step.rows_out = len(products)
+
+    products, summary = clean_products(products, metrics)
+    products = compact_frame(products)
+
+    with metrics.step("write", rows_in=len(products), write_path=PRODUCTS_CLEAN_PATH) as step:
+        write_table(restore_frame(products), PRODUCTS_CLEAN_PATH, csv_export=args.csv_export)
+        write_stage_manifest([raw_path], PRODUCTS_CLEAN_PATH, code, extra_outputs)
+        step.rows_out = len(products)
+    logging.info("Saved cleaned products to: %s", PRODUCTS_CLEAN_PATH)
+
+    log_summary(summary)
+    metrics.log_summary()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,51 @@
 from pathlib import Path
+import argparse
+import os
+import numpy as np
 import pandas as pd
 import logging
-from typing import Tuple, Set
+from typing import List, Optional, Tuple, Set
+
+from instrumentation import StageMetrics, profiled
+from parallel import map_partitions, split_partitions
+from schema import compact_frame, restore_frame
+from storage import TableWriter, iter_table, read_table, write_table
+from timestamps import parse_timestamp_columns
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-RAW_DIR = PROJECT_ROOT / "data" / "raw"
-PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+RAW_DIR = DATA_DIR / "raw"
+PROCESSED_DIR = DATA_DIR / "processed"
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
 ORDERS_RAW = RAW_DIR / "olist_orders_dataset.csv"
-ORDERS_CLEAN_PATH = PROCESSED_DIR / "orders_clean.csv"
+ORDERS_CLEAN_PATH = PROCESSED_DIR / "orders_clean.parquet"
+
+DATE_COLS = [
+    "order_purchase_timestamp",
+    "order_approved_at",
+    "order_delivered_carrier_date",
+    "order_delivered_customer_date",
+    "order_estimated_delivery_date",
+]
+ALLOWED_ORDER_STATUSES = {
+    "created", "approved", "invoiced", "processing", "shipped", "delivered",
+    "canceled", "unavailable"
+}
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 
-def to_datetime_cols(df: pd.DataFrame, cols: list) -> pd.DataFrame:
-    for c in cols:
-        if c in df.columns:
-            df[c] = pd.to_datetime(df[c], errors="coerce", infer_datetime_format=True)
-    return df
+def to_datetime_cols(df: pd.DataFrame, cols: list) -> Tuple[pd.DataFrame, dict]:
+    """Parse `cols` with the explicit Olist formats; returns the NaT count per column."""
+    df, report = parse_timestamp_columns(df, cols)
+    failures = {f"parse_failures_{c}": r["null"] + r["invalid"] for c, r in report.items()}
+    return df, failures
 
 
 def validate_order_status(df: pd.DataFrame) -> Tuple[pd.Series, Set[str]]:
-    allowed = {
-        "created", "approved", "invoiced", "processing", "shipped", "delivered",
-        "canceled", "unavailable"
-    }
+    allowed = ALLOWED_ORDER_STATUSES
     counts = df["order_status"].value_counts(dropna=False)
     logging.info("Order status counts:\n%s", counts.to_string())
     unknown = set(df["order_status"].dropna().unique()) - allowed
@@ -64,7 +84,10 @@ def flag_carrier_after_customer(df: pd.DataFrame) -> int:
 
 def compute_delivery_days(df: pd.DataFrame) -> Tuple[pd.DataFrame, int, int]:
     if {"order_delivered_customer_date", "order_purchase_timestamp"}.issubset(df.columns):
-        df["delivery_days"] = (df["order_delivered_customer_date"] - df["order_purchase_timestamp"]).dt.days
+        # float64 even when no NaT is present, so chunks share one schema
+        df["delivery_days"] = (
+            (df["order_delivered_customer_date"] - df["order_purchase_timestamp"]).dt.days.astype("float64")
+        )
         neg = int((df["delivery_days"] < 0).sum())
         very_long = int((df["delivery_days"] > 365).sum())
         logging.info("Negative delivery_days: %d; delivery_days > 365: %d", neg, very_long)
@@ -73,47 +96,221 @@ def compute_delivery_days(df: pd.DataFrame) -> Tuple[pd.DataFrame, int, int]:
     return df, 0, 0
 
 
-def main():
-    logging.info("Loading orders: %s", ORDERS_RAW)
-    orders = pd.read_csv(ORDERS_RAW, low_memory=False)
-    logging.info("Initial orders shape: %s", orders.shape)
+class SeenKeys:
+    """
+    Set of 64-bit key hashes kept as one sorted uint64 array (8 bytes per key
+    instead of a Python string object of ~100 bytes). Memory still grows with
+    the number of distinct keys; a 64-bit hash collision would misreport an
+    order as a duplicate with probability ~n**2 / 2**65 (about 1e-6 at 10M orders).
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype="uint64")
+
+    @staticmethod
+    def hash(keys: pd.Series) -> np.ndarray:
+        return pd.util.hash_pandas_object(keys.astype(object), index=False).to_numpy(dtype="uint64")
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        pos = np.searchsorted(self.hashes, hashes)
+        found = np.zeros(len(hashes), dtype=bool)
+        inside = pos < len(self.hashes)
+        found[inside] = self.hashes[pos[inside]] == hashes[inside]
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        """Merge hashes not seen yet: only the chunk is sorted, then spliced in with one linear pass."""
+        new = np.sort(hashes)
+        self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, new), new)
+
 
-    date_cols = [
-        "order_purchase_timestamp",
-        "order_approved_at",
-        "order_delivered_carrier_date",
-        "order_delivered_customer_date",
-        "order_estimated_delivery_date",
-    ]
-    orders = to_datetime_cols(orders, date_cols)
+def log_summary(summary: dict) -> None:
+    logging.info("----- SUMMARY -----")
+    logging.info("Rows processed: %d", summary["rows_read"])
+    logging.info("Rows kept: %d", summary["rows_kept"])
+    logging.info("Rows dropped (impossible deliveries): %d", summary["dropped"])
+    logging.info("Rows dropped (duplicate order_id): %d", summary["duplicates"])
+    logging.info("Carrier after customer count: %d", summary["carrier_after"])
+    logging.info("Negative delivery_days: %d", summary["neg_days"])
+    logging.info("Very long delivery_days (>365): %d", summary["long_days"])
+    for key in sorted(k for k in summary if k.startswith("parse_failures_")):
+        logging.info("%s parse failures (NaT): %d", key[len("parse_failures_"):], summary[key])
+
+
+@profiled
+def clean_orders(orders: pd.DataFrame, metrics: Optional[StageMetrics] = None) -> Tuple[pd.DataFrame, dict]:
+    metrics = metrics or StageMetrics("clean_orders")
+    rows_read = len(orders)
+    with metrics.step("parse_datetimes", rows_in=rows_read) as step:
+        orders, parse_failures = to_datetime_cols(orders, DATE_COLS)
+        step.rows_out = len(orders)
 
-    status_counts, unknown_status = validate_order_status(orders)
+    with metrics.step("validate_status", rows_in=len(orders)):
+        status_counts, unknown_status = validate_order_status(orders)
 
-    orders, dropped = drop_impossible_deliveries(orders)
+    with metrics.step("drop_impossible_deliveries", rows_in=len(orders)) as step:
+        orders, dropped = drop_impossible_deliveries(orders)
+        step.rows_out = len(orders)
     logging.info("Shape after dropping impossible deliveries: %s", orders.shape)
 
-    carrier_after = flag_carrier_after_customer(orders)
+    with metrics.step("flag_carrier_after_customer", rows_in=len(orders)):
+        carrier_after = flag_carrier_after_customer(orders)
+
+    with metrics.step("compute_delivery_days", rows_in=len(orders)) as step:
+        orders, neg_days, long_days = compute_delivery_days(orders)
+        step.rows_out = len(orders)
+
+    with metrics.step("dedupe_order_id", rows_in=len(orders)) as step:
+        dup_orders = int(orders.duplicated(subset=["order_id"]).sum())
+        if dup_orders:
+            logging.warning("Duplicate order_id rows in orders table: %d", dup_orders)
+            # Optionally remove duplicates keeping the first occurrence:
+            orders = orders.drop_duplicates(subset=["order_id"], keep="first")
+        step.rows_out = len(orders)
+
+    summary = {
+        "rows_read": rows_read,
+        "rows_kept": len(orders),
+        "dropped": dropped,
+        "duplicates": dup_orders,
+        "carrier_after": carrier_after,
+        "neg_days": neg_days,
+        "long_days": long_days,
+        **parse_failures,
+    }
+    return orders, summary
+
+
+def clean_orders_chunked(path: Path, out_path: Path, chunksize: int, csv_export: bool = False) -> dict:
+    """
+    Streaming variant of `clean_orders`: the raw file is read `chunksize` rows at
+    a time and each cleaned chunk is appended to `out_path`, so peak memory is
+    set by the chunk size plus 8 bytes per distinct order_id. Counters are
+    summed across chunks and duplicate order_ids are detected against the
+    hashes of every order_id kept in earlier chunks.
+    """
+    summary = dict.fromkeys(
+        ["rows_read", "rows_kept", "dropped", "duplicates", "carrier_after", "neg_days", "long_days"], 0
+    )
+    status_counts = pd.Series(dtype="int64")
+    seen_order_ids = SeenKeys()
+
+    with TableWriter(out_path, csv_export=csv_export) as writer:
+        for i, chunk in enumerate(iter_table(path, chunksize=chunksize)):
+            summary["rows_read"] += len(chunk)
+            chunk = compact_frame(chunk)
+            chunk, parse_failures = to_datetime_cols(chunk, DATE_COLS)
+            for key, n in parse_failures.items():
+                summary[key] = summary.get(key, 0) + n
+            status_counts = status_counts.add(chunk["order_status"].value_counts(dropna=False), fill_value=0)
+
+            chunk, dropped = drop_impossible_deliveries(chunk)
+            summary["dropped"] += dropped
+            summary["carrier_after"] += flag_carrier_after_customer(chunk)
 
-    orders, neg_days, long_days = compute_delivery_days(orders)
+            chunk, neg_days, long_days = compute_delivery_days(chunk)
+            summary["neg_days"] += neg_days
+            summary["long_days"] += long_days
 
-    dup_orders = int(orders.duplicated(subset=["order_id"]).sum())
-    if dup_orders:
-        logging.warning("Duplicate order_id rows in orders table: %d", dup_orders)
-        # Optionally remove duplicates keeping the first occurrence:
-        orders = orders.drop_duplicates(subset=["order_id"], keep="first")
+            hashes = SeenKeys.hash(chunk["order_id"])
+            dup_mask = pd.Series(hashes).duplicated().to_numpy() | seen_order_ids.contains(hashes)
+            summary["duplicates"] += int(dup_mask.sum())
+            chunk = chunk.loc[~dup_mask]
+            seen_order_ids.add(hashes[~dup_mask])
 
-    orders.to_csv(ORDERS_CLEAN_PATH, index=False)
+            writer.write(restore_frame(chunk))
+            logging.info("Chunk %d: %d rows kept", i, len(chunk))
+
+        summary["rows_kept"] = writer.rows_written
+
+    status_counts = status_counts.astype("int64").sort_values(ascending=False)
+    logging.info("Order status counts:\n%s", status_counts.to_string())
+    unknown = set(status_counts.index.dropna()) - ALLOWED_ORDER_STATUSES
+    if unknown:
+        logging.warning("Unknown order_status values found: %s", unknown)
+    if summary["duplicates"]:
+        logging.warning("Duplicate order_id rows in orders table: %d", summary["duplicates"])
+    return summary
+
+
+def clean_orders_partitioned(orders: pd.DataFrame, workers: int) -> Tuple[pd.DataFrame, dict]:
+    """
+    Run `clean_orders` on hash partitions of order_id in a process pool.
+    Duplicates of an order_id always share a partition, and partitions keep the
+    original row index, so sorting the concatenated result by index gives the
+    same frame as the serial path.
+    """
+    partitions = split_partitions(orders, "order_id", workers)
+    results = map_partitions(clean_orders, partitions, workers)
+
+    cleaned = pd.concat([df for df, _ in results]).sort_index()
+    summary = {key: sum(s[key] for _, s in results) for key in results[0][1]}
+    return cleaned, summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Clean the raw Olist orders table.")
+    parser.add_argument(
+        "--csv-export", action="store_true",
+        help="Also write a CSV copy of the cleaned orders next to the Parquet output.",
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help="Stream the raw file in chunks of this many rows instead of loading it whole.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Hash-partition by order_id and clean partitions on N processes (default: 1, serial).",
+    )
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    args = parser.parse_args(argv)
+    if args.chunksize and args.workers > 1:
+        parser.error("--chunksize and --workers cannot be combined")
+    return args
+
+
+def write_metrics(metrics: StageMetrics, args: argparse.Namespace) -> None:
+    metrics.log_summary()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    metrics = StageMetrics("clean_orders")
+
+    if args.chunksize:
+        logging.info("Streaming orders from %s in chunks of %d rows", ORDERS_RAW, args.chunksize)
+        with metrics.step("stream_clean", read_path=ORDERS_RAW, write_path=ORDERS_CLEAN_PATH) as step:
+            summary = clean_orders_chunked(ORDERS_RAW, ORDERS_CLEAN_PATH, args.chunksize, csv_export=args.csv_export)
+            step.rows_in, step.rows_out = summary["rows_read"], summary["rows_kept"]
+        logging.info("Saved cleaned orders to: %s", ORDERS_CLEAN_PATH)
+        log_summary(summary)
+        write_metrics(metrics, args)
+        return
+
+    logging.info("Loading orders: %s", ORDERS_RAW)
+    with metrics.step("load", read_path=ORDERS_RAW) as step:
+        orders = compact_frame(read_table(ORDERS_RAW))
+        step.rows_out = len(orders)
+    logging.info("Initial orders shape: %s", orders.shape)
+
+    if args.workers > 1:
+        with metrics.step("clean_partitioned", rows_in=len(orders)) as step:
+            orders, summary = clean_orders_partitioned(orders, args.workers)
+            step.rows_out = len(orders)
+    else:
+        orders, summary = clean_orders(orders, metrics)
+
+    with metrics.step("write", rows_in=len(orders), write_path=ORDERS_CLEAN_PATH):
+        write_table(restore_frame(orders), ORDERS_CLEAN_PATH, csv_export=args.csv_export)
     logging.info("Saved cleaned orders to: %s", ORDERS_CLEAN_PATH)
 
-    # Summary
-    logging.info("----- SUMMARY -----")
-    logging.info("Rows processed: %d", len(orders) + dropped)
-    logging.info("Rows kept: %d", len(orders))
-    logging.info("Rows dropped (impossible deliveries): %d", dropped)
-    logging.info("Carrier after customer count: %d", carrier_after)
-    logging.info("Negative delivery_days: %d", neg_days)
-    logging.info("Very long delivery_days (>365): %d", long_days)
-    logging.info("Duplicate order_id (remaining): %d", int(orders.duplicated(subset=['order_id']).sum()))
+    log_summary(summary)
+    write_metrics(metrics, args)
 
 
 if __name__ == "__main__":
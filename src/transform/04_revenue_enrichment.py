@@ -1,153 +1,309 @@
 from pathlib import Path
+import argparse
+import os
+import numpy as np
 import pandas as pd
 import logging
+from typing import List, Optional, Tuple, Union
+
+import duckdb_backend
+from checkpoint import (
+    DEFAULT_RETENTION_DAYS, CheckpointStore, code_digest, loaded_module_files, partition_name, run_key,
+)
+from incremental import EnrichmentState, diff_order_hashes, item_order_keys, order_input_hashes
+from instrumentation import StageMetrics, profiled
+from parallel import hash_partition, map_partitions, split_partitions
+from schema import IdDictionary, compact_frame, restore_frame
+from sketches import DEFAULT_K, MIN_CATEGORY_ITEMS, CategoryThresholds, ThresholdSketches
+from storage import find_table, read_table, write_table
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
-RAW_DIR = PROJECT_ROOT / "data" / "raw"
-ORDERS_PATH = PROCESSED_DIR / "orders_clean.csv"
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+RAW_DIR = DATA_DIR / "raw"
+ORDERS_PATH = PROCESSED_DIR / "orders_clean.parquet"
 ORDER_ITEMS_PATH = RAW_DIR / "olist_order_items_dataset.csv"
-PRODUCTS_PATH = PROCESSED_DIR / "products_cleaned.csv"
-ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.csv"
-CATEGORY_INSIGHTS_PATH = PROCESSED_DIR / "category_revenue_insights.csv"
+PRODUCTS_PATH = PROCESSED_DIR / "products_cleaned.parquet"
+ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.parquet"
+CATEGORY_INSIGHTS_PATH = PROCESSED_DIR / "category_revenue_insights.parquet"
+ENRICHMENT_STATE_DIR = PROCESSED_DIR / "state" / "enrichment"
+CHECKPOINT_DIR = PROCESSED_DIR / "checkpoints" / "enrich"
+DEFAULT_CHECKPOINT_PARTITIONS = 16
+# Position of each order in the cleaned orders table, kept in checkpoints to restore the row order
+ORDER_ROW_COL = "_order_row"
+# Items above this percentile of weight or volume are flagged as outliers
+ABNORMAL_QUANTILE = 0.99
+
+ORDER_DATE_COLS = [
+    "order_purchase_timestamp",
+    "order_approved_at",
+    "order_delivered_carrier_date",
+    "order_delivered_customer_date",
+    "order_estimated_delivery_date",
+]
+ORDER_ITEM_COLS = ["order_id", "order_item_id", "product_id", "price", "freight_value"]
+PRODUCT_COLS = [
+    "product_id",
+    "product_category_name",
+    "product_weight_g",
+    "product_length_cm",
+    "product_height_cm",
+    "product_width_cm",
+]
+# Columns of the order_items+products join that feed the per-order hash in incremental runs
+ITEM_HASH_COLS = ORDER_ITEM_COLS[1:] + PRODUCT_COLS[1:]
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 
-def compute_order_revenue(order_items: pd.DataFrame) -> pd.DataFrame:
-    required = {"order_id", "price", "freight_value", "order_item_id"}
-    if not required.issubset(order_items.columns):
-        missing = required - set(order_items.columns)
-        raise KeyError(f"Missing required columns in order_items: {missing}")
-
-    revenue = (
-        order_items
-        .groupby("order_id", as_index=False)
-        .agg(
-            order_revenue=("price", "sum"),
-            total_freight=("freight_value", "sum"),
-            items_count=("order_item_id", "count"),
-            average_item_price=("price", "mean"),
-        )
-    )
-    return revenue
-
-
-def compute_order_product_metrics(order_items_products: pd.DataFrame) -> pd.DataFrame:
-    required = {
-        "order_id",
-        "product_category_name",
-        "product_weight_g",
-        "product_length_cm",
-        "product_height_cm",
-        "product_width_cm",
-    }
-    if not required.issubset(order_items_products.columns):
-        missing = required - set(order_items_products.columns)
-        raise KeyError(f"Missing required columns after join (order_items+products): {missing}")
-
-    df = order_items_products.copy()
-
-    # item volume (cm3)
-    df["item_volume_cm3"] = df["product_length_cm"] * df["product_height_cm"] * df["product_width_cm"]
-
-    metrics = (
-        df.groupby("order_id", as_index=False)
-        .agg(
-            distinct_categories=("product_category_name", "nunique"),
-            average_product_weight=("product_weight_g", "mean"),
-            total_volume_cm3=("item_volume_cm3", "sum"),
-        )
-    )
-    return metrics
-
-
 def compute_category_revenue_insights(order_items_products: pd.DataFrame) -> pd.DataFrame:
     required = {"product_category_name", "price", "order_item_id"}
     if not required.issubset(order_items_products.columns):
         missing = required - set(order_items_products.columns)
         raise KeyError(f"Missing required columns for category insights: {missing}")
 
-    category = (
+    return finalize_category_insights(aggregate_category_revenue(order_items_products))
+
+
+def aggregate_category_revenue(order_items_products: pd.DataFrame) -> pd.DataFrame:
+    return (
         order_items_products
-        .groupby("product_category_name", as_index=False)
+        .groupby("product_category_name", as_index=False, observed=True)
         .agg(
             category_revenue=("price", "sum"),
             items_sold=("order_item_id", "count"),
             average_price=("price", "mean"),
         )
-        .sort_values("category_revenue", ascending=False)
     )
 
+
+def finalize_category_insights(category: pd.DataFrame) -> pd.DataFrame:
+    """Rank categories by revenue and add each category's share of the global total."""
+    category = category.sort_values("category_revenue", ascending=False)
+
     total = float(category["category_revenue"].sum()) if len(category) else 0.0
     category["revenue_share_%"] = (category["category_revenue"] / total * 100) if total > 0 else 0.0
 
     return category
 
 
-def compute_abnormal_flags(order_items_products: pd.DataFrame) -> pd.DataFrame:
+def category_insights_from_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rebuild the category insights table from additive totals
+    (product_category_name, category_revenue, items_sold).
     """
-    Detect abnormal product sizes/weights (simple + clear):
-      - invalid if weight <= 0 OR any dimension <= 0
-      - outlier if weight > 99th percentile OR volume > 99th percentile
-    Return order-level flags:
-      - abnormal_items_count
-      - has_abnormal_item
+    category = totals.loc[totals["items_sold"] > 0, ["product_category_name", "category_revenue", "items_sold"]].copy()
+    category["items_sold"] = category["items_sold"].astype("int64")
+    category["average_price"] = category["category_revenue"] / category["items_sold"]
+    return finalize_category_insights(category)
+
+
+def compute_order_category_contrib(order_items_products: pd.DataFrame) -> pd.DataFrame:
     """
-    df = order_items_products.copy()
+    Per (order_id, category) revenue and item counts, the additive unit behind
+    category insights. Covers every item, like the full aggregation; items
+    without an order_id are keyed by NULL_ORDER_KEY.
+    """
+    contrib = (
+        order_items_products
+        .assign(order_id=item_order_keys(order_items_products["order_id"]))
+        .groupby(["order_id", "product_category_name"], as_index=False, observed=True)
+        .agg(
+            category_revenue=("price", "sum"),
+            items_sold=("order_item_id", "count"),
+        )
+    )
+    return restore_frame(contrib)
 
-    df["item_volume_cm3"] = df["product_length_cm"] * df["product_height_cm"] * df["product_width_cm"]
 
-    # invalid values
-    invalid = (
-        (df["product_weight_g"] <= 0)
-        | (df["product_length_cm"] <= 0)
-        | (df["product_height_cm"] <= 0)
-        | (df["product_width_cm"] <= 0)
-        | (df["item_volume_cm3"] <= 0)
+def apply_category_deltas(
+    previous: pd.DataFrame,
+    removed_contrib: pd.DataFrame,
+    added_contrib: pd.DataFrame,
+) -> pd.DataFrame:
+    """Update category totals by subtracting stale per-order contributions and adding fresh ones."""
+    cols = ["category_revenue", "items_sold"]
+    base = previous.set_index("product_category_name")[cols]
+    minus = removed_contrib.groupby("product_category_name")[cols].sum()
+    plus = added_contrib.groupby("product_category_name")[cols].sum()
+
+    totals = base.add(plus, fill_value=0).sub(minus, fill_value=0)
+    return totals.reset_index()
+
+
+def abnormal_thresholds(
+    order_items_products: pd.DataFrame,
+    per_category: bool = False,
+) -> Union[Tuple[float, float], CategoryThresholds]:
+    """
+    Exact 99th percentile of product weight and item volume. Global by default;
+    with `per_category`, each category with at least MIN_CATEGORY_ITEMS items
+    gets its own pair and the rest fall back to the global one.
+    """
+    weight = order_items_products["product_weight_g"]
+    volume = (
+        order_items_products["product_length_cm"]
+        * order_items_products["product_height_cm"]
+        * order_items_products["product_width_cm"]
     )
+    w_p99, v_p99 = float(weight.quantile(ABNORMAL_QUANTILE)), float(volume.quantile(ABNORMAL_QUANTILE))
+    if not per_category:
+        return w_p99, v_p99
+
+    frame = pd.DataFrame({"weight": weight, "volume": volume})
+    grouped = frame.groupby(order_items_products["product_category_name"], observed=True)
+    counts = grouped.size()
+    by_category = grouped.quantile(ABNORMAL_QUANTILE).loc[counts[counts >= MIN_CATEGORY_ITEMS].index]
+    by_category.index = by_category.index.astype(object)
+    return CategoryThresholds(w_p99, v_p99, by_category)
+
+
+def sketch_thresholds(
+    order_items_products: pd.DataFrame,
+    per_category: bool = False,
+    k: int = DEFAULT_K,
+    sketches: Optional[ThresholdSketches] = None,
+) -> Tuple[CategoryThresholds, ThresholdSketches]:
+    """
+    Approximate abnormal_thresholds from KLL sketches, built in one pass (or
+    added to `sketches` from an earlier run). Returns the thresholds and the
+    sketches so they can be persisted and updated incrementally.
+    """
+    sketches = sketches or ThresholdSketches(k)
+    sketches.update(order_items_products)
+    return sketches.thresholds(ABNORMAL_QUANTILE, per_category), sketches
 
-    # outliers (99th percentile)
-    w_p99 = df["product_weight_g"].quantile(0.99)
-    v_p99 = df["item_volume_cm3"].quantile(0.99)
 
-    outlier = (df["product_weight_g"] > w_p99) | (df["item_volume_cm3"] > v_p99)
+def thresholds_to_meta(thresholds: Union[Tuple[float, float], CategoryThresholds]) -> dict:
+    if isinstance(thresholds, CategoryThresholds):
+        data = thresholds.to_dict()
+        return {"weight_p99": data.pop("weight"), "volume_p99": data.pop("volume"), **data}
+    return {"weight_p99": thresholds[0], "volume_p99": thresholds[1]}
 
-    df["is_abnormal_item"] = invalid | outlier
 
-    abnormal_orders = (
-        df.groupby("order_id", as_index=False)
-        .agg(
-            abnormal_items_count=("is_abnormal_item", "sum"),
+def thresholds_from_meta(meta: dict) -> Union[Tuple[float, float], CategoryThresholds]:
+    if "by_category" in meta:
+        return CategoryThresholds.from_dict(
+            {"weight": meta["weight_p99"], "volume": meta["volume_p99"], "by_category": meta["by_category"]}
         )
-    )
-    abnormal_orders["has_abnormal_item"] = abnormal_orders["abnormal_items_count"] > 0
+    return meta["weight_p99"], meta["volume_p99"]
 
-    total_abnormal_items = int(df["is_abnormal_item"].sum())
-    total_orders_with_abnormal = int(abnormal_orders["has_abnormal_item"].sum())
 
-    logging.info("Abnormal items detected: %d", total_abnormal_items)
-    logging.info("Orders with abnormal item(s): %d", total_orders_with_abnormal)
+@profiled
+def compute_order_metrics(
+    order_items_products: pd.DataFrame,
+    thresholds: Optional[Union[Tuple[float, float], CategoryThresholds]] = None,
+) -> pd.DataFrame:
+    """
+    All order-level metrics in one pass: revenue, freight and item counts,
+    product metrics (distinct categories, mean weight, total volume) and the
+    abnormal-item flags. An item is abnormal when its weight or any dimension
+    is <= 0, or its weight/volume is above the 99th percentile; `thresholds` =
+    (weight_p99, volume_p99) or CategoryThresholds overrides the percentiles
+    computed from `order_items_products` (used by partitioned and incremental
+    runs). order_id is factorized once, and every metric comes out of a single
+    grouped aggregation over a narrow frame (no whole-table copy). Items
+    without an order_id are left out, as a groupby on order_id would.
+    """
+    required = {
+        "order_id", "order_item_id", "price", "freight_value", "product_category_name",
+        "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm",
+    }
+    if not required.issubset(order_items_products.columns):
+        missing = required - set(order_items_products.columns)
+        raise KeyError(f"Missing required columns after join (order_items+products): {missing}")
 
-    return abnormal_orders
+    codes, order_ids = pd.factorize(order_items_products["order_id"], sort=True)
 
+    weight = order_items_products["product_weight_g"]
+    length = order_items_products["product_length_cm"]
+    height = order_items_products["product_height_cm"]
+    width = order_items_products["product_width_cm"]
+    volume = length * height * width
 
-def main():
-    logging.info("Loading orders from: %s", ORDERS_PATH)
-    orders = pd.read_csv(ORDERS_PATH, low_memory=False)
+    if thresholds is None:
+        w_p99, v_p99 = weight.quantile(ABNORMAL_QUANTILE), volume.quantile(ABNORMAL_QUANTILE)
+    elif isinstance(thresholds, CategoryThresholds):
+        w_p99, v_p99 = thresholds.for_rows(order_items_products["product_category_name"])
+    else:
+        w_p99, v_p99 = thresholds
 
-    logging.info("Loading order items from: %s", ORDER_ITEMS_PATH)
-    order_items = pd.read_csv(ORDER_ITEMS_PATH, low_memory=False)
+    is_abnormal = (
+        (weight <= 0) | (length <= 0) | (height <= 0) | (width <= 0) | (volume <= 0)
+        | (weight > w_p99) | (volume > v_p99)
+    )
 
-    logging.info("Loading products from: %s", PRODUCTS_PATH)
-    products = pd.read_csv(PRODUCTS_PATH, low_memory=False)
+    lean = pd.DataFrame(
+        {
+            "price": order_items_products["price"],
+            "freight_value": order_items_products["freight_value"],
+            "order_item_id": order_items_products["order_item_id"],
+            "product_category_name": order_items_products["product_category_name"],
+            "product_weight_g": weight,
+            "item_volume_cm3": volume,
+            "is_abnormal_item": is_abnormal,
+        },
+        copy=False,
+    )
+    has_order = codes >= 0
+    if not has_order.all():
+        lean, codes = lean.loc[has_order], codes[has_order]
+    metrics = lean.groupby(codes, sort=True).agg(
+        order_revenue=("price", "sum"),
+        total_freight=("freight_value", "sum"),
+        items_count=("order_item_id", "count"),
+        average_item_price=("price", "mean"),
+        distinct_categories=("product_category_name", "nunique"),
+        average_product_weight=("product_weight_g", "mean"),
+        total_volume_cm3=("item_volume_cm3", "sum"),
+        abnormal_items_count=("is_abnormal_item", "sum"),
+    )
+    metrics.insert(0, "order_id", order_ids)
+    metrics = metrics.reset_index(drop=True)
+    metrics["has_abnormal_item"] = metrics["abnormal_items_count"] > 0
 
+    logging.info("Computed order metrics for %d orders", len(metrics))
+    logging.info("Abnormal items detected: %d", int(is_abnormal.sum()))
+    logging.info("Orders with abnormal item(s): %d", int(metrics["has_abnormal_item"].sum()))
 
-    # Revenue metrics (existing)
-    revenue = compute_order_revenue(order_items)
-    logging.info("Computed revenue metrics for %d orders", len(revenue))
+    return metrics
 
-    # Join order_items + products
+
+def compute_order_metrics_partitioned(
+    order_items_products: pd.DataFrame,
+    thresholds: Union[Tuple[float, float], CategoryThresholds],
+    workers: int,
+) -> pd.DataFrame:
+    """
+    compute_order_metrics over hash partitions of order_id in a process pool.
+    Every order lives in exactly one partition with its items in their original
+    order, so per-order results equal the serial ones. `thresholds` must be the
+    global percentiles (phase one of the reduce), computed before partitioning.
+    """
+    partitions = split_partitions(order_items_products, "order_id", workers)
+    parts = map_partitions(compute_order_metrics, partitions, workers, thresholds=thresholds)
+    return pd.concat(parts, ignore_index=True)
+
+
+def compute_category_revenue_insights_partitioned(order_items_products: pd.DataFrame, workers: int) -> pd.DataFrame:
+    """
+    Category insights with the per-category aggregation spread over hash
+    partitions of the category name. Partials are put back in category order
+    before the global total and shares are computed, as in the serial path.
+    """
+    partitions = split_partitions(order_items_products, "product_category_name", workers)
+    parts = map_partitions(aggregate_category_revenue, partitions, workers)
+    category = (
+        pd.concat(parts, ignore_index=True)
+        .sort_values("product_category_name", kind="stable")
+        .reset_index(drop=True)
+    )
+    return finalize_category_insights(category)
+
+
+@profiled
+def join_order_items_products(order_items: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
     join_required = {"order_id", "product_id", "price", "freight_value", "order_item_id"}
     if not join_required.issubset(order_items.columns):
         missing = join_required - set(order_items.columns)
@@ -162,25 +318,30 @@ def main():
 
     missing_products = int(order_items_products["product_category_name"].isna().sum())
     logging.info("Order items with missing product match (category null): %d", missing_products)
-
-    # Product metrics per order
-    product_metrics = compute_order_product_metrics(order_items_products)
-    logging.info("Computed product metrics for %d orders", len(product_metrics))
-
-    # Abnormal flags per order
-    abnormal_flags = compute_abnormal_flags(order_items_products)
-
-    # Category insights
-    category_insights = compute_category_revenue_insights(order_items_products)
-    logging.info("Computed category insights for %d categories", len(category_insights))
+    return order_items_products
+
+
+def build_enriched_orders(
+    orders: pd.DataFrame,
+    order_items_products: pd.DataFrame,
+    thresholds: Optional[Union[Tuple[float, float], CategoryThresholds]] = None,
+    workers: int = 1,
+    stage_metrics: Optional[StageMetrics] = None,
+) -> pd.DataFrame:
+    stage_metrics = stage_metrics or StageMetrics("enrich")
+    with stage_metrics.step("order_metrics", rows_in=len(order_items_products)) as step:
+        if workers > 1:
+            if thresholds is None:
+                thresholds = abnormal_thresholds(order_items_products)
+            metrics = compute_order_metrics_partitioned(order_items_products, thresholds, workers)
+        else:
+            metrics = compute_order_metrics(order_items_products, thresholds)
+        step.rows_out = len(metrics)
 
     # Merge into enriched orders
-    enriched = (
-        orders
-        .merge(revenue, on="order_id", how="left", validate="1:1")
-        .merge(product_metrics, on="order_id", how="left", validate="1:1")
-        .merge(abnormal_flags, on="order_id", how="left", validate="1:1")
-    )
+    with stage_metrics.step("merge_orders", rows_in=len(orders)) as step:
+        enriched = orders.merge(metrics, on="order_id", how="left", validate="1:1")
+        step.rows_out = len(enriched)
 
     # Fill numeric nulls with zeros for orders that had no items (if any)
     for col in [
@@ -197,7 +358,187 @@ def main():
             .astype("boolean")   # pandas nullable boolean type
             .fillna(False)
         )
+    return enriched
+
+
+def checkpointed_enriched_partition(
+    task: Tuple[str, pd.DataFrame, pd.DataFrame],
+    thresholds: Union[Tuple[float, float], CategoryThresholds],
+    key: dict,
+    store: CheckpointStore,
+) -> pd.DataFrame:
+    """Enriched rows of one order partition, committed to `store` as soon as they are done."""
+    name, orders, order_items_products = task
+    enriched = restore_frame(build_enriched_orders(orders, order_items_products, thresholds))
+    store.save(name, key, enriched)
+    return enriched
+
+
+def partition_orders(
+    orders: pd.DataFrame,
+    order_items_products: pd.DataFrame,
+    n_partitions: int,
+) -> Tuple[List[pd.DataFrame], List[pd.DataFrame]]:
+    """
+    Hash partitions of the orders by order_id, each with the items of its
+    orders (in their original order). Items of orders that are not in
+    `orders` are in no partition: a left merge from the orders drops them.
+    """
+    order_part = hash_partition(orders["order_id"], n_partitions)
+    position = pd.Index(orders["order_id"]).get_indexer(order_items_products["order_id"])
+    item_part = np.where(position >= 0, order_part[position], -1)
+    return (
+        [orders.loc[order_part == i] for i in range(n_partitions)],
+        [order_items_products.loc[item_part == i] for i in range(n_partitions)],
+    )
+
+
+def run_checkpointed(args: argparse.Namespace, stage_metrics: StageMetrics) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Full build resumable at partition grain. The orders are hash-partitioned
+    by order_id and each partition's enriched rows (join, metrics and merge)
+    are one checkpoint; the category insights are another. Checkpoints are
+    keyed on the sha256 of the input files, the parameters and the code, so
+    a rerun whose checkpoints are all valid only reads them back, and a rerun
+    after a crash part-way reads and joins the inputs once and computes only
+    the partitions that had not been committed.
+    """
+    store = CheckpointStore(args.checkpoint_dir, args.checkpoint_retention_days)
+    store.prune()
+    n_partitions = args.checkpoint_partitions
+    names = [partition_name("enriched", i, n_partitions) for i in range(n_partitions)]
+    params = {
+        "per_category": args.per_category,
+        "threshold_mode": args.threshold_mode,
+        "sketch_k": args.sketch_k,
+        "quantile": ABNORMAL_QUANTILE,
+        "partitions": n_partitions,
+    }
+    # this script and every helper module it loaded (imports are done by now), not a hand-kept list
+    script = Path(__file__).resolve()
+    code = code_digest(sorted({script, *loaded_module_files(script.parent)}))
+    with stage_metrics.step("checkpoint_key"):
+        key = run_key([find_table(ORDERS_PATH), ORDER_ITEMS_PATH, find_table(PRODUCTS_PATH)], params, code)
+
+    with stage_metrics.step("load_checkpoints") as step:
+        done = {}
+        for i, name in enumerate(names):
+            reused = store.load(name, key)
+            if reused is not None:
+                done[i] = reused
+        category_insights = store.load("category_insights", key)
+        step.rows_out = sum(len(df) for df in done.values())
+    todo = [i for i in range(n_partitions) if i not in done]
+    logging.info("Enriched partitions: %d reused from checkpoints, %d to compute", len(done), len(todo))
+
+    if todo or category_insights is None:
+        orders, order_items_products = load_inputs(stage_metrics)
+        if category_insights is None:
+            with stage_metrics.step("category_insights", rows_in=len(order_items_products)) as step:
+                if args.workers > 1:
+                    category_insights = compute_category_revenue_insights_partitioned(
+                        order_items_products, args.workers
+                    )
+                else:
+                    category_insights = compute_category_revenue_insights(order_items_products)
+                category_insights = restore_frame(category_insights)
+                store.save("category_insights", key, category_insights)
+                step.rows_out = len(category_insights)
+        if todo:
+            with stage_metrics.step("abnormal_thresholds", rows_in=len(order_items_products)):
+                if args.threshold_mode == "sketch":
+                    thresholds, _ = sketch_thresholds(order_items_products, args.per_category, args.sketch_k)
+                else:
+                    thresholds = abnormal_thresholds(order_items_products, args.per_category)
+            with stage_metrics.step("enrich_partitions", rows_in=len(order_items_products)) as step:
+                orders = orders.assign(**{ORDER_ROW_COL: np.arange(len(orders), dtype="int64")})
+                order_parts, item_parts = partition_orders(orders, order_items_products, n_partitions)
+                tasks = [(names[i], order_parts[i], item_parts[i]) for i in todo]
+                computed = map_partitions(
+                    checkpointed_enriched_partition, tasks, args.workers, thresholds=thresholds, key=key, store=store
+                )
+                done.update(zip(todo, computed))
+                step.rows_out = sum(len(df) for df in computed)
+
+    with stage_metrics.step("assemble_partitions") as step:
+        # empty partitions would only widen the concatenated dtypes
+        parts = [done[i] for i in range(n_partitions) if len(done[i])] or [done[0]]
+        enriched = (
+            pd.concat(parts, ignore_index=True)
+            .sort_values(ORDER_ROW_COL, kind="stable")
+            .drop(columns=ORDER_ROW_COL)
+            .reset_index(drop=True)
+        )
+        step.rows_out = len(enriched)
+    return enriched, category_insights
+
+
+def run_incremental(
+    orders: pd.DataFrame,
+    order_items_products: pd.DataFrame,
+    state: EnrichmentState,
+    workers: int = 1,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Recompute only orders whose order row, items or joined product attributes
+    changed since the last run, and upsert them into the previous outputs.
+    Category totals are updated by deltas against the totals kept in the
+    state. Outlier thresholds are reused from the last full run, except in
+    sketch mode: there the persisted sketches absorb the items of new orders
+    and the thresholds are refreshed from them for the recomputed orders.
+    Sketches cannot forget values, so edited or removed orders keep their old
+    contribution until the next full run.
+
+    Returns the outputs and the updated state (keyword arguments for
+    EnrichmentState.save); the caller saves it once the outputs are written.
+    """
+    order_state, category_state, category_totals, meta = state.load()
+    hashes = order_input_hashes(orders, order_items_products, list(orders.columns), ITEM_HASH_COLS)
+    changed, removed = diff_order_hashes(order_state, hashes)
+    stale = changed.union(removed)
+    logging.info("Incremental run: %d new/changed orders, %d removed orders", len(changed), len(removed))
+
+    thresholds = thresholds_from_meta(meta)
+    sketches = None
+    changed_items = order_items_products.loc[item_order_keys(order_items_products["order_id"]).isin(changed)]
+    if state.sketch_path.exists():
+        new = changed.difference(pd.Index(order_state["order_id"]))
+        thresholds, sketches = sketch_thresholds(
+            changed_items.loc[item_order_keys(changed_items["order_id"]).isin(new)],
+            per_category="by_category" in meta,
+            sketches=ThresholdSketches.load(state.sketch_path),
+        )
+        meta = thresholds_to_meta(thresholds)
+    fresh = build_enriched_orders(
+        orders.loc[orders["order_id"].isin(changed)], changed_items, thresholds, workers=workers
+    )
+
+    # an upsert keyed by order_id: correct even if a full run rewrote the output after the state was saved
+    previous = read_table(find_table(ENRICHED_PATH))
+    fresh = fresh.astype(previous.dtypes.to_dict())
+    enriched = pd.concat([previous.loc[~previous["order_id"].isin(stale)], fresh], ignore_index=True)
+    # keep the row order of the cleaned orders table, as a full run would
+    enriched = enriched.set_index("order_id").loc[orders["order_id"]].reset_index()[previous.columns]
+
+    stale_contrib = category_state.loc[category_state["order_id"].isin(stale)]
+    fresh_contrib = compute_order_category_contrib(changed_items)
+    category_totals = apply_category_deltas(category_totals, stale_contrib, fresh_contrib)
+    category_insights = category_insights_from_totals(category_totals)
+
+    category_state = pd.concat(
+        [category_state.loc[~category_state["order_id"].isin(stale)], fresh_contrib], ignore_index=True
+    )
+    new_state = {
+        "order_state": hashes,
+        "category_state": category_state,
+        "category_totals": category_totals,
+        "meta": meta,
+        "sketches": sketches,
+    }
+    return enriched, category_insights, new_state
 
+
+def log_enriched_checks(enriched: pd.DataFrame) -> None:
     # Validation checks (existing + basic)
     neg_revenue_count = int((enriched["order_revenue"] < 0).sum())
     zero_revenue_count = int((enriched["order_revenue"] == 0).sum())
@@ -211,12 +552,205 @@ def main():
     logging.info("Weird revenue (items>0 but revenue<=0): %d", weird_revenue)
     logging.info("Duplicate orders (post-merge): %d", duplicates)
 
-    enriched.to_csv(ENRICHED_PATH, index=False)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build enriched orders and category revenue insights.")
+    parser.add_argument(
+        "--csv-export", action="store_true",
+        help="Also write CSV copies of the enriched outputs next to the Parquet files.",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Recompute only orders whose inputs changed since the last run "
+             "(the first run is a full build that records the state).",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Hash-partition by order_id and run per-order work on N processes (default: 1, serial).",
+    )
+    parser.add_argument(
+        "--encode-ids", action="store_true",
+        help="Dictionary-encode order/product/customer ids to int codes for the joins and groupbys.",
+    )
+    parser.add_argument(
+        "--threshold-mode", choices=["exact", "sketch"], default="exact",
+        help="How the 99th-percentile outlier thresholds are found: exact quantiles (default) "
+             "or mergeable KLL sketches that are persisted and updated by --incremental runs.",
+    )
+    parser.add_argument(
+        "--per-category", action="store_true",
+        help="Use per-category outlier thresholds (categories with few items use the global ones).",
+    )
+    parser.add_argument(
+        "--sketch-k", type=int, default=DEFAULT_K,
+        help=f"Sketch size for --threshold-mode sketch; larger is more accurate (default: {DEFAULT_K}).",
+    )
+    parser.add_argument(
+        "--backend", choices=["pandas", "duckdb"], default="pandas",
+        help="pandas (default, in memory) or duckdb (out-of-core SQL over the input files).",
+    )
+    parser.add_argument(
+        "--memory-limit", default=None,
+        help="duckdb backend: memory cap before spilling to disk, e.g. 4GB (default: duckdb's own).",
+    )
+    parser.add_argument(
+        "--temp-dir", type=Path, default=None,
+        help="duckdb backend: spill directory (default: duckdb's own).",
+    )
+    parser.add_argument(
+        "--checkpoint", action="store_true",
+        help="Checkpoint the enriched orders per order_id partition, plus the category insights, so a rerun "
+             "after a failure only computes the partitions that had not finished.",
+    )
+    parser.add_argument(
+        "--checkpoint-partitions", type=int, default=DEFAULT_CHECKPOINT_PARTITIONS,
+        help=f"Hash partitions of order_id for --checkpoint (default: {DEFAULT_CHECKPOINT_PARTITIONS}).",
+    )
+    parser.add_argument("--checkpoint-dir", type=Path, default=CHECKPOINT_DIR, help="Where checkpoints are kept.")
+    parser.add_argument(
+        "--checkpoint-retention-days", type=float, default=DEFAULT_RETENTION_DAYS,
+        help=f"Delete checkpoints unused for this many days (default: {DEFAULT_RETENTION_DAYS:g}).",
+    )
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    args = parser.parse_args(argv)
+    if args.checkpoint and (args.incremental or args.encode_ids or args.backend == "duckdb"):
+        parser.error("--checkpoint applies to full pandas builds without --incremental or --encode-ids")
+    if args.encode_ids and args.incremental:
+        parser.error("--encode-ids cannot be combined with --incremental (state is keyed by the original ids)")
+    if args.backend == "duckdb" and (args.incremental or args.encode_ids or args.threshold_mode == "sketch"):
+        parser.error("--backend duckdb supports neither --incremental, --encode-ids nor --threshold-mode sketch")
+    return args
+
+
+def run_duckdb(args: argparse.Namespace, stage_metrics: StageMetrics) -> None:
+    """Full build with the duckdb backend; --workers sets the duckdb thread count."""
+    with stage_metrics.step("duckdb_enrichment", read_path=ORDER_ITEMS_PATH, write_path=ENRICHED_PATH) as step:
+        summary = duckdb_backend.run_enrichment(
+            find_table(ORDERS_PATH), ORDER_ITEMS_PATH, find_table(PRODUCTS_PATH),
+            ENRICHED_PATH, CATEGORY_INSIGHTS_PATH,
+            per_category=args.per_category,
+            csv_export=args.csv_export,
+            memory_limit=args.memory_limit,
+            temp_dir=args.temp_dir,
+            threads=args.workers if args.workers > 1 else None,
+            quantile=ABNORMAL_QUANTILE,
+        )
+        step.rows_out = summary["orders"]
+    logging.info("Abnormal items detected: %d", summary["abnormal_items"])
+    logging.info("Orders with abnormal item(s): %d", summary["orders_with_abnormal"])
+    logging.info("Computed category insights for %d categories", summary["categories"])
+
+
+def load_inputs(stage_metrics: StageMetrics, ids: Optional[IdDictionary] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """The cleaned orders and the order items joined to their products."""
+    orders_path = find_table(ORDERS_PATH)
+    logging.info("Loading orders from: %s", orders_path)
+    with stage_metrics.step("load_orders", read_path=orders_path) as step:
+        orders = compact_frame(read_table(orders_path, parse_dates=ORDER_DATE_COLS), ids=ids)
+        step.rows_out = len(orders)
+
+    logging.info("Loading order items from: %s", ORDER_ITEMS_PATH)
+    with stage_metrics.step("load_order_items", read_path=ORDER_ITEMS_PATH) as step:
+        order_items = compact_frame(read_table(ORDER_ITEMS_PATH, columns=ORDER_ITEM_COLS), ids=ids)
+        step.rows_out = len(order_items)
+
+    products_path = find_table(PRODUCTS_PATH)
+    logging.info("Loading products from: %s", products_path)
+    with stage_metrics.step("load_products", read_path=products_path) as step:
+        products = compact_frame(read_table(products_path, columns=PRODUCT_COLS), ids=ids)
+        step.rows_out = len(products)
+
+    # Join order_items + products
+    with stage_metrics.step("join_products", rows_in=len(order_items)) as step:
+        order_items_products = join_order_items_products(order_items, products)
+        step.rows_out = len(order_items_products)
+    return orders, order_items_products
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    stage_metrics = StageMetrics("enrich")
+    if args.backend == "duckdb":
+        run_duckdb(args, stage_metrics)
+        stage_metrics.log_summary()
+        if args.metrics_json:
+            stage_metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            stage_metrics.write_prometheus(args.metrics_prom)
+        return
+
+    ids = IdDictionary() if args.encode_ids else None
+    state = EnrichmentState(ENRICHMENT_STATE_DIR)
+    new_state = None
+    if args.checkpoint:
+        enriched, category_insights = run_checkpointed(args, stage_metrics)
+    elif args.incremental and state.exists():
+        orders, order_items_products = load_inputs(stage_metrics, ids)
+        with stage_metrics.step("incremental_update", rows_in=len(order_items_products)) as step:
+            enriched, category_insights, new_state = run_incremental(
+                orders, order_items_products, state, workers=args.workers
+            )
+            step.rows_out = len(enriched)
+    else:
+        orders, order_items_products = load_inputs(stage_metrics, ids)
+        sketches = None
+        with stage_metrics.step("abnormal_thresholds", rows_in=len(order_items_products)):
+            if args.threshold_mode == "sketch":
+                thresholds, sketches = sketch_thresholds(order_items_products, args.per_category, args.sketch_k)
+            else:
+                thresholds = abnormal_thresholds(order_items_products, args.per_category)
+        enriched = build_enriched_orders(
+            orders, order_items_products, thresholds, workers=args.workers, stage_metrics=stage_metrics
+        )
+
+        # Category insights
+        with stage_metrics.step("category_insights", rows_in=len(order_items_products)) as step:
+            if args.workers > 1:
+                category_insights = compute_category_revenue_insights_partitioned(order_items_products, args.workers)
+            else:
+                category_insights = compute_category_revenue_insights(order_items_products)
+            step.rows_out = len(category_insights)
+
+        if args.incremental:
+            with stage_metrics.step("prepare_state"):
+                new_state = {
+                    "order_state": order_input_hashes(
+                        orders, order_items_products, list(orders.columns), ITEM_HASH_COLS
+                    ),
+                    "category_state": compute_order_category_contrib(order_items_products),
+                    "category_totals": restore_frame(
+                        aggregate_category_revenue(order_items_products)[
+                            ["product_category_name", "category_revenue", "items_sold"]
+                        ]
+                    ),
+                    "meta": thresholds_to_meta(thresholds),
+                    "sketches": sketches,
+                }
+    logging.info("Computed category insights for %d categories", len(category_insights))
+
+    log_enriched_checks(enriched)
+
+    with stage_metrics.step("write_enriched", rows_in=len(enriched), write_path=ENRICHED_PATH):
+        write_table(restore_frame(enriched, ids), ENRICHED_PATH, csv_export=args.csv_export)
     logging.info("Saved enriched orders to: %s", ENRICHED_PATH)
 
-    category_insights.to_csv(CATEGORY_INSIGHTS_PATH, index=False)
+    with stage_metrics.step("write_category_insights", rows_in=len(category_insights), write_path=CATEGORY_INSIGHTS_PATH):
+        write_table(restore_frame(category_insights), CATEGORY_INSIGHTS_PATH, csv_export=args.csv_export)
     logging.info("Saved category insights to: %s", CATEGORY_INSIGHTS_PATH)
 
+    # only after both outputs are committed: a crash before this leaves the old
+    # state, and the next --incremental run re-applies the same changes
+    if new_state is not None:
+        with stage_metrics.step("save_state"):
+            state.save(**new_state)
+
+    stage_metrics.log_summary()
+    if args.metrics_json:
+        stage_metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        stage_metrics.write_prometheus(args.metrics_prom)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
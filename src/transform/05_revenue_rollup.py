@@ -0,0 +1,139 @@
+from pathlib import Path
+import argparse
+import os
+import pandas as pd
+import logging
+from typing import List, Optional
+
+from instrumentation import StageMetrics
+from rollup import DIMENSIONS, UNKNOWN, append_months, build_cube, purchase_months
+from storage import find_table, read_table, write_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+RAW_DIR = DATA_DIR / "raw"
+ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.parquet"
+ORDER_ITEMS_PATH = RAW_DIR / "olist_order_items_dataset.csv"
+PRODUCTS_PATH = PROCESSED_DIR / "products_cleaned.parquet"
+CUSTOMERS_PATH = PROCESSED_DIR / "customers_cleaned.parquet"
+SELLERS_PATH = RAW_DIR / "olist_sellers_dataset.csv"
+ROLLUP_PATH = PROCESSED_DIR / "revenue_rollup.parquet"
+
+ORDER_COLS = ["order_id", "customer_id", "order_purchase_timestamp", "delivery_days"]
+ORDER_ITEM_COLS = ["order_id", "product_id", "seller_id", "price", "freight_value"]
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def months_to_build(orders: pd.DataFrame, cube: Optional[pd.DataFrame], months: Optional[List[str]]) -> List[str]:
+    """Explicit --months, otherwise every purchase month later than the last one in the cube."""
+    present = sorted(purchase_months(orders["order_purchase_timestamp"]).dropna().unique())
+    if months:
+        return sorted(set(months))
+    if cube is None or cube.empty:
+        return present
+    # "unknown" (orders without a purchase timestamp) sorts after every YYYY-MM, so it is no watermark
+    known = cube.loc[cube["purchase_month"] != UNKNOWN, "purchase_month"]
+    if known.empty:
+        return present
+    last = known.max()
+    return [m for m in present if m > last]
+
+
+def log_summary(cube: pd.DataFrame) -> None:
+    logging.info("Rollup cells: %d", len(cube))
+    for dim in DIMENSIONS:
+        logging.info("Distinct %s: %d", dim, cube[dim].nunique())
+    logging.info("Total revenue: %.2f over %d items", cube["revenue"].sum(), cube["items"].sum())
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build the category x customer state x seller state x month revenue rollup."
+    )
+    parser.add_argument(
+        "--append", action="store_true",
+        help="Add purchase months that are not in the existing rollup yet, leaving the other cells as they are "
+             "(a full build when there is no rollup). The unknown month (orders without a purchase timestamp) "
+             "is rebuilt every time.",
+    )
+    parser.add_argument(
+        "--months", nargs="+", default=None, metavar="YYYY-MM",
+        help="With --append: rebuild exactly these months instead of only the new ones (e.g. late-arriving orders); "
+             "a listed month without orders is removed.",
+    )
+    parser.add_argument("--csv-export", action="store_true", help="Also write a CSV copy of the rollup.")
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    args = parser.parse_args(argv)
+    if args.months and not args.append:
+        parser.error("--months only applies to --append")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    stage_metrics = StageMetrics("rollup")
+
+    enriched_path = find_table(ENRICHED_PATH)
+    logging.info("Loading enriched orders from: %s", enriched_path)
+    with stage_metrics.step("load_orders", read_path=enriched_path) as step:
+        orders = read_table(enriched_path, columns=ORDER_COLS, parse_dates=["order_purchase_timestamp"])
+        step.rows_out = len(orders)
+
+    cube = None
+    replaced: List[str] = []
+    if args.append and ROLLUP_PATH.exists():
+        cube = read_table(ROLLUP_PATH)
+    if cube is not None and pd.api.types.is_integer_dtype(cube["orders"]):
+        # cubes written before order weighting count mixed orders once per cell and cannot be appended to
+        logging.warning("Existing rollup has unweighted order counts; rebuilding it in full")
+        cube = None
+    if cube is not None:
+        months = months_to_build(orders, cube, args.months)
+        order_months = purchase_months(orders["order_purchase_timestamp"])
+        # orders without a purchase timestamp make up the "unknown" month, which has no
+        # watermark to tell whether it changed, so it is rebuilt on every append
+        orders = orders.loc[(order_months.isin(months) | order_months.isna()).to_numpy()]
+        replaced = [*months, UNKNOWN]
+        logging.info("Appending %d month(s) (%d orders): %s", len(months), len(orders), ", ".join(months) or "-")
+        if orders.empty and not cube["purchase_month"].isin(replaced).any():
+            logging.info("Rollup is up to date: %s", ROLLUP_PATH)
+            return
+
+    logging.info("Loading order items from: %s", ORDER_ITEMS_PATH)
+    with stage_metrics.step("load_order_items", read_path=ORDER_ITEMS_PATH) as step:
+        order_items = read_table(ORDER_ITEMS_PATH, columns=ORDER_ITEM_COLS)
+        if cube is not None:
+            order_items = order_items.loc[order_items["order_id"].isin(orders["order_id"])]
+        step.rows_out = len(order_items)
+
+    with stage_metrics.step("load_dimensions") as step:
+        products = read_table(find_table(PRODUCTS_PATH), columns=["product_id", "product_category_name"])
+        customers = read_table(find_table(CUSTOMERS_PATH), columns=["customer_id", "customer_state"])
+        sellers = read_table(SELLERS_PATH, columns=["seller_id", "seller_state"])
+        step.rows_out = len(products) + len(customers) + len(sellers)
+
+    with stage_metrics.step("build_cube", rows_in=len(order_items)) as step:
+        cells = build_cube(orders, order_items, products, customers, sellers)
+        if cube is not None:
+            cells = append_months(cube, cells, replaced)
+        step.rows_out = len(cells)
+
+    log_summary(cells)
+
+    with stage_metrics.step("write_rollup", rows_in=len(cells), write_path=ROLLUP_PATH):
+        write_table(cells, ROLLUP_PATH, csv_export=args.csv_export)
+    logging.info("Saved revenue rollup to: %s", ROLLUP_PATH)
+
+    stage_metrics.log_summary()
+    if args.metrics_json:
+        stage_metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        stage_metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
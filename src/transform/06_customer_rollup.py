@@ -0,0 +1,298 @@
+from pathlib import Path
+import argparse
+import heapq
+import json
+import os
+import numpy as np
+import pandas as pd
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from instrumentation import StageMetrics
+from schema import IdDictionary
+from storage import atomic_write_text, find_table, iter_table, read_table, write_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.parquet"
+CUSTOMERS_PATH = PROCESSED_DIR / "customers_cleaned.parquet"
+CUSTOMER_ROLLUP_PATH = PROCESSED_DIR / "customer_rollup.parquet"
+TOP_CUSTOMERS_PATH = PROCESSED_DIR / "top_customers.parquet"
+CUSTOMER_ROLLUP_META = PROCESSED_DIR / "state" / "customer_rollup" / "meta.json"
+
+ORDER_COLS = ["order_id", "customer_id", "order_purchase_timestamp", "order_revenue", "items_count"]
+DEFAULT_CHUNKSIZE = 500_000
+DEFAULT_TOP_K = 100
+
+# int64 nanosecond sentinels for "no purchase seen yet"
+NO_FIRST = np.iinfo("int64").max
+NO_LAST = np.iinfo("int64").min
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+class CustomerTotals:
+    """
+    Lifetime aggregates per customer_unique_id in flat numpy arrays indexed by
+    an int code (IdDictionary), so memory is a few dozen bytes per customer
+    and no order-level rows are kept between chunks.
+    """
+
+    def __init__(self, ids: Optional[IdDictionary] = None):
+        self.ids = ids or IdDictionary()
+        self.size = 0
+        self.revenue = np.zeros(0)
+        self.orders = np.zeros(0, dtype="int64")
+        self.items = np.zeros(0, dtype="int64")
+        self.first = np.zeros(0, dtype="int64")
+        self.last = np.zeros(0, dtype="int64")
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self.revenue):
+            self.size = max(self.size, size)
+            return
+        capacity = max(size, 2 * len(self.revenue), 1024)
+        extra = capacity - len(self.revenue)
+        self.revenue = np.concatenate([self.revenue, np.zeros(extra)])
+        self.orders = np.concatenate([self.orders, np.zeros(extra, dtype="int64")])
+        self.items = np.concatenate([self.items, np.zeros(extra, dtype="int64")])
+        self.first = np.concatenate([self.first, np.full(extra, NO_FIRST, dtype="int64")])
+        self.last = np.concatenate([self.last, np.full(extra, NO_LAST, dtype="int64")])
+        self.size = size
+
+    def add(self, codes: np.ndarray, revenue: np.ndarray, items: np.ndarray, purchase_ns: np.ndarray) -> np.ndarray:
+        """Fold one chunk of orders into the totals; returns the codes of the customers it touched."""
+        known = codes >= 0
+        chunk = pd.DataFrame({
+            "code": codes[known],
+            "revenue": revenue[known],
+            "items": items[known],
+            # NaT (min int64) must not win the max, nor be a real first purchase
+            "first": np.where(purchase_ns[known] == NO_LAST, NO_FIRST, purchase_ns[known]),
+            "last": purchase_ns[known],
+        })
+        per_customer = chunk.groupby("code", sort=False).agg(
+            revenue=("revenue", "sum"), orders=("code", "size"), items=("items", "sum"),
+            first=("first", "min"), last=("last", "max"),
+        )
+        touched = per_customer.index.to_numpy(dtype="int64")
+        if len(touched):
+            self._grow(int(touched.max()) + 1)
+        self.revenue[touched] += per_customer["revenue"].to_numpy()
+        self.orders[touched] += per_customer["orders"].to_numpy(dtype="int64")
+        self.items[touched] += per_customer["items"].to_numpy(dtype="int64")
+        np.minimum.at(self.first, touched, per_customer["first"].to_numpy(dtype="int64"))
+        np.maximum.at(self.last, touched, per_customer["last"].to_numpy(dtype="int64"))
+        return touched
+
+    def frame(self) -> pd.DataFrame:
+        n = self.size
+        codes = pd.Series(np.arange(n, dtype="int64"))
+        first = pd.to_datetime(np.where(self.first[:n] == NO_FIRST, NO_LAST, self.first[:n]).view("datetime64[ns]"))
+        last = pd.to_datetime(self.last[:n].view("datetime64[ns]"))
+        df = pd.DataFrame({
+            "customer_unique_id": self.ids.decode("customer_unique_id", codes),
+            "total_revenue": self.revenue[:n],
+            "orders_count": self.orders[:n],
+            "items_count": self.items[:n],
+            "first_purchase": first,
+            "last_purchase": last,
+        })
+        # customers in the dictionary without any order yet
+        df = df.loc[df["orders_count"] > 0]
+        df["average_order_value"] = df["total_revenue"] / df["orders_count"]
+        return df.reset_index(drop=True)
+
+    @classmethod
+    def from_frame(cls, rollup: pd.DataFrame) -> "CustomerTotals":
+        """Seed the totals from a previous customer_rollup output (for --incremental)."""
+        totals = cls()
+        codes = totals.ids.encode("customer_unique_id", rollup["customer_unique_id"]).to_numpy()
+        totals._grow(len(totals.ids.values["customer_unique_id"]))
+        totals.revenue[codes] = rollup["total_revenue"].to_numpy(dtype="float64")
+        totals.orders[codes] = rollup["orders_count"].to_numpy(dtype="int64")
+        totals.items[codes] = rollup["items_count"].to_numpy(dtype="int64")
+        totals.first[codes] = timestamps_ns(rollup["first_purchase"])
+        totals.last[codes] = timestamps_ns(rollup["last_purchase"])
+        totals.first[totals.first == NO_LAST] = NO_FIRST
+        return totals
+
+
+class TopK:
+    """
+    Bounded heap of the K customers with the highest lifetime revenue.
+
+    After each chunk only the customers that chunk touched can have moved, so
+    the new top-K is the K largest of the current members (re-read from the
+    totals) and the K best touched customers: O(K log K) per chunk, independent
+    of the number of customers. This is exact as long as totals only grow
+    (non-negative order revenue); rebuild() recomputes it from all totals.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.members: List[int] = []
+
+    def update(self, touched: np.ndarray, revenue: np.ndarray) -> None:
+        if len(touched) > self.k:
+            touched = touched[np.argpartition(revenue[touched], -self.k)[-self.k:]]
+        candidates = set(self.members).union(touched.tolist())
+        self.members = heapq.nlargest(self.k, candidates, key=lambda code: (revenue[code], -code))
+
+    def rebuild(self, revenue: np.ndarray, size: int) -> None:
+        self.members = []
+        self.update(np.arange(size, dtype="int64"), revenue)
+
+    def frame(self, totals: CustomerTotals) -> pd.DataFrame:
+        codes = np.asarray(self.members, dtype="int64")
+        return pd.DataFrame({
+            "rank": np.arange(1, len(codes) + 1),
+            "customer_unique_id": totals.ids.decode("customer_unique_id", pd.Series(codes)).to_numpy(),
+            "total_revenue": totals.revenue[codes],
+            "orders_count": totals.orders[codes],
+        })
+
+
+def timestamps_ns(values: pd.Series) -> np.ndarray:
+    """Datetimes as int64 nanoseconds; NaT becomes min int64."""
+    return pd.to_datetime(values, errors="coerce").to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+def customer_codes(customers: pd.DataFrame, ids: IdDictionary) -> Tuple[pd.Index, np.ndarray]:
+    """customer_id index plus the customer_unique_id code of each entry (the join key map)."""
+    customers = customers.drop_duplicates("customer_id")
+    codes = ids.encode("customer_unique_id", customers["customer_unique_id"]).to_numpy()
+    return pd.Index(customers["customer_id"]), codes
+
+
+def rollup_orders(
+    chunks: Iterable[pd.DataFrame],
+    customer_index: pd.Index,
+    unique_codes: np.ndarray,
+    totals: CustomerTotals,
+    top: TopK,
+    since_ns: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Stream order chunks into `totals` and `top`. With `since_ns`, only orders
+    purchased after that instant are counted (incremental runs).
+    """
+    stats = {"orders": 0, "unmatched": 0, "max_purchase_ns": NO_LAST}
+    for chunk in chunks:
+        purchase = timestamps_ns(chunk["order_purchase_timestamp"])
+        if since_ns is not None:
+            keep = purchase > since_ns
+            chunk, purchase = chunk.loc[keep], purchase[keep]
+        pos = customer_index.get_indexer(chunk["customer_id"])
+        codes = np.where(pos >= 0, unique_codes[pos], -1)
+        stats["orders"] += len(chunk)
+        stats["unmatched"] += int((codes < 0).sum())
+        if len(purchase):
+            stats["max_purchase_ns"] = max(stats["max_purchase_ns"], int(purchase.max()))
+        touched = totals.add(
+            codes,
+            chunk["order_revenue"].to_numpy(dtype="float64"),
+            chunk["items_count"].fillna(0).to_numpy(dtype="int64"),
+            purchase,
+        )
+        top.update(touched, totals.revenue)
+        if top.members:
+            best = top.members[0]
+            logging.debug("After %d orders: %d customers, top revenue %.2f",
+                          stats["orders"], totals.size, totals.revenue[best])
+    return stats
+
+
+def read_meta(path: Path) -> Optional[dict]:
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def write_meta(path: Path, watermark_ns: int, orders: int) -> None:
+    watermark = None if watermark_ns == NO_LAST else pd.Timestamp(watermark_ns).isoformat()
+    atomic_write_text(path, json.dumps({"watermark": watermark, "orders": orders}, indent=2))
+
+
+def log_summary(rollup: pd.DataFrame, stats: Dict[str, int]) -> None:
+    logging.info("Orders rolled up: %d (unmatched customer_id: %d)", stats["orders"], stats["unmatched"])
+    logging.info("Customers: %d", len(rollup))
+    logging.info("Repeat customers (2+ orders): %d", int((rollup["orders_count"] > 1).sum()))
+    logging.info("Total lifetime revenue: %.2f", rollup["total_revenue"].sum())
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build lifetime metrics and top customers per customer_unique_id.")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Add only orders purchased after the last run's watermark to the existing rollup "
+             "(edited or late-arriving older orders need a full run).",
+    )
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                        help=f"Number of top customers by revenue to keep (default: {DEFAULT_TOP_K}).")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Orders read per chunk (default: {DEFAULT_CHUNKSIZE}).")
+    parser.add_argument("--csv-export", action="store_true", help="Also write CSV copies of the outputs.")
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    stage_metrics = StageMetrics("customer_rollup")
+
+    totals, since_ns = CustomerTotals(), None
+    meta = read_meta(CUSTOMER_ROLLUP_META)
+    if args.incremental and meta and CUSTOMER_ROLLUP_PATH.exists():
+        with stage_metrics.step("load_previous", read_path=CUSTOMER_ROLLUP_PATH) as step:
+            totals = CustomerTotals.from_frame(read_table(CUSTOMER_ROLLUP_PATH))
+            since_ns = timestamps_ns(pd.Series([meta["watermark"]]))[0]
+            step.rows_out = totals.size
+        logging.info("Incremental run: adding orders purchased after %s", meta["watermark"])
+
+    customers_path = find_table(CUSTOMERS_PATH)
+    logging.info("Loading customers from: %s", customers_path)
+    with stage_metrics.step("load_customers", read_path=customers_path) as step:
+        customers = read_table(customers_path, columns=["customer_id", "customer_unique_id"])
+        customer_index, unique_codes = customer_codes(customers, totals.ids)
+        del customers
+        step.rows_out = len(customer_index)
+
+    top = TopK(args.top_k)
+    if since_ns is not None:
+        top.rebuild(totals.revenue, totals.size)
+
+    enriched_path = find_table(ENRICHED_PATH)
+    logging.info("Streaming enriched orders from: %s", enriched_path)
+    with stage_metrics.step("rollup_orders", read_path=enriched_path) as step:
+        stats = rollup_orders(
+            iter_table(enriched_path, args.chunksize, columns=ORDER_COLS),
+            customer_index, unique_codes, totals, top, since_ns,
+        )
+        step.rows_in = stats["orders"]
+        step.rows_out = totals.size
+
+    rollup = totals.frame()
+    top_customers = top.frame(totals)
+    if since_ns is not None:
+        stats["max_purchase_ns"] = max(stats["max_purchase_ns"], int(since_ns))
+        stats["orders"] += meta.get("orders", 0)
+    log_summary(rollup, stats)
+
+    with stage_metrics.step("write_rollup", rows_in=len(rollup), write_path=CUSTOMER_ROLLUP_PATH):
+        write_table(rollup, CUSTOMER_ROLLUP_PATH, csv_export=args.csv_export)
+        write_table(top_customers, TOP_CUSTOMERS_PATH, csv_export=args.csv_export)
+        write_meta(CUSTOMER_ROLLUP_META, stats["max_purchase_ns"], stats["orders"])
+    logging.info("Saved customer rollup to: %s", CUSTOMER_ROLLUP_PATH)
+    logging.info("Saved top %d customers to: %s", len(top_customers), TOP_CUSTOMERS_PATH)
+
+    stage_metrics.log_summary()
+    if args.metrics_json:
+        stage_metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        stage_metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
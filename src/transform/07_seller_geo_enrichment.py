@@ -0,0 +1,234 @@
+from pathlib import Path
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from instrumentation import StageMetrics
+from schema import restore_frame, zip_prefixes
+from storage import TableWriter, find_table, iter_table, read_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# OLIST_DATA_DIR points a run at another data tree (e.g. generated benchmark data)
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+RAW_DIR = DATA_DIR / "raw"
+ORDER_ITEMS_PATH = RAW_DIR / "olist_order_items_dataset.csv"
+ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.parquet"
+CUSTOMERS_PATH = PROCESSED_DIR / "customers_cleaned.parquet"
+PRODUCTS_PATH = PROCESSED_DIR / "products_cleaned.parquet"
+SELLERS_PATH = RAW_DIR / "olist_sellers_dataset.csv"
+TRANSLATION_PATH = RAW_DIR / "product_category_name_translation.csv"
+ENRICHED_ITEMS_PATH = PROCESSED_DIR / "enriched_order_items.parquet"
+
+ORDER_ITEM_COLS = ["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"]
+DEFAULT_CHUNKSIZE = 500_000
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+class ArrayLookup:
+    """
+    Key -> attribute lookup precomputed once from a dimension table.
+
+    Keys are hashed into a pd.Index, and every attribute is dictionary-encoded
+    to int codes stored in an array aligned with that index. Enriching a chunk
+    is then one get_indexer() per key column plus array takes per attribute;
+    no merge and no copy of the chunk. Attributes that share a `domain` have
+    directly comparable codes.
+    """
+
+    def __init__(self, index: pd.Index, codes: Dict[str, np.ndarray], domains: Dict[str, pd.Index]):
+        self.index = index
+        # each code array ends with a -1 slot, so a missed key (position -1) reads as unknown
+        self.codes = codes
+        self.domains = domains
+
+    @classmethod
+    def from_table(cls, keys: pd.Series, attributes: Dict[str, pd.Series], domains: Dict[str, pd.Index]) -> "ArrayLookup":
+        first = ~keys.duplicated().to_numpy()
+        codes = {
+            name: np.append(domains[name].get_indexer(values.to_numpy()[first]), -1).astype(code_dtype(domains[name]))
+            for name, values in attributes.items()
+        }
+        return cls(pd.Index(keys.to_numpy()[first]), codes, dict(domains))
+
+    def through(self, keys: pd.Series, foreign_keys: pd.Series) -> "ArrayLookup":
+        """Lookup keyed by `keys` that returns this lookup's attributes for `foreign_keys` (resolved once)."""
+        first = ~keys.duplicated().to_numpy()
+        pos = self.positions(foreign_keys[first])
+        codes = {name: np.append(c[pos], -1).astype(c.dtype) for name, c in self.codes.items()}
+        return ArrayLookup(pd.Index(keys.to_numpy()[first]), codes, self.domains)
+
+    def add_mapped(self, source: str, name: str, mapping: np.ndarray, domain: pd.Index) -> None:
+        """New attribute whose code is mapping[code of `source`] (mapping ends with a -1 slot)."""
+        self.codes[name] = mapping[self.codes[source]]
+        self.domains[name] = domain
+
+    def positions(self, keys: pd.Series) -> np.ndarray:
+        return self.index.get_indexer(keys)
+
+    def take(self, name: str, positions: np.ndarray) -> np.ndarray:
+        return self.codes[name][positions]
+
+    def categorical(self, name: str, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=self.domains[name])
+
+
+def code_dtype(domain: pd.Index) -> str:
+    return "int16" if len(domain) < np.iinfo("int16").max else "int32"
+
+
+def value_domain(*columns: pd.Series) -> pd.Index:
+    """Sorted distinct non-null values over one or more columns (a shared dictionary)."""
+    values = pd.concat([c.astype(object) for c in columns], ignore_index=True).dropna().unique()
+    return pd.Index(sorted(values))
+
+
+def build_lookups(
+    orders: pd.DataFrame,
+    customers: pd.DataFrame,
+    sellers: pd.DataFrame,
+    products: pd.DataFrame,
+    translation: pd.DataFrame,
+) -> Dict[str, ArrayLookup]:
+    """
+    order_id -> customer attributes (each order resolved to its customer once),
+    seller_id -> seller attributes, product_id -> category and English name.
+    Customer and seller states share one dictionary for the same-state flag.
+    """
+    customers = customers.assign(customer_zip_code_prefix=zip_prefixes(customers["customer_zip_code_prefix"]))
+    sellers = sellers.assign(seller_zip_code_prefix=zip_prefixes(sellers["seller_zip_code_prefix"]))
+    states = value_domain(customers["customer_state"], sellers["seller_state"])
+    zips = value_domain(customers["customer_zip_code_prefix"], sellers["seller_zip_code_prefix"])
+    categories = value_domain(products["product_category_name"], translation["product_category_name"])
+    english = value_domain(translation["product_category_name_english"])
+
+    customer_lookup = ArrayLookup.from_table(
+        customers["customer_id"],
+        {"customer_state": customers["customer_state"], "customer_zip_code_prefix": customers["customer_zip_code_prefix"]},
+        {"customer_state": states, "customer_zip_code_prefix": zips},
+    )
+    seller_lookup = ArrayLookup.from_table(
+        sellers["seller_id"],
+        {
+            "seller_state": sellers["seller_state"],
+            "seller_zip_code_prefix": sellers["seller_zip_code_prefix"],
+            "seller_city": sellers["seller_city"],
+        },
+        {"seller_state": states, "seller_zip_code_prefix": zips, "seller_city": value_domain(sellers["seller_city"])},
+    )
+    product_lookup = ArrayLookup.from_table(
+        products["product_id"],
+        {"product_category_name": products["product_category_name"]},
+        {"product_category_name": categories},
+    )
+    # category code -> English name code, so the translation is one more array take
+    translation = translation.drop_duplicates("product_category_name")
+    to_english = np.full(len(categories) + 1, -1, dtype=code_dtype(english))
+    to_english[categories.get_indexer(translation["product_category_name"])] = english.get_indexer(
+        translation["product_category_name_english"]
+    )
+    product_lookup.add_mapped("product_category_name", "product_category_name_english", to_english, english)
+
+    return {
+        "order": customer_lookup.through(orders["order_id"], orders["customer_id"]),
+        "seller": seller_lookup,
+        "product": product_lookup,
+    }
+
+
+def enrich_items(items: pd.DataFrame, lookups: Dict[str, ArrayLookup]) -> pd.DataFrame:
+    """Add customer/seller geography and category names to one chunk of order items."""
+    out = items.reset_index(drop=True)
+    codes = {}
+    for key, lookup in (("order_id", lookups["order"]), ("seller_id", lookups["seller"]), ("product_id", lookups["product"])):
+        pos = lookup.positions(items[key])
+        for name in lookup.codes:
+            codes[name] = lookup.take(name, pos)
+            out[name] = lookup.categorical(name, codes[name])
+
+    # both states come from the same dictionary, so equal codes mean equal states
+    customer_state, seller_state = codes["customer_state"], codes["seller_state"]
+    same_state = pd.array(customer_state == seller_state, dtype="boolean")
+    same_state[(customer_state < 0) | (seller_state < 0)] = pd.NA
+    out["same_state"] = same_state
+    return out
+
+
+def log_summary(summary: Dict[str, int]) -> None:
+    logging.info("Order items enriched: %d", summary["items"])
+    logging.info("Items without customer match: %d", summary["no_customer"])
+    logging.info("Items without seller match: %d", summary["no_seller"])
+    logging.info("Items without English category: %d", summary["no_translation"])
+    logging.info("Same-state items: %d", summary["same_state"])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Add seller geography, customer/seller same-state flags and English category names to order items."
+    )
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Order items per chunk (default: {DEFAULT_CHUNKSIZE}).")
+    parser.add_argument("--csv-export", action="store_true", help="Also write a CSV copy of the output.")
+    parser.add_argument("--metrics-json", type=Path, default=None, help="Write per-step metrics as JSON.")
+    parser.add_argument("--metrics-prom", type=Path, default=None, help="Write per-step metrics as a Prometheus textfile.")
+    return parser.parse_args(argv)
+
+
+def load_dimension(path: Path, columns: Sequence[str], stage_metrics: StageMetrics, name: str) -> pd.DataFrame:
+    path = find_table(path)
+    with stage_metrics.step(f"load_{name}", read_path=path) as step:
+        df = read_table(path, columns=columns)
+        step.rows_out = len(df)
+    return df
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    stage_metrics = StageMetrics("seller_geo")
+
+    orders = load_dimension(ENRICHED_PATH, ["order_id", "customer_id"], stage_metrics, "orders")
+    customers = load_dimension(
+        CUSTOMERS_PATH, ["customer_id", "customer_zip_code_prefix", "customer_state"], stage_metrics, "customers"
+    )
+    sellers = load_dimension(
+        SELLERS_PATH, ["seller_id", "seller_zip_code_prefix", "seller_city", "seller_state"], stage_metrics, "sellers"
+    )
+    products = load_dimension(PRODUCTS_PATH, ["product_id", "product_category_name"], stage_metrics, "products")
+    translation = load_dimension(
+        TRANSLATION_PATH, ["product_category_name", "product_category_name_english"], stage_metrics, "translation"
+    )
+
+    with stage_metrics.step("build_lookups", rows_in=len(orders) + len(sellers) + len(products)):
+        lookups = build_lookups(orders, customers, sellers, products, translation)
+    del orders, customers, sellers, products, translation
+
+    summary = {"items": 0, "no_customer": 0, "no_seller": 0, "no_translation": 0, "same_state": 0}
+    logging.info("Streaming order items from: %s", ORDER_ITEMS_PATH)
+    with stage_metrics.step("enrich_items", read_path=ORDER_ITEMS_PATH, write_path=ENRICHED_ITEMS_PATH) as step:
+        with TableWriter(ENRICHED_ITEMS_PATH, csv_export=args.csv_export) as writer:
+            for chunk in iter_table(ORDER_ITEMS_PATH, args.chunksize, columns=ORDER_ITEM_COLS):
+                enriched = enrich_items(chunk, lookups)
+                summary["items"] += len(enriched)
+                summary["no_customer"] += int(enriched["customer_state"].isna().sum())
+                summary["no_seller"] += int(enriched["seller_state"].isna().sum())
+                summary["no_translation"] += int(enriched["product_category_name_english"].isna().sum())
+                summary["same_state"] += int(enriched["same_state"].sum())
+                writer.write(restore_frame(enriched))
+        step.rows_in = step.rows_out = summary["items"]
+
+    log_summary(summary)
+    logging.info("Saved enriched order items to: %s", ENRICHED_ITEMS_PATH)
+
+    stage_metrics.log_summary()
+    if args.metrics_json:
+        stage_metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        stage_metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
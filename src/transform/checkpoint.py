@@ -0,0 +1,156 @@
+"""
+Checkpoints for resumable stage runs.
+
+A checkpoint is one intermediate table plus a manifest next to it:
+
+    <root>/<name>.parquet
+    <root>/<name>.manifest.json   {"key": ..., "sha256": ..., "rows": ..., "created": ..., "last_used": ...}
+
+The table is committed first (written to a temp file and renamed), then the
+manifest, the same way. So a manifest only ever describes a complete table,
+and a crash at any point leaves either no checkpoint or a valid one.
+
+`key` describes everything the table was computed from: the sha256 of each
+input file, the parameters and the code digest (see run_key). Keying on the
+files rather than on in-memory data means a rerun can decide what to reuse
+before it reads or joins anything. A rerun reuses a checkpoint only when its
+key matches and the table still has the recorded sha256. Anything else is
+recomputed and overwritten.
+
+prune() applies the retention policy. It removes checkpoints not used for
+`retention_days`, tables without a manifest (a crash between the two
+renames) and temp files left by killed runs.
+"""
+from pathlib import Path
+from typing import List, Optional, Sequence
+import datetime as dt
+import hashlib
+import json
+import logging
+import sys
+import time
+
+import pandas as pd
+
+from storage import atomic_write_text, file_digest, read_table, write_table
+
+DEFAULT_RETENTION_DAYS = 7.0
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def code_digest(paths: Sequence[Path]) -> str:
+    """One digest over the source files whose logic produced a checkpoint."""
+    h = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        h.update(path.name.encode("utf-8"))
+        h.update(file_digest(path).encode("ascii"))
+    return h.hexdigest()
+
+
+def loaded_module_files(directory: Path) -> List[Path]:
+    """Source files of the modules loaded from `directory`, so a digest covers every helper a stage imports."""
+    directory = Path(directory).resolve()
+    files = set()
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and Path(path).suffix == ".py" and Path(path).resolve().parent == directory:
+            files.add(Path(path).resolve())
+    return sorted(files)
+
+
+def _now() -> str:
+    return dt.datetime.now().isoformat(timespec="seconds")
+
+
+class CheckpointStore:
+    def __init__(self, root: Path, retention_days: float = DEFAULT_RETENTION_DAYS):
+        self.root = Path(root)
+        self.retention_days = retention_days
+        self.hits = 0
+        self.misses = 0
+
+    def table_path(self, name: str) -> Path:
+        return self.root / f"{name}.parquet"
+
+    def manifest_path(self, name: str) -> Path:
+        return self.root / f"{name}{MANIFEST_SUFFIX}"
+
+    def _manifest(self, name: str) -> Optional[dict]:
+        try:
+            return json.loads(self.manifest_path(name).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def load(self, name: str, key: dict) -> Optional[pd.DataFrame]:
+        """The checkpointed table if its key matches `key` and its checksum verifies, else None."""
+        manifest = self._manifest(name)
+        path = self.table_path(name)
+        if manifest is None or not path.exists():
+            self.misses += 1
+            return None
+        if manifest.get("key") != key:
+            logging.info("Checkpoint %s is stale (inputs, parameters or code changed)", name)
+            self.misses += 1
+            return None
+        if file_digest(path) != manifest.get("sha256"):
+            logging.warning("Checkpoint %s failed its checksum; recomputing", name)
+            self.misses += 1
+            return None
+        df = read_table(path)
+        manifest["last_used"] = _now()
+        atomic_write_text(self.manifest_path(name), json.dumps(manifest, indent=2))
+        self.hits += 1
+        return df
+
+    def save(self, name: str, key: dict, df: pd.DataFrame) -> None:
+        path = self.table_path(name)
+        write_table(df, path)
+        manifest = {"key": key, "sha256": file_digest(path), "rows": len(df), "created": _now(), "last_used": _now()}
+        atomic_write_text(self.manifest_path(name), json.dumps(manifest, indent=2))
+
+    def prune(self, retention_days: Optional[float] = None) -> int:
+        """Apply the retention policy; returns the number of files removed."""
+        if not self.root.exists():
+            return 0
+        days = self.retention_days if retention_days is None else retention_days
+        cutoff = (dt.datetime.now() - dt.timedelta(days=days)).isoformat(timespec="seconds")
+        removed = 0
+        for manifest_file in self.root.glob(f"*{MANIFEST_SUFFIX}"):
+            name = manifest_file.name[: -len(MANIFEST_SUFFIX)]
+            manifest = self._manifest(name)
+            if manifest is None or manifest.get("last_used", "") < cutoff:
+                for path in (self.table_path(name), manifest_file):
+                    if path.exists():
+                        path.unlink()
+                        removed += 1
+        for table in self.root.glob("*.parquet"):
+            if not self.manifest_path(table.stem).exists():
+                table.unlink()
+                removed += 1
+        # temp files of killed runs (a live writer's file is younger than an hour)
+        for tmp in self.root.glob(".*.tmp"):
+            if time.time() - tmp.stat().st_mtime > 3600:
+                tmp.unlink()
+                removed += 1
+        if removed:
+            logging.info("Pruned %d checkpoint file(s) from %s", removed, self.root)
+        return removed
+
+    def clear(self) -> None:
+        self.prune(retention_days=-1)
+
+
+def partition_name(prefix: str, index: int, n_partitions: int) -> str:
+    width = len(str(n_partitions - 1))
+    return f"{prefix}_p{index:0{width}d}_of_{n_partitions}"
+
+
+def run_key(inputs: Sequence[Path], params: dict, code: str) -> dict:
+    """Checkpoint key of a run: the sha256 of each input file plus the parameters and the code digest."""
+    # digest the parameters: floats such as NaN would not compare equal after a JSON round trip
+    params_digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return {
+        "inputs": {Path(p).name: file_digest(p) for p in inputs},
+        "params": params_digest,
+        "code": code,
+    }
@@ -0,0 +1,260 @@
+"""
+DuckDB backend for the enrichment stage (04_revenue_enrichment.py --backend duckdb).
+
+The pandas functions compute_order_metrics and compute_category_revenue_insights
+are expressed as SQL over the Parquet/CSV inputs. DuckDB scans the files itself,
+and the results go straight to Parquet with COPY, so the order_items table never
+lives in Python memory. Joins, aggregates and the final sort spill to
+`temp_dir` once `memory_limit` is reached. That lets the stage run on inputs
+larger than RAM.
+
+Semantics follow the pandas path: the same left join, quantile_cont for
+pandas' linear quantile, NaN-safe comparisons for the abnormal mask, zeros
+for orders without items, and the cleaned orders' row order. Float sums
+may differ from pandas in the last bits; benchmarks/check_duckdb_parity.py
+compares the two backends.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+import logging
+import math
+
+import pyarrow as pa
+
+from sketches import MIN_CATEGORY_ITEMS
+from storage import CSV_SUFFIXES, PARQUET_SUFFIXES, atomic_path, csv_path
+
+try:
+    import duckdb
+except ImportError:  # optional: only needed for --backend duckdb
+    duckdb = None
+
+# pandas dtypes the pandas backend writes that DuckDB has no equivalent for; recorded in
+# the Parquet pandas metadata so both backends read back with the same dtypes
+PANDAS_DTYPES = {"has_abnormal_item": "boolean"}
+
+ORDER_METRIC_COLS = [
+    "order_revenue", "total_freight", "items_count", "average_item_price", "distinct_categories",
+    "average_product_weight", "total_volume_cm3", "abnormal_items_count",
+]
+
+
+def _quote(value: Union[str, Path]) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def scan(path: Path, row_number: bool = False) -> str:
+    """Table function reading `path` in place; `row_number` adds file_row_number for Parquet."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        extra = ", file_row_number = true" if row_number else ""
+        return f"read_parquet({_quote(path)}{extra})"
+    if suffix in CSV_SUFFIXES:
+        return f"read_csv({_quote(path)}, header = true)"
+    raise ValueError(f"Unsupported table format for the duckdb backend: {path}")
+
+
+def connect(
+    memory_limit: Optional[str] = None,
+    temp_dir: Optional[Path] = None,
+    threads: Optional[int] = None,
+):
+    if duckdb is None:
+        raise RuntimeError("duckdb is required for --backend duckdb (pip install duckdb)")
+    con = duckdb.connect()
+    if memory_limit:
+        con.execute(f"SET memory_limit = {_quote(memory_limit)}")
+    if temp_dir:
+        Path(temp_dir).mkdir(parents=True, exist_ok=True)
+        con.execute(f"SET temp_directory = {_quote(temp_dir)}")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    return con
+
+
+def register_inputs(con, orders_path: Path, order_items_path: Path, products_path: Path) -> None:
+    """Views over the input files: orders (with its file row order), and the order_items+products join."""
+    orders = scan(orders_path, row_number=True)
+    if Path(orders_path).suffix.lower() in CSV_SUFFIXES:
+        # CSV has no file_row_number; a scan keeps insertion order for row_number() OVER ()
+        orders = f"(SELECT *, row_number() OVER () - 1 AS file_row_number FROM {scan(orders_path)})"
+    con.execute(f"CREATE OR REPLACE VIEW orders AS SELECT * FROM {orders}")
+    con.execute(f"""
+        CREATE OR REPLACE VIEW order_items_products AS
+        SELECT
+            i.order_id, i.order_item_id, i.price, i.freight_value,
+            p.product_category_name, p.product_weight_g,
+            p.product_length_cm, p.product_height_cm, p.product_width_cm,
+            p.product_length_cm * p.product_height_cm * p.product_width_cm AS item_volume_cm3
+        FROM (SELECT order_id, order_item_id, product_id, price, freight_value FROM {scan(order_items_path)}) i
+        LEFT JOIN (
+            SELECT product_id, product_category_name, product_weight_g,
+                   product_length_cm, product_height_cm, product_width_cm
+            FROM {scan(products_path)}
+        ) p USING (product_id)
+    """)
+
+
+def abnormal_thresholds(con, quantile: float = 0.99, per_category: bool = False) -> Tuple[float, float]:
+    """
+    Global weight/volume percentiles as scalars. With `per_category`, a
+    category_thresholds table (categories with at least MIN_CATEGORY_ITEMS
+    items) is created as well, as in the pandas per-category mode.
+    """
+    weight, volume = con.execute(f"""
+        SELECT quantile_cont(product_weight_g, {quantile}), quantile_cont(item_volume_cm3, {quantile})
+        FROM order_items_products
+    """).fetchone()
+    if per_category:
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE category_thresholds AS
+            SELECT product_category_name,
+                   quantile_cont(product_weight_g, {quantile}) AS weight_threshold,
+                   quantile_cont(item_volume_cm3, {quantile}) AS volume_threshold
+            FROM order_items_products
+            WHERE product_category_name IS NOT NULL
+            GROUP BY product_category_name
+            HAVING count(*) >= {MIN_CATEGORY_ITEMS}
+        """)
+    # quantile_cont is NULL when every value is; pandas gives NaN there
+    return (math.nan if weight is None else float(weight)), (math.nan if volume is None else float(volume))
+
+
+def _double(value: float) -> str:
+    """A float as a DOUBLE literal; repr() of NaN/inf is no valid SQL."""
+    return repr(value) if math.isfinite(value) else f"'{value}'::DOUBLE"
+
+
+def order_metrics_sql(thresholds: Tuple[float, float], per_category: bool = False) -> str:
+    """The order-level metrics and abnormal flags as one GROUP BY order_id (the SQL form of compute_order_metrics)."""
+    w_p99, v_p99 = thresholds
+    source = "order_items_products"
+    weight_limit, volume_limit = _double(w_p99), _double(v_p99)
+    if per_category:
+        source = "order_items_products LEFT JOIN category_thresholds USING (product_category_name)"
+        weight_limit = f"coalesce(weight_threshold, {weight_limit})"
+        volume_limit = f"coalesce(volume_threshold, {volume_limit})"
+    # comparisons with NULL are NULL; coalesce keeps pandas' "NaN compares False"
+    # (and DuckDB orders NaN above every number, so "> NaN" is false as in pandas)
+    abnormal = f"""coalesce(
+            product_weight_g <= 0 OR product_length_cm <= 0 OR product_height_cm <= 0
+            OR product_width_cm <= 0 OR item_volume_cm3 <= 0
+            OR product_weight_g > {weight_limit} OR item_volume_cm3 > {volume_limit}, false)"""
+    return f"""
+        SELECT
+            order_id,
+            sum(price) AS order_revenue,
+            sum(freight_value) AS total_freight,
+            count(order_item_id) AS items_count,
+            avg(price) AS average_item_price,
+            count(DISTINCT product_category_name) AS distinct_categories,
+            avg(product_weight_g) AS average_product_weight,
+            sum(item_volume_cm3) AS total_volume_cm3,
+            count(*) FILTER (WHERE {abnormal}) AS abnormal_items_count
+        FROM {source}
+        GROUP BY order_id
+    """
+
+
+def enriched_orders_sql(thresholds: Tuple[float, float], per_category: bool = False) -> str:
+    """Orders left-joined to their metrics, zero-filled like build_enriched_orders, in file row order."""
+    filled = ",\n            ".join(f"CAST(coalesce(m.{c}, 0) AS DOUBLE) AS {c}" for c in ORDER_METRIC_COLS)
+    return f"""
+        SELECT
+            o.* EXCLUDE (file_row_number),
+            {filled},
+            coalesce(m.abnormal_items_count, 0) > 0 AS has_abnormal_item
+        FROM orders o
+        LEFT JOIN ({order_metrics_sql(thresholds, per_category)}) m USING (order_id)
+        ORDER BY o.file_row_number
+    """
+
+
+def category_revenue_insights_sql() -> str:
+    """
+    compute_category_revenue_insights: per-category totals, ranked, with the
+    revenue share (0 when the total is not positive, as in pandas).
+    """
+    return """
+        SELECT
+            product_category_name,
+            coalesce(sum(price), 0) AS category_revenue,
+            count(order_item_id) AS items_sold,
+            avg(price) AS average_price,
+            CASE WHEN sum(sum(price)) OVER () > 0
+                 THEN coalesce(sum(price), 0) / sum(sum(price)) OVER () * 100
+                 ELSE 0.0 END AS "revenue_share_%"
+        FROM order_items_products
+        WHERE product_category_name IS NOT NULL
+        GROUP BY product_category_name
+        ORDER BY category_revenue DESC, product_category_name
+    """
+
+
+def pandas_metadata(con, query: str) -> str:
+    """
+    The pandas metadata pandas would store for the result of `query`, with
+    PANDAS_DTYPES applied. Built from the zero-row result, so no data is read.
+    """
+    empty = con.execute(f"SELECT * FROM ({query}) LIMIT 0").fetch_arrow_table().to_pandas()
+    empty = empty.astype({c: t for c, t in PANDAS_DTYPES.items() if c in empty.columns})
+    return pa.Schema.from_pandas(empty, preserve_index=False).metadata[b"pandas"].decode("utf-8")
+
+
+def copy_to(con, query: str, path: Path, csv_export: bool = False) -> None:
+    """COPY `query` to Parquet (and a CSV copy), each through a temp file renamed into place."""
+    path = Path(path)
+    metadata = _quote(pandas_metadata(con, query))
+    with atomic_path(path) as tmp:
+        con.execute(
+            f"COPY ({query}) TO {_quote(tmp)} (FORMAT parquet, COMPRESSION zstd, KV_METADATA {{pandas: {metadata}}})"
+        )
+    if csv_export:
+        csv_copy = csv_path(path)
+        with atomic_path(csv_copy) as tmp:
+            con.execute(f"COPY (SELECT * FROM {scan(path)}) TO {_quote(tmp)} (FORMAT csv, HEADER)")
+        logging.info("Exported CSV copy to: %s", csv_copy)
+
+
+def run_enrichment(
+    orders_path: Path,
+    order_items_path: Path,
+    products_path: Path,
+    enriched_path: Path,
+    category_insights_path: Path,
+    per_category: bool = False,
+    csv_export: bool = False,
+    memory_limit: Optional[str] = None,
+    temp_dir: Optional[Path] = None,
+    threads: Optional[int] = None,
+    quantile: float = 0.99,
+) -> Dict[str, float]:
+    """Build both enrichment outputs in DuckDB and return a few counts for the stage log."""
+    con = connect(memory_limit, temp_dir, threads)
+    try:
+        register_inputs(con, orders_path, order_items_path, products_path)
+        thresholds = abnormal_thresholds(con, quantile, per_category)
+        logging.info("Outlier thresholds: weight %.2f, volume %.2f", *thresholds)
+
+        copy_to(con, enriched_orders_sql(thresholds, per_category), enriched_path, csv_export)
+        logging.info("Saved enriched orders to: %s", enriched_path)
+        copy_to(con, category_revenue_insights_sql(), category_insights_path, csv_export)
+        logging.info("Saved category insights to: %s", category_insights_path)
+
+        orders, abnormal_orders, abnormal_items = con.execute(f"""
+            SELECT count(*), count(*) FILTER (WHERE has_abnormal_item), sum(abnormal_items_count)
+            FROM {scan(enriched_path)}
+        """).fetchone()
+        categories = con.execute(f"SELECT count(*) FROM {scan(category_insights_path)}").fetchone()[0]
+    finally:
+        con.close()
+
+    return {
+        "orders": orders,
+        "orders_with_abnormal": abnormal_orders,
+        "abnormal_items": int(abnormal_items or 0),
+        "categories": categories,
+        "weight_p99": thresholds[0],
+        "volume_p99": thresholds[1],
+    }
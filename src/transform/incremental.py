@@ -0,0 +1,151 @@
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+from sketches import ThresholdSketches
+from storage import atomic_write_text, read_table, temp_path, write_table
+
+ORDER_STATE_FILE = "order_state.parquet"
+CATEGORY_STATE_FILE = "order_category_state.parquet"
+CATEGORY_TOTALS_FILE = "category_totals.parquet"
+META_FILE = "meta.json"
+# state key of order items without an order_id, so they are tracked like any other order
+NULL_ORDER_KEY = ""
+# bumped when the meaning of the state files changes; an older state triggers a full rebuild
+STATE_VERSION = 2
+SKETCH_FILE = "threshold_sketches.json"
+
+
+def row_hashes(df: pd.DataFrame, cols: Sequence[str]) -> np.ndarray:
+    """Stable uint64 hash of each row over `cols` (index is ignored)."""
+    return pd.util.hash_pandas_object(df[list(cols)], index=False).to_numpy(dtype="uint64")
+
+
+def item_order_keys(order_ids: pd.Series) -> pd.Series:
+    """order_id of each item as a state key (NULL_ORDER_KEY for items without one)."""
+    return order_ids.astype(object).fillna(NULL_ORDER_KEY)
+
+
+def order_input_hashes(
+    orders: pd.DataFrame,
+    order_items: pd.DataFrame,
+    order_cols: Sequence[str],
+    item_cols: Sequence[str],
+) -> pd.DataFrame:
+    """
+    One content hash per order_id covering the order row and all of its items.
+    Row hashes are summed (mod 2**64) per order, so the result does not depend
+    on row order. Items whose order is not in `orders` (e.g. dropped by the
+    cleaning stage) still count in the category totals, so their order_ids
+    get a hash of their own, as do items without an order_id (NULL_ORDER_KEY).
+    """
+    codes, uniques = pd.factorize(orders["order_id"])
+    item_keys = item_order_keys(order_items["order_id"])
+    keys = pd.Index(uniques).append(pd.Index(item_keys.unique()).difference(pd.Index(uniques)))
+
+    acc = np.zeros(len(keys), dtype="uint64")
+    np.add.at(acc, codes, row_hashes(orders, order_cols))
+    np.add.at(acc, keys.get_indexer(item_keys), row_hashes(order_items, item_cols))
+
+    return pd.DataFrame({"order_id": keys.to_numpy(dtype=object), "input_hash": acc})
+
+
+def diff_order_hashes(previous: pd.DataFrame, current: pd.DataFrame) -> Tuple[pd.Index, pd.Index]:
+    """
+    Compare two order hash tables. Returns (changed, removed): order_ids that
+    are new or whose inputs changed, and order_ids no longer present.
+    """
+    prev_ids = pd.Index(previous["order_id"])
+    pos = prev_ids.get_indexer(current["order_id"])
+    prev_hash = previous["input_hash"].to_numpy(dtype="uint64")
+    cur_hash = current["input_hash"].to_numpy(dtype="uint64")
+
+    is_new = pos < 0
+    is_changed = np.zeros(len(current), dtype=bool)
+    is_changed[~is_new] = prev_hash[pos[~is_new]] != cur_hash[~is_new]
+
+    changed = pd.Index(current["order_id"])[is_new | is_changed]
+    removed = prev_ids.difference(pd.Index(current["order_id"]))
+    return changed, removed
+
+
+class EnrichmentState:
+    """
+    Files kept between enrichment runs under `state_dir`:
+      - order_state.parquet: order_id -> input_hash
+      - order_category_state.parquet: per (order_id, category) revenue/item totals,
+        used to apply category deltas without re-aggregating history
+      - category_totals.parquet: the category totals those contributions add up
+        to; deltas are applied to these, never to the published outputs, which a
+        plain full run may have rewritten since the state was saved
+      - meta.json: outlier thresholds and other run metadata
+      - threshold_sketches.json: quantile sketches behind the thresholds
+        (only with --threshold-mode sketch)
+    """
+
+    def __init__(self, state_dir: Path):
+        self.state_dir = Path(state_dir)
+
+    @property
+    def sketch_path(self) -> Path:
+        return self.state_dir / SKETCH_FILE
+
+    def exists(self) -> bool:
+        """True when a complete state of the current STATE_VERSION is present."""
+        files = (ORDER_STATE_FILE, CATEGORY_STATE_FILE, CATEGORY_TOTALS_FILE, META_FILE)
+        if not all((self.state_dir / f).exists() for f in files):
+            return False
+        try:
+            meta = json.loads((self.state_dir / META_FILE).read_text(encoding="utf-8"))
+        except ValueError:
+            return False
+        if meta.get("state_version") != STATE_VERSION:
+            logging.info("Enrichment state in %s is from an older version; doing a full rebuild", self.state_dir)
+            return False
+        return True
+
+    def load(self) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, dict]:
+        order_state = read_table(self.state_dir / ORDER_STATE_FILE)
+        category_state = read_table(self.state_dir / CATEGORY_STATE_FILE)
+        category_totals = read_table(self.state_dir / CATEGORY_TOTALS_FILE)
+        meta = json.loads((self.state_dir / META_FILE).read_text(encoding="utf-8"))
+        return order_state, category_state, category_totals, meta
+
+    def save(
+        self,
+        order_state: pd.DataFrame,
+        category_state: pd.DataFrame,
+        category_totals: pd.DataFrame,
+        meta: Optional[dict] = None,
+        sketches: Optional[ThresholdSketches] = None,
+    ) -> None:
+        """
+        Write the state into a fresh sibling directory and swap it in, so the
+        files always come from one run. A crash between the two renames leaves
+        no state, and the next --incremental run does a full rebuild. Without
+        `sketches` no sketch file is kept.
+        """
+        self.state_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = temp_path(self.state_dir)
+        retired = self.state_dir.with_name(f".{self.state_dir.name}.old")
+        for leftover in (staging, retired):
+            shutil.rmtree(leftover, ignore_errors=True)
+        staging.mkdir()
+        write_table(order_state, staging / ORDER_STATE_FILE)
+        write_table(category_state, staging / CATEGORY_STATE_FILE)
+        write_table(category_totals, staging / CATEGORY_TOTALS_FILE)
+        if sketches is not None:
+            sketches.save(staging / SKETCH_FILE)
+        meta = {**(meta or {}), "state_version": STATE_VERSION}
+        atomic_write_text(staging / META_FILE, json.dumps(meta, indent=2))
+
+        if self.state_dir.exists():
+            os.replace(self.state_dir, retired)
+        os.replace(staging, self.state_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+        logging.info("Saved enrichment state for %d orders to: %s", len(order_state), self.state_dir)
@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Iterator, List, Optional
+import cProfile
+import json
+import logging
+import os
+import time
+
+from storage import atomic_write_text
+
+try:
+    import psutil
+except ImportError:  # optional: falls back to /proc on Linux
+    psutil = None
+
+# Set to a directory to dump a cProfile .prof file for every @profiled call
+PROFILE_DIR_ENV = "OLIST_PROFILE_DIR"
+
+
+def current_rss_bytes() -> Optional[int]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def file_size(path: Optional[Path]) -> Optional[int]:
+    if path is None:
+        return None
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return None
+
+
+class StepRecord:
+    """Measurements for one named step. Callers fill rows_out / bytes_* inside the `with` block."""
+
+    def __init__(self, name: str, rows_in: Optional[int] = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self.bytes_read: Optional[int] = None
+        self.bytes_written: Optional[int] = None
+        self.seconds = 0.0
+        self.rss_before: Optional[int] = None
+        self.rss_after: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        delta = None
+        if self.rss_before is not None and self.rss_after is not None:
+            delta = self.rss_after - self.rss_before
+        return {
+            "step": self.name,
+            "seconds": round(self.seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "rss_bytes": self.rss_after,
+            "rss_delta_bytes": delta,
+        }
+
+
+class StageMetrics:
+    """
+    Collects per-step timings, row counts, I/O sizes and memory deltas for one
+    pipeline stage, and writes them as JSON or as a Prometheus textfile.
+
+        metrics = StageMetrics("clean_orders")
+        with metrics.step("load", read_path=ORDERS_RAW) as s:
+            orders = read_table(ORDERS_RAW)
+            s.rows_out = len(orders)
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.steps: List[StepRecord] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def step(
+        self,
+        name: str,
+        rows_in: Optional[int] = None,
+        read_path: Optional[Path] = None,
+        write_path: Optional[Path] = None,
+    ) -> Iterator[StepRecord]:
+        record = StepRecord(name, rows_in)
+        record.bytes_read = file_size(read_path)
+        record.rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            record.rss_after = current_rss_bytes()
+            if write_path is not None and record.bytes_written is None:
+                record.bytes_written = file_size(write_path)
+            self.steps.append(record)
+            logging.debug("[%s] %s took %.3fs", self.stage, name, record.seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "total_seconds": round(time.perf_counter() - self._start, 6),
+            "steps": [s.to_dict() for s in self.steps],
+        }
+
+    def log_summary(self) -> None:
+        logging.info("----- TIMINGS (%s) -----", self.stage)
+        for s in self.steps:
+            logging.info("%-28s %8.3fs  rows_out=%s", s.name, s.seconds, s.rows_out)
+
+    def write_json(self, path: Path) -> None:
+        atomic_write_text(path, json.dumps(self.to_dict(), indent=2))
+        logging.info("Saved stage metrics to: %s", path)
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Write a node_exporter textfile-collector file. The file is written to a
+        temp name and renamed so the collector never reads a partial file.
+        """
+        metrics = {
+            "olist_step_seconds": ("Wall time of a pipeline step", "seconds"),
+            "olist_step_rows_in": ("Rows entering a pipeline step", "rows_in"),
+            "olist_step_rows_out": ("Rows leaving a pipeline step", "rows_out"),
+            "olist_step_bytes_read": ("Bytes read by a pipeline step", "bytes_read"),
+            "olist_step_bytes_written": ("Bytes written by a pipeline step", "bytes_written"),
+            "olist_step_rss_delta_bytes": ("Change in resident memory across a pipeline step", "rss_delta_bytes"),
+        }
+        records = [s.to_dict() for s in self.steps]
+        lines = []
+        for metric, (help_text, field) in metrics.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for r in records:
+                if r[field] is not None:
+                    lines.append(f'{metric}{{stage="{self.stage}",step="{r["step"]}"}} {r[field]}')
+        lines.append("# HELP olist_stage_seconds Total wall time of a pipeline stage")
+        lines.append("# TYPE olist_stage_seconds gauge")
+        lines.append(f'olist_stage_seconds{{stage="{self.stage}"}} {self.to_dict()["total_seconds"]}')
+
+        atomic_write_text(path, "\n".join(lines) + "\n")
+        logging.info("Saved Prometheus metrics to: %s", path)
+
+
+def profiled(func):
+    """
+    Mark a hot function. When OLIST_PROFILE_DIR is set, each call is run under
+    cProfile and the stats are dumped to <dir>/<function>-<pid>-<n>.prof
+    (readable with pstats or snakeviz). Otherwise the call is untouched, so
+    sampling profilers such as py-spy see the plain function.
+    """
+    calls = {"n": 0}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        out_dir = os.environ.get(PROFILE_DIR_ENV)
+        if not out_dir:
+            return func(*args, **kwargs)
+        calls["n"] += 1
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(Path(out_dir) / f"{func.__name__}-{os.getpid()}-{calls['n']}.prof")
+
+    return wrapper
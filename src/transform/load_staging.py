@@ -0,0 +1,340 @@
+"""
+Bulk loader for the stg_* staging tables (sql/01_create_staging_tables.sql).
+
+Each processed table is streamed chunk by chunk into Postgres with
+COPY ... FROM STDIN (CSV). The rows go into a fresh UNLOGGED table
+<table>__load, indexes are built once the data is in, and the result replaces
+the live table inside one transaction. Readers see either the old or the new
+table. A failed load leaves the live table untouched.
+
+The COPY itself skips the WAL; the table is switched to LOGGED before the
+swap, because Postgres truncates UNLOGGED tables after a crash and the
+published staging data would silently vanish. --unlogged keeps it UNLOGGED
+for throwaway loads that can be rebuilt from the processed files.
+
+SQLite can stand in for Postgres (--sqlite PATH), e.g. for a quick local
+check: it has no COPY, so chunks go through executemany, but the
+load-table/index/swap steps are the same.
+
+Usage:
+    OLIST_PG_DSN="dbname=ecommerce_project user=postgres" python src/transform/load_staging.py
+    python src/transform/load_staging.py --sqlite /tmp/staging.db --tables stg_orders
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import io
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from storage import find_table, iter_table
+
+try:
+    import psycopg2
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError:  # optional: only needed for Postgres targets
+    psycopg2 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+
+DSN_ENV = "OLIST_PG_DSN"
+DEFAULT_CHUNK_ROWS = 200_000
+LOAD_SUFFIX = "__load"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class TableSpec:
+    """
+    How one staging table is filled: the processed source table, the target
+    columns with their SQL types, and source -> target renames for the names
+    that differ between the two (the DDL keeps the raw "lenght" spelling).
+    `extra_columns` exist in the table but have no source and stay NULL.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        source: str,
+        columns: Sequence[Tuple[str, str]],
+        renames: Optional[Dict[str, str]] = None,
+        primary_key: Optional[Sequence[str]] = None,
+        indexes: Sequence[Sequence[str]] = (),
+        extra_columns: Sequence[Tuple[str, str]] = (),
+    ):
+        self.table = table
+        self.source = source
+        self.columns = list(columns)
+        self.renames = dict(renames or {})
+        self.primary_key = list(primary_key or [])
+        self.indexes = [list(ix) for ix in indexes]
+        self.extra_columns = list(extra_columns)
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    @property
+    def source_columns(self) -> List[str]:
+        back = {target: source for source, target in self.renames.items()}
+        return [back.get(c, c) for c in self.column_names]
+
+
+# Mirrors sql/01_create_staging_tables.sql
+TABLE_SPECS: Dict[str, TableSpec] = {
+    spec.table: spec for spec in [
+        TableSpec(
+            "stg_customers", "customers_cleaned.parquet",
+            [("customer_id", "TEXT"), ("customer_unique_id", "TEXT"), ("customer_zip_code_prefix", "TEXT"),
+             ("customer_city", "TEXT"), ("customer_state", "TEXT")],
+            primary_key=["customer_id"],
+            extra_columns=[("created_at", "TIMESTAMP")],
+        ),
+        TableSpec(
+            "stg_products", "products_cleaned.parquet",
+            [("product_id", "TEXT"), ("product_category_name", "TEXT"), ("product_name_lenght", "INT"),
+             ("product_description_lenght", "INT"), ("product_photos_qty", "INT"), ("product_weight_g", "NUMERIC"),
+             ("product_length_cm", "NUMERIC"), ("product_height_cm", "NUMERIC"), ("product_width_cm", "NUMERIC")],
+            renames={
+                "product_name_length": "product_name_lenght",
+                "product_description_length": "product_description_lenght",
+            },
+            primary_key=["product_id"],
+        ),
+        TableSpec(
+            "stg_orders", "orders_clean.parquet",
+            [("order_id", "TEXT"), ("customer_id", "TEXT"), ("order_status", "TEXT"),
+             ("order_purchase_timestamp", "TIMESTAMP"), ("order_approved_at", "TIMESTAMP"),
+             ("order_delivered_carrier_date", "TIMESTAMP"), ("order_delivered_customer_date", "TIMESTAMP")],
+            primary_key=["order_id"],
+            indexes=[["customer_id"]],
+        ),
+        TableSpec(
+            "stg_order_revenue", "enriched_orders.parquet",
+            [("order_id", "TEXT"), ("order_revenue", "NUMERIC"), ("total_freight", "NUMERIC"),
+             ("items_count", "INT"), ("avg_item_price", "NUMERIC")],
+            renames={"average_item_price": "avg_item_price"},
+            primary_key=["order_id"],
+        ),
+    ]
+}
+
+
+def prepare_chunk(spec: TableSpec, chunk: pd.DataFrame) -> pd.DataFrame:
+    """Rename to the staging column names and format values the way COPY expects them."""
+    df = chunk.rename(columns=spec.renames)[spec.column_names]
+    for name, sql_type in spec.columns:
+        col = df[name]
+        if sql_type == "INT":
+            # processed frames keep some counts as float (e.g. 40.0), which INT rejects
+            df[name] = pd.to_numeric(col, errors="coerce").round().astype("Int64")
+        elif sql_type == "TIMESTAMP" and pd.api.types.is_datetime64_any_dtype(col):
+            df[name] = col.dt.strftime(TIMESTAMP_FORMAT)
+    return df
+
+
+def iter_chunks(spec: TableSpec, processed_dir: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    path = find_table(processed_dir / spec.source)
+    for chunk in iter_table(path, chunk_rows, columns=spec.source_columns):
+        yield prepare_chunk(spec, chunk)
+
+
+class CsvChunkStream(io.RawIOBase):
+    """
+    Read-only file object over a stream of frames, rendered to CSV one chunk at
+    a time. COPY pulls from it with read(), so only one chunk is in memory.
+    """
+
+    def __init__(self, chunks: Iterator[pd.DataFrame]):
+        self._chunks = chunks
+        self._buffer = b""
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.rows += len(chunk)
+            self._buffer = chunk.to_csv(index=False, header=False, na_rep="").encode("utf-8")
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _create_sql(table: str, spec: TableSpec, unlogged: bool) -> str:
+    cols = ", ".join(f"{name} {sql_type}" for name, sql_type in spec.columns + spec.extra_columns)
+    return f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {table} ({cols})"
+
+
+def _index_name(table: str, cols: Sequence[str]) -> str:
+    return f"{table}_{'_'.join(cols)}_idx"
+
+
+class PostgresLoader:
+    """Loads staging tables over a pooled psycopg2 connection, one connection per table."""
+
+    def __init__(self, dsn: str, pool_size: int = 4, logged: bool = True):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is required for Postgres loads (pip install psycopg2-binary)")
+        self.pool = ThreadedConnectionPool(1, pool_size, dsn)
+        self.logged = logged
+
+    def load(self, spec: TableSpec, chunks: Iterator[pd.DataFrame], build_indexes: bool = True) -> int:
+        load_table = spec.table + LOAD_SUFFIX
+        conn = self.pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {load_table}")
+                cur.execute(_create_sql(load_table, spec, unlogged=True))
+                stream = CsvChunkStream(chunks)
+                cur.copy_expert(
+                    f"COPY {load_table} ({', '.join(spec.column_names)}) FROM STDIN WITH (FORMAT csv, NULL '')",
+                    io.BufferedReader(stream, buffer_size=1 << 20),
+                )
+
+                # Indexes are built after the data is in: one sort instead of per-row maintenance
+                renames = []
+                if spec.primary_key:
+                    cur.execute(f"ALTER TABLE {load_table} ADD CONSTRAINT {load_table}_pkey "
+                                f"PRIMARY KEY ({', '.join(spec.primary_key)})")
+                    renames.append(f"ALTER INDEX {load_table}_pkey RENAME TO {spec.table}_pkey")
+                if build_indexes:
+                    for cols in spec.indexes:
+                        name = _index_name(load_table, cols)
+                        cur.execute(f"CREATE INDEX {name} ON {load_table} ({', '.join(cols)})")
+                        renames.append(f"ALTER INDEX {name} RENAME TO {_index_name(spec.table, cols)}")
+                if self.logged:
+                    cur.execute(f"ALTER TABLE {load_table} SET LOGGED")
+                cur.execute(f"ANALYZE {load_table}")
+
+                # The swap: both statements commit together with the load
+                cur.execute(f"DROP TABLE IF EXISTS {spec.table}")
+                cur.execute(f"ALTER TABLE {load_table} RENAME TO {spec.table}")
+                for statement in renames:
+                    cur.execute(statement)
+            return stream.rows
+        finally:
+            self.pool.putconn(conn)
+
+    def close(self) -> None:
+        self.pool.closeall()
+
+
+class SqliteLoader:
+    """SQLite stand-in with the same load/swap steps. Tables are loaded one at a time."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self, spec: TableSpec, chunks: Iterator[pd.DataFrame], build_indexes: bool = True) -> int:
+        load_table = spec.table + LOAD_SUFFIX
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        rows = 0
+        try:
+            conn.execute("BEGIN")
+            conn.execute(f"DROP TABLE IF EXISTS {load_table}")
+            conn.execute(_create_sql(load_table, spec, unlogged=False))
+            placeholders = ", ".join("?" * len(spec.columns))
+            for chunk in chunks:
+                values = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+                conn.executemany(
+                    f"INSERT INTO {load_table} ({', '.join(spec.column_names)}) VALUES ({placeholders})", values
+                )
+                rows += len(chunk)
+            conn.execute(f"DROP TABLE IF EXISTS {spec.table}")
+            conn.execute(f"ALTER TABLE {load_table} RENAME TO {spec.table}")
+            # SQLite cannot add a primary key to an existing table; a unique index enforces the same
+            if spec.primary_key:
+                conn.execute(f"CREATE UNIQUE INDEX {spec.table}_pkey ON {spec.table} ({', '.join(spec.primary_key)})")
+            if build_indexes:
+                for cols in spec.indexes:
+                    conn.execute(f"CREATE INDEX {_index_name(spec.table, cols)} ON {spec.table} ({', '.join(cols)})")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return rows
+
+    def close(self) -> None:
+        pass
+
+
+def load_tables(
+    loader,
+    tables: Sequence[str],
+    processed_dir: Path = PROCESSED_DIR,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    build_indexes: bool = True,
+    jobs: int = 1,
+) -> Dict[str, dict]:
+    """Load `tables` (concurrently with jobs > 1) and return rows and seconds per table."""
+
+    def load_one(table: str) -> Tuple[str, dict]:
+        spec = TABLE_SPECS[table]
+        start = time.perf_counter()
+        rows = loader.load(spec, iter_chunks(spec, processed_dir, chunk_rows), build_indexes)
+        seconds = time.perf_counter() - start
+        logging.info("Loaded %s: %d rows in %.2fs", table, rows, seconds)
+        return table, {"rows": rows, "seconds": round(seconds, 3)}
+
+    if jobs <= 1:
+        return dict(load_one(t) for t in tables)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return dict(pool.map(load_one, tables))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-load processed tables into the stg_* staging tables.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--dsn", default=os.environ.get(DSN_ENV), help=f"Postgres DSN (default: ${DSN_ENV}).")
+    target.add_argument("--sqlite", type=Path, default=None, help="Load into this SQLite file instead.")
+    parser.add_argument("--tables", nargs="+", choices=sorted(TABLE_SPECS), default=list(TABLE_SPECS))
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per COPY buffer.")
+    parser.add_argument("--jobs", type=int, default=2, help="Tables loaded at the same time (Postgres only).")
+    parser.add_argument("--no-indexes", action="store_true", help="Skip the secondary indexes.")
+    parser.add_argument(
+        "--unlogged", action="store_true",
+        help="Keep loaded tables UNLOGGED (faster, but Postgres empties them after a crash).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+
+    if args.sqlite is not None:
+        loader, jobs = SqliteLoader(args.sqlite), 1
+    elif args.dsn:
+        loader, jobs = PostgresLoader(args.dsn, pool_size=max(args.jobs, 1), logged=not args.unlogged), args.jobs
+    else:
+        logging.error("No target: pass --dsn, set %s, or use --sqlite", DSN_ENV)
+        return 2
+
+    try:
+        results = load_tables(loader, args.tables, PROCESSED_DIR, args.chunk_rows, not args.no_indexes, jobs)
+    finally:
+        loader.close()
+
+    logging.info("----- SUMMARY -----")
+    for table, r in results.items():
+        logging.info("%-20s %10d rows %8.2fs", table, r["rows"], r["seconds"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Read-only lookups over the enrichment output, in process or over local HTTP.
+
+The enriched orders table (plus customers_cleaned for customer_unique_id) is
+loaded once into a Snapshot. Each column is kept as a list of JSON-ready
+Python values, with hash indexes from order_id, customer_id and
+customer_unique_id to row positions, and customer revenue totals ranked once
+for top-K queries. A lookup is then a dict probe plus a small dict build,
+and repeated results come from an LRU cache.
+
+Reloads build a new snapshot (and an empty cache) next to the one serving,
+then swap a single reference. Readers take that reference once per request,
+so they see either the old or the new output, never a mix, and never wait
+for a load. With --watch the service polls the input files and reloads when
+the pipeline rewrites them.
+
+    service = LookupService(ENRICHED_PATH, CUSTOMERS_PATH)
+    service.order("e481f51cbdc54678b7cc49136f2d6af7")
+    service.top_customers(5)
+
+    python src/transform/lookup_service.py --port 8765 --watch 5
+    curl localhost:8765/orders/<order_id>
+    curl localhost:8765/customers/<customer_id>/orders
+    curl localhost:8765/customers/unique/<customer_unique_id>/orders
+    curl "localhost:8765/top-customers?k=5&by=customer_unique_id"
+    curl localhost:8765/health
+    curl -X POST localhost:8765/reload
+"""
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage import find_table, read_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+PROCESSED_DIR = DATA_DIR / "processed"
+ENRICHED_PATH = PROCESSED_DIR / "enriched_orders.parquet"
+CUSTOMERS_PATH = PROCESSED_DIR / "customers_cleaned.parquet"
+
+CUSTOMER_KEYS = ("customer_id", "customer_unique_id")
+DEFAULT_CACHE_SIZE = 10_000
+MAX_TOP_K = 1000
+
+
+def _json_values(col: pd.Series) -> list:
+    """Column as a list of JSON-serializable Python values (None for missing)."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime("%Y-%m-%d %H:%M:%S").where(col.notna(), None).tolist()
+    values = col.astype(object).where(col.notna(), None).tolist()
+    # numpy scalars left in object columns are not JSON serializable
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+
+def _positions(keys: pd.Series) -> Dict[Hashable, np.ndarray]:
+    """key -> row positions, in table order."""
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")
+    # missing keys (code -1) sort first and fall outside every range
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(uniques)}
+
+
+def source_signature(paths: Sequence[Path]) -> Tuple:
+    """(path, size, mtime_ns) of each input; a changed signature means the pipeline rewrote it."""
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def _copy_result(result):
+    """A fresh copy of a lookup result (a record, a list of records or None); records hold JSON scalars only."""
+    if isinstance(result, dict):
+        return dict(result)
+    if isinstance(result, list):
+        return [dict(r) for r in result]
+    return result
+
+
+class LRUCache:
+    """Thread-safe LRU cache of query results."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Snapshot:
+    """One immutable, indexed copy of the enrichment output."""
+
+    def __init__(self, enriched: pd.DataFrame, customers: Optional[pd.DataFrame] = None, signature: Tuple = ()):
+        if customers is not None:
+            enriched = enriched.merge(
+                customers[list(CUSTOMER_KEYS)].drop_duplicates("customer_id"),
+                on="customer_id", how="left", validate="m:1",
+            )
+        self.signature = signature
+        self.loaded_at = dt.datetime.now().isoformat(timespec="seconds")
+        self.rows = len(enriched)
+        self.columns = list(enriched.columns)
+        self._values = [_json_values(enriched[c]) for c in self.columns]
+
+        order_ids = enriched["order_id"]
+        self.order_index: Dict[Hashable, int] = dict(zip(order_ids.tolist(), range(len(enriched))))
+        self.customer_index = {k: _positions(enriched[k]) for k in CUSTOMER_KEYS if k in enriched.columns}
+
+        revenue = enriched["order_revenue"].to_numpy(dtype="float64") if "order_revenue" in enriched else None
+        self._ranking: Dict[str, Tuple[list, np.ndarray, np.ndarray]] = {}
+        for key in self.customer_index:
+            totals = (
+                pd.DataFrame({"key": enriched[key], "revenue": revenue})
+                .groupby("key", sort=False)["revenue"].agg(["sum", "size"])
+            )
+            # ties in revenue are broken by key so the ranking is deterministic
+            totals = totals.reset_index().sort_values(["sum", "key"], ascending=[False, True], kind="stable")
+            self._ranking[key] = (totals["key"].tolist(), totals["sum"].to_numpy(), totals["size"].to_numpy())
+
+    @classmethod
+    def load(cls, enriched_path: Path, customers_path: Optional[Path] = None) -> "Snapshot":
+        started = time.perf_counter()
+        paths = [find_table(enriched_path)]
+        enriched = read_table(paths[0])
+        customers = None
+        if customers_path is not None:
+            try:
+                paths.append(find_table(customers_path))
+                customers = read_table(paths[-1], columns=list(CUSTOMER_KEYS))
+            except FileNotFoundError:
+                logging.warning("No customers table at %s; customer_unique_id lookups are disabled", customers_path)
+        snapshot = cls(enriched, customers, source_signature(paths))
+        logging.info("Loaded %d orders from %s in %.2fs", snapshot.rows, paths[0], time.perf_counter() - started)
+        return snapshot
+
+    def record(self, position: int) -> dict:
+        return {c: values[position] for c, values in zip(self.columns, self._values)}
+
+    def order(self, order_id: str) -> Optional[dict]:
+        position = self.order_index.get(order_id)
+        return None if position is None else self.record(position)
+
+    def customer_orders(self, key: str, value: str) -> List[dict]:
+        if key not in self.customer_index:
+            raise KeyError(f"No index on {key}")
+        return [self.record(p) for p in self.customer_index[key].get(value, ())]
+
+    def top_customers(self, k: int, by: str = "customer_id") -> List[dict]:
+        if by not in self._ranking:
+            raise KeyError(f"No index on {by}")
+        keys, totals, counts = self._ranking[by]
+        return [
+            {by: keys[i], "total_revenue": float(totals[i]), "orders": int(counts[i])}
+            for i in range(min(k, len(keys)))
+        ]
+
+
+class LookupService:
+    """Serves lookups from the current snapshot; reload() swaps in a new one without blocking readers."""
+
+    def __init__(
+        self,
+        enriched_path: Path = ENRICHED_PATH,
+        customers_path: Optional[Path] = CUSTOMERS_PATH,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        self.enriched_path = Path(enriched_path)
+        self.customers_path = Path(customers_path) if customers_path else None
+        self.cache_size = cache_size
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        # (snapshot, cache) is swapped as one reference
+        self._state = (Snapshot.load(self.enriched_path, self.customers_path), LRUCache(cache_size))
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._state[0]
+
+    def _cached(self, key: Hashable, compute):
+        snapshot, cache = self._state
+        missing = object()
+        result = cache.get(key, missing)
+        if result is missing:
+            result = compute(snapshot)
+            cache.put(key, result)
+        # callers get their own copy, so changing a returned record cannot change later lookups
+        return _copy_result(result)
+
+    def order(self, order_id: str) -> Optional[dict]:
+        return self._cached(("order", order_id), lambda s: s.order(order_id))
+
+    def customer_orders(self, customer_id: str, key: str = "customer_id") -> List[dict]:
+        return self._cached((key, customer_id), lambda s: s.customer_orders(key, customer_id))
+
+    def top_customers(self, k: int = 10, by: str = "customer_id") -> List[dict]:
+        k = max(0, min(int(k), MAX_TOP_K))
+        return self._cached(("top", by, k), lambda s: s.top_customers(k, by))
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the current pipeline output if it changed (or `force`); returns True if swapped."""
+        with self._reload_lock:
+            paths = [Path(p) for p, _, _ in self.snapshot.signature]
+            try:
+                if not force and source_signature(paths) == self.snapshot.signature:
+                    return False
+                snapshot = Snapshot.load(self.enriched_path, self.customers_path)
+            except (OSError, ValueError) as exc:
+                # a half-written output keeps the old snapshot serving
+                logging.warning("Reload failed, still serving the previous snapshot: %s", exc)
+                return False
+            self._state = (snapshot, LRUCache(self.cache_size))
+            self.reloads += 1
+            return True
+
+    def watch(self, interval: float) -> threading.Thread:
+        """Poll the input files every `interval` seconds in a daemon thread and reload on change."""
+        def loop():
+            while not self._stop.wait(interval):
+                self.reload()
+
+        thread = threading.Thread(target=loop, name="lookup-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def health(self) -> dict:
+        snapshot, cache = self._state
+        return {
+            "rows": snapshot.rows,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "cache_entries": len(cache),
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        }
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    service: LookupService = None
+
+    def _send(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        params = parse_qs(url.query)
+        try:
+            if parts == ["health"]:
+                return self._send(200, self.service.health())
+            if len(parts) == 2 and parts[0] == "orders":
+                record = self.service.order(parts[1])
+                return self._send(200, record) if record else self._send(404, {"error": "order not found"})
+            if len(parts) == 3 and parts[0] == "customers" and parts[2] == "orders":
+                return self._send(200, self.service.customer_orders(parts[1]))
+            if len(parts) == 4 and parts[:2] == ["customers", "unique"] and parts[3] == "orders":
+                return self._send(200, self.service.customer_orders(parts[2], key="customer_unique_id"))
+            if parts == ["top-customers"]:
+                k = int(params.get("k", ["10"])[0])
+                by = params.get("by", ["customer_id"])[0]
+                return self._send(200, self.service.top_customers(k, by))
+        except (KeyError, ValueError) as exc:
+            return self._send(400, {"error": str(exc.args[0]) if exc.args else repr(exc)})
+        self._send(404, {"error": "unknown endpoint"})
+
+    def do_POST(self) -> None:
+        if urlparse(self.path).path.strip("/") == "reload":
+            return self._send(200, {"reloaded": self.service.reload(force=True), **self.service.health()})
+        self._send(404, {"error": "unknown endpoint"})
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug("%s " + format, self.address_string(), *args)
+
+
+def make_server(service: LookupService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    handler = type("BoundLookupHandler", (LookupHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve read-only lookups over the enriched orders.")
+    parser.add_argument("--enriched", type=Path, default=ENRICHED_PATH, help="Enriched orders table.")
+    parser.add_argument("--customers", type=Path, default=CUSTOMERS_PATH,
+                        help="Cleaned customers table (for customer_unique_id lookups).")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: localhost only).")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="LRU cache entries (0 disables).")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS",
+                        help="Poll the input files and hot-reload when they change.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    service = LookupService(args.enriched, args.customers, args.cache_size)
+    if args.watch:
+        service.watch(args.watch)
+    server = make_server(service, args.host, args.port)
+    logging.info("Serving lookups on http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, List, Sequence, TypeVar
+import logging
+import numpy as np
+import pandas as pd
+
+T = TypeVar("T")
+
+
+def hash_partition(keys: pd.Series, n_partitions: int) -> np.ndarray:
+    """Partition number in [0, n_partitions) for each key, stable across runs and processes."""
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype="uint64")
+    return (hashes % np.uint64(n_partitions)).astype("int64")
+
+
+def split_partitions(df: pd.DataFrame, key: str, n_partitions: int) -> List[pd.DataFrame]:
+    """
+    Split `df` into `n_partitions` frames by hash of `key`. All rows sharing a key
+    land in the same partition and keep their original relative order and index.
+    """
+    part = hash_partition(df[key], n_partitions)
+    return [df.loc[part == i] for i in range(n_partitions)]
+
+
+def map_partitions(func: Callable[..., T], partitions: Sequence, workers: int, **kwargs) -> List[T]:
+    """
+    Apply `func(partition, **kwargs)` to each partition in a process pool and
+    return results in partition order. `func` must be a module-level function.
+    With workers <= 1 everything runs in the current process.
+    """
+    call = partial(func, **kwargs)
+    if workers <= 1:
+        return [call(p) for p in partitions]
+
+    logging.info("Running %d partitions on %d worker processes", len(partitions), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(call, partitions))
@@ -0,0 +1,332 @@
+"""
+Dependency-graph runner for the transform stages.
+
+Each stage declares the tables it reads and writes (relative to the data
+directory); edges come from matching one stage's outputs to another's
+inputs. Stages whose dependencies are done run concurrently as subprocesses.
+
+A stage is skipped when the sha256 of its inputs, of its code (the script
+plus the helper modules it imports from this directory) and of its
+arguments match the last successful run recorded in
+processed/.pipeline/<stage>.json, and its outputs are unchanged since.
+So an edit to 04_revenue_enrichment.py only reruns enrichment, while an
+edit to storage.py reruns every stage that imports it.
+
+Outputs are written to a temp file and renamed, and a stage is only recorded
+once it exits cleanly, so a rerun after a crash resumes at the first stage
+that did not finish. With --checkpoint, stages that support it (enrichment)
+also checkpoint their partitions and resume inside the stage. The other
+stages, 03_clean_orders included, resume at stage grain only: a finished
+stage is skipped and an unfinished one reruns from its inputs.
+
+Usage:
+    python src/transform/pipeline.py                  # build everything
+    python src/transform/pipeline.py enrich --jobs 2  # one target plus its upstream stages
+    python src/transform/pipeline.py enrich --no-deps --force
+    python src/transform/pipeline.py --checkpoint     # resumable long rebuilds
+    python src/transform/pipeline.py --dry-run
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+
+from storage import atomic_write_text, file_digest
+
+TRANSFORM_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = TRANSFORM_DIR.parents[1]
+DATA_DIR = Path(os.environ.get("OLIST_DATA_DIR", PROJECT_ROOT / "data"))
+
+IMPORT_PATTERN = re.compile(r"^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))", re.MULTILINE)
+
+
+class Stage:
+    """One pipeline step: a script in src/transform plus the tables it reads and writes."""
+
+    def __init__(
+        self,
+        name: str,
+        script: str,
+        inputs: Sequence[str],
+        outputs: Sequence[str],
+        args: Sequence[str] = (),
+        checkpoint_args: Sequence[str] = (),
+    ):
+        self.name = name
+        self.script = TRANSFORM_DIR / script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = list(args)
+        # passed with --checkpoint; they change how a stage resumes, not what it writes
+        self.checkpoint_args = list(checkpoint_args)
+
+
+# Raw tables come from codes/00_download_dataset.py, which needs Kaggle
+# credentials and is therefore left out of the graph.
+STAGES: Dict[str, Stage] = {
+    s.name: s for s in [
+        Stage(
+            "clean_customers", "01_clean_customers.py",
+            inputs=["raw/olist_customers_dataset.csv"],
+            outputs=["processed/customers_cleaned.parquet"],
+            # the runner does its own cache check
+            args=["--force"],
+        ),
+        Stage(
+            "clean_products", "02_clean_products.py",
+            inputs=["raw/olist_products_dataset.csv"],
+            outputs=["processed/products_cleaned.parquet"],
+            args=["--force"],
+        ),
+        Stage(
+            "clean_orders", "03_clean_orders.py",
+            inputs=["raw/olist_orders_dataset.csv"],
+            outputs=["processed/orders_clean.parquet"],
+        ),
+        Stage(
+            "enrich", "04_revenue_enrichment.py",
+            inputs=[
+                "processed/orders_clean.parquet",
+                "raw/olist_order_items_dataset.csv",
+                "processed/products_cleaned.parquet",
+            ],
+            outputs=["processed/enriched_orders.parquet", "processed/category_revenue_insights.parquet"],
+            checkpoint_args=["--checkpoint"],
+        ),
+        Stage(
+            "rollup", "05_revenue_rollup.py",
+            inputs=[
+                "processed/enriched_orders.parquet",
+                "raw/olist_order_items_dataset.csv",
+                "processed/products_cleaned.parquet",
+                "processed/customers_cleaned.parquet",
+                "raw/olist_sellers_dataset.csv",
+            ],
+            outputs=["processed/revenue_rollup.parquet"],
+        ),
+        Stage(
+            "customer_rollup", "06_customer_rollup.py",
+            inputs=["processed/enriched_orders.parquet", "processed/customers_cleaned.parquet"],
+            outputs=["processed/customer_rollup.parquet", "processed/top_customers.parquet"],
+        ),
+        Stage(
+            "seller_geo", "07_seller_geo_enrichment.py",
+            inputs=[
+                "processed/enriched_orders.parquet",
+                "processed/customers_cleaned.parquet",
+                "raw/olist_sellers_dataset.csv",
+                "processed/products_cleaned.parquet",
+                "raw/product_category_name_translation.csv",
+                "raw/olist_order_items_dataset.csv",
+            ],
+            outputs=["processed/enriched_order_items.parquet"],
+        ),
+    ]
+}
+
+
+def dependencies(stages: Dict[str, Stage]) -> Dict[str, Set[str]]:
+    producer = {out: s.name for s in stages.values() for out in s.outputs}
+    return {
+        s.name: {producer[i] for i in s.inputs if i in producer and producer[i] != s.name}
+        for s in stages.values()
+    }
+
+
+def select_stages(targets: Sequence[str], deps: Dict[str, Set[str]], with_deps: bool = True) -> List[str]:
+    """Targets (plus their upstream stages) in a topological order."""
+    selected: Set[str] = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        if with_deps:
+            stack.extend(deps[name])
+
+    order, done = [], set()
+    while len(order) < len(selected):
+        ready = sorted(n for n in selected - done if not (deps[n] & selected) - done)
+        if not ready:
+            raise ValueError(f"Dependency cycle among: {sorted(selected - done)}")
+        order.extend(ready)
+        done.update(ready)
+    return order
+
+
+def code_files(script: Path) -> List[Path]:
+    """The script plus every sibling module it imports, transitively."""
+    seen: Dict[str, Path] = {}
+    stack = [script]
+    while stack:
+        path = stack.pop()
+        if path.name in seen:
+            continue
+        seen[path.name] = path
+        for match in IMPORT_PATTERN.finditer(path.read_text(encoding="utf-8")):
+            module = TRANSFORM_DIR / f"{match.group(1) or match.group(2)}.py"
+            if module.exists():
+                stack.append(module)
+    return [seen[k] for k in sorted(seen)]
+
+
+def cache_key(stage: Stage, data_dir: Path, extra_args: Sequence[str]) -> dict:
+    return {
+        "inputs": {i: file_digest(data_dir / i) for i in stage.inputs},
+        "code": {p.name: file_digest(p) for p in code_files(stage.script)},
+        "args": stage.args + list(extra_args),
+    }
+
+
+def cache_path(stage: Stage, data_dir: Path) -> Path:
+    return data_dir / "processed" / ".pipeline" / f"{stage.name}.json"
+
+
+def is_cached(stage: Stage, data_dir: Path, key: dict) -> bool:
+    path = cache_path(stage, data_dir)
+    if not path.exists():
+        return False
+    try:
+        recorded = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if recorded.get("key") != key:
+        return False
+    for out in stage.outputs:
+        target = data_dir / out
+        if not target.exists() or recorded.get("outputs", {}).get(out) != file_digest(target):
+            return False
+    return True
+
+
+def record_run(stage: Stage, data_dir: Path, key: dict) -> None:
+    path = cache_path(stage, data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"key": key, "outputs": {out: file_digest(data_dir / out) for out in stage.outputs}}
+    atomic_write_text(path, json.dumps(record, indent=2))
+
+
+def run_stage(stage: Stage, data_dir: Path, extra_args: Sequence[str], force: bool, checkpoint: bool = False) -> str:
+    """Run one stage unless cached. Returns "cached" or "ran"; raises on failure."""
+    missing = [i for i in stage.inputs if not (data_dir / i).exists()]
+    if missing:
+        raise FileNotFoundError(f"{stage.name}: missing inputs {missing}")
+
+    key = cache_key(stage, data_dir, extra_args)
+    if not force and is_cached(stage, data_dir, key):
+        return "cached"
+
+    cmd = [sys.executable, str(stage.script), *stage.args, *extra_args]
+    if checkpoint:
+        cmd += stage.checkpoint_args
+    env = dict(os.environ, OLIST_DATA_DIR=str(data_dir))
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout.splitlines():
+        logging.debug("[%s] %s", stage.name, line)
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stdout.splitlines()[-20:])
+        raise RuntimeError(f"{stage.name} failed with exit code {proc.returncode}:\n{tail}")
+
+    record_run(stage, data_dir, key)
+    return "ran"
+
+
+def run_pipeline(
+    targets: Sequence[str],
+    data_dir: Path = DATA_DIR,
+    jobs: int = 2,
+    force: bool = False,
+    with_deps: bool = True,
+    extra_args: Sequence[str] = (),
+    checkpoint: bool = False,
+) -> Dict[str, str]:
+    """
+    Run `targets` (and, by default, their upstream stages). A stage starts as
+    soon as all of its selected dependencies finished; up to `jobs` stages run
+    at once. Returns stage -> "ran" | "cached" | "failed" | "blocked".
+    """
+    deps = dependencies(STAGES)
+    order = select_stages(targets, deps, with_deps)
+    status: Dict[str, str] = {}
+    running: Dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        pending = list(order)
+        while pending or running:
+            for name in list(pending):
+                upstream = deps[name] & set(order)
+                if any(status.get(d) in ("failed", "blocked") for d in upstream):
+                    status[name] = "blocked"
+                    pending.remove(name)
+                elif all(status.get(d) in ("ran", "cached") for d in upstream):
+                    logging.info("Starting %s", name)
+                    running[pool.submit(run_stage, STAGES[name], data_dir, extra_args, force, checkpoint)] = name
+                    pending.remove(name)
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    status[name] = future.result()
+                    logging.info("%s: %s", name, status[name])
+                except Exception as exc:
+                    status[name] = "failed"
+                    logging.error("%s", exc)
+    return status
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run transform stages as a cached dependency graph.")
+    parser.add_argument("targets", nargs="*", default=[],
+                        help=f"Stages to build (default: all). One of: {', '.join(STAGES)}.")
+    parser.add_argument("--jobs", type=int, default=2, help="Stages to run at the same time.")
+    parser.add_argument("--force", action="store_true", help="Ignore the cache for the selected stages.")
+    parser.add_argument("--no-deps", action="store_true", help="Do not run upstream stages of the targets.")
+    parser.add_argument("--csv-export", action="store_true", help="Pass --csv-export to every stage.")
+    parser.add_argument(
+        "--checkpoint", action="store_true",
+        help="Let long stages checkpoint their partitions, so a rerun after a failure resumes inside the stage.",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run or be skipped.")
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.targets if t not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    targets = args.targets or list(STAGES)
+    extra_args = ["--csv-export"] if args.csv_export else []
+
+    if args.dry_run:
+        for name in select_stages(targets, dependencies(STAGES), not args.no_deps):
+            stage = STAGES[name]
+            # Judged on the inputs as they are now; an upstream rerun can still change them
+            if args.force or any(not (DATA_DIR / i).exists() for i in stage.inputs):
+                state = "run"
+            else:
+                state = "cached" if is_cached(stage, DATA_DIR, cache_key(stage, DATA_DIR, extra_args)) else "run"
+            logging.info("%-16s %s", name, state)
+        return 0
+
+    status = run_pipeline(targets, DATA_DIR, args.jobs, args.force, not args.no_deps, extra_args, args.checkpoint)
+    logging.info("----- PIPELINE -----")
+    for name, state in status.items():
+        logging.info("%-16s %s", name, state)
+    return 1 if any(s in ("failed", "blocked") for s in status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
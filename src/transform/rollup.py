@@ -0,0 +1,205 @@
+"""
+Revenue/delivery rollup cube over product category x customer state x
+seller state x purchase month.
+
+Each cell holds only additive measures, so any coarser view (per category,
+per state, per month, or any mix) is a groupby-sum over the cube, and new
+months can be appended without touching the existing cells:
+  - revenue, freight, items: summed over order items
+  - orders: each order spread evenly over its n cells (1/n per cell)
+  - delivered_orders, delivery_days_sum: the same 1/n share of each delivered
+    order and of its delivery_days, so
+    average_delivery_days = delivery_days_sum / delivered_orders
+
+An order with items in several categories or from several seller states has
+a fractional share in each of those cells, and the shares of one order add up
+to exactly 1. Summing cells over any dimensions therefore counts every order
+once: the totals per customer state, per month, or overall match the distinct
+orders (up to float rounding), and a per-category count splits mixed orders
+instead of counting them in every category.
+
+    cube = load_cube(PROCESSED_DIR / "revenue_rollup.parquet")
+    query(cube, by=["customer_state"], where={"product_category_name": "perfumaria"})
+    query(cube, by=["purchase_month"], months=("2017-01", "2017-12"))
+"""
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+from storage import find_table, read_table
+
+DIMENSIONS = ["product_category_name", "customer_state", "seller_state", "purchase_month"]
+MEASURES = ["revenue", "freight", "items", "orders", "delivery_days_sum", "delivered_orders"]
+# Dimension value for items whose category/state could not be resolved
+UNKNOWN = "unknown"
+
+
+def purchase_months(timestamps: pd.Series) -> pd.Series:
+    """'YYYY-MM' month of each purchase timestamp."""
+    return pd.to_datetime(timestamps, errors="coerce").dt.strftime("%Y-%m")
+
+
+def build_cube(
+    orders: pd.DataFrame,
+    order_items: pd.DataFrame,
+    products: pd.DataFrame,
+    customers: pd.DataFrame,
+    sellers: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Aggregate order items into cube cells. `orders` needs order_id,
+    customer_id, order_purchase_timestamp and delivery_days (the enriched
+    orders table); only items of these orders are counted.
+    """
+    orders = orders[["order_id", "customer_id", "delivery_days"]].assign(
+        purchase_month=purchase_months(orders["order_purchase_timestamp"]).to_numpy()
+    )
+    orders = orders.merge(
+        customers[["customer_id", "customer_state"]].drop_duplicates("customer_id"),
+        on="customer_id", how="left", validate="m:1",
+    )
+    items = (
+        order_items[["order_id", "product_id", "seller_id", "price", "freight_value"]]
+        .merge(products[["product_id", "product_category_name"]], on="product_id", how="left", validate="m:1")
+        .merge(sellers[["seller_id", "seller_state"]].drop_duplicates("seller_id"),
+               on="seller_id", how="left", validate="m:1")
+        .merge(orders.drop(columns="customer_id"), on="order_id", how="inner", validate="m:1")
+    )
+    for dim in DIMENSIONS:
+        items[dim] = items[dim].astype(object).fillna(UNKNOWN)
+
+    cells = items.groupby(DIMENSIONS, sort=False).agg(
+        revenue=("price", "sum"),
+        freight=("freight_value", "sum"),
+        items=("price", "size"),
+    )
+    # order-level measures: one row per (order, cell), weighted by 1/(cells of the order)
+    order_cells = items.drop_duplicates(["order_id", *DIMENSIONS])
+    weight = 1.0 / order_cells.groupby("order_id", sort=False)["order_id"].transform("size")
+    delivery = pd.to_numeric(order_cells["delivery_days"], errors="coerce")
+    per_order = order_cells.assign(
+        orders=weight,
+        delivered_orders=weight.where(delivery.notna(), 0.0),
+        delivery_days_sum=(delivery * weight).fillna(0.0),
+    ).groupby(DIMENSIONS, sort=False)[["orders", "delivery_days_sum", "delivered_orders"]].sum()
+    cube = cells.join(per_order).reset_index()
+    return normalize_cube(cube)
+
+
+def normalize_cube(cube: pd.DataFrame) -> pd.DataFrame:
+    """Column order, dtypes and row order shared by freshly built and loaded cubes."""
+    cube = cube[DIMENSIONS + MEASURES].copy()
+    for dim in DIMENSIONS:
+        cube[dim] = cube[dim].astype(object)
+    cube["items"] = cube["items"].astype("int64")
+    for col in ("revenue", "freight", "orders", "delivery_days_sum", "delivered_orders"):
+        cube[col] = cube[col].astype("float64")
+    return cube.sort_values(DIMENSIONS, kind="stable").reset_index(drop=True)
+
+
+def append_months(cube: pd.DataFrame, cells: pd.DataFrame, months: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Replace `months` and the months present in `cells` with `cells`, keep
+    every other month as is. A month listed in `months` without cells is
+    dropped, so a rebuilt month that lost all its orders does not keep its
+    old cells.
+    """
+    replaced = {*months, *cells["purchase_month"].unique()}
+    kept = cube.loc[~cube["purchase_month"].isin(replaced)]
+    return normalize_cube(pd.concat([kept, cells], ignore_index=True))
+
+
+def load_cube(path: Path) -> pd.DataFrame:
+    """Read a stored cube with categorical dimensions, which keeps filters and groupbys fast."""
+    cube = read_table(find_table(path))
+    for dim in DIMENSIONS:
+        cube[dim] = cube[dim].astype("category")
+    return cube
+
+
+def query(
+    cube: pd.DataFrame,
+    by: Sequence[str] = (),
+    where: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+    months: Optional[Tuple[Optional[str], Optional[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Slice the cube and roll it up to the `by` dimensions.
+
+    `where` maps a dimension to a value or a list of values; `months` is an
+    inclusive ('YYYY-MM', 'YYYY-MM') range where either end may be None;
+    any bound leaves out the "unknown" month.
+    Returns the summed measures plus average_item_price and
+    average_delivery_days, sorted by revenue (descending).
+    """
+    by = list(by)
+    unknown = [d for d in [*by, *(where or {})] if d not in DIMENSIONS]
+    if unknown:
+        raise KeyError(f"Unknown cube dimensions: {unknown} (expected some of {DIMENSIONS})")
+
+    mask = pd.Series(True, index=cube.index)
+    for dim, value in (where or {}).items():
+        values = [value] if isinstance(value, str) else list(value)
+        mask &= cube[dim].isin(values)
+    if months:
+        start, end = months
+        month = cube["purchase_month"].astype(str)
+        if start or end:
+            # "unknown" compares as text, after every YYYY-MM; it is in no month range
+            mask &= month != UNKNOWN
+        if start:
+            mask &= month >= start
+        if end:
+            mask &= month <= end
+    sliced = cube.loc[mask]
+
+    if by:
+        result = sliced.groupby(by, observed=True, sort=False)[MEASURES].sum().reset_index()
+    else:
+        result = sliced[MEASURES].sum().to_frame().T
+    items = result["items"].where(result["items"] > 0)
+    delivered = result["delivered_orders"].where(result["delivered_orders"] > 0)
+    result["average_item_price"] = result["revenue"] / items
+    result["average_delivery_days"] = result["delivery_days_sum"] / delivered
+    return result.sort_values("revenue", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def parse_where(items: Sequence[str]) -> Dict[str, list]:
+    where: Dict[str, list] = {}
+    for item in items:
+        dim, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"--where expects dimension=value, got {item!r}")
+        where.setdefault(dim, []).append(value)
+    return where
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Query the revenue rollup cube built by 05_revenue_rollup.py.")
+    parser.add_argument("cube", type=Path, help="Path to revenue_rollup.parquet.")
+    parser.add_argument("--by", nargs="*", default=[], help=f"Dimensions to group by ({', '.join(DIMENSIONS)}).")
+    parser.add_argument("--where", nargs="*", default=[], metavar="DIM=VALUE",
+                        help="Filters; repeat a dimension to allow several values.")
+    parser.add_argument("--from", dest="start", default=None, metavar="YYYY-MM", help="First purchase month.")
+    parser.add_argument("--to", dest="end", default=None, metavar="YYYY-MM", help="Last purchase month.")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print (default: 20).")
+    args = parser.parse_args(argv)
+
+    cube = load_cube(args.cube)
+    started = time.perf_counter()
+    try:
+        result = query(cube, args.by, parse_where(args.where), (args.start, args.end))
+    except (KeyError, ValueError) as exc:
+        parser.error(str(exc))
+    logging.info("Query over %d cells took %.1f ms", len(cube), (time.perf_counter() - started) * 1000)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(result.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
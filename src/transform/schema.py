@@ -0,0 +1,188 @@
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+import logging
+import numpy as np
+import pandas as pd
+
+from storage import write_table
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = {
+    "order_status",
+    "product_category_name",
+    "product_category_name_english",
+    "customer_state",
+    "customer_city",
+    "seller_state",
+    "seller_city",
+}
+# 32-char hex keys that can be dictionary-encoded to int codes or packed to 16 bytes
+ID_COLUMNS = ("order_id", "customer_id", "customer_unique_id", "product_id", "seller_id")
+NULL_HEX_ID = "0" * 32
+ZIP_PREFIX_WIDTH = 5
+
+
+def downcast_numeric(df: pd.DataFrame, floats: bool = False) -> pd.DataFrame:
+    """
+    Shrink integer columns to the smallest dtype that holds their range. Floats
+    are only narrowed to float32 when `floats=True` and every value survives the
+    round trip; by default they stay float64 so aggregates match exactly.
+    """
+    for c in df.columns:
+        col = df[c]
+        if pd.api.types.is_bool_dtype(col):
+            continue
+        if pd.api.types.is_integer_dtype(col) and not isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+            kind = "unsigned" if len(col) and col.min() >= 0 else "integer"
+            df[c] = pd.to_numeric(col, downcast=kind)
+        elif floats and col.dtype == "float64":
+            narrow = col.astype("float32")
+            if np.array_equal(narrow.astype("float64").to_numpy(), col.to_numpy(), equal_nan=True):
+                df[c] = narrow
+    return df
+
+
+def is_plain_numeric(col: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col)
+
+
+def hash_values(values: Union[pd.Series, pd.DataFrame]) -> np.ndarray:
+    """
+    Hash rows with numeric columns cast to float64 first: a column reads as
+    int64 in chunks without nulls and float64 in the others, and 5 and 5.0
+    must hash alike for duplicates and distinct counts across chunks.
+    """
+    if isinstance(values, pd.Series):
+        if is_plain_numeric(values):
+            values = values.astype("float64")
+    else:
+        numeric = {c: "float64" for c in values.columns if is_plain_numeric(values[c])}
+        if numeric:
+            values = values.astype(numeric)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype="uint64")
+
+
+def zip_prefixes(values: pd.Series) -> pd.Series:
+    """Zip code prefixes as zero-padded 5-digit text (leading zeros are lost when read as numbers)."""
+    prefix = pd.to_numeric(values, errors="coerce").astype("Int64")
+    return prefix.astype("string").str.zfill(ZIP_PREFIX_WIDTH).astype(object)
+
+
+def encode_hex_binary(values: pd.Series) -> np.ndarray:
+    """
+    Pack 32-char hex ids into fixed-width 16-byte values (numpy S16, 128 bits).
+    Nulls become 16 zero bytes.
+    """
+    hex_text = values.fillna(NULL_HEX_ID).astype(str).str.cat()
+    return np.frombuffer(bytes.fromhex(hex_text), dtype="S16")
+
+
+def decode_hex_binary(values: np.ndarray) -> np.ndarray:
+    """Inverse of encode_hex_binary; all-zero values decode to NaN."""
+    # S16 drops trailing zero bytes on access, so go through the raw buffer
+    raw = np.asarray(values, dtype="S16").tobytes().hex().encode("ascii")
+    out = np.frombuffer(raw, dtype="S32").astype(str).astype(object)
+    out[out == NULL_HEX_ID] = np.nan
+    return out
+
+
+def is_text(col: pd.Series) -> bool:
+    """Object or string dtype: text columns load as object before pandas 3 and as str from it on."""
+    return pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col)
+
+
+def is_binary_id(col: pd.Series) -> bool:
+    return col.dtype == "S16" or (is_text(col) and len(col) > 0 and isinstance(col.iloc[0], bytes))
+
+
+class IdDictionary:
+    """
+    Shared string -> int code dictionaries, one per ID column, so the same id
+    gets the same code in every frame it appears in (orders, items, products...).
+    Joins and groupbys then run on int64 instead of Python strings.
+    """
+
+    def __init__(self, values: Optional[Dict[str, pd.Index]] = None):
+        self.values: Dict[str, pd.Index] = dict(values or {})
+
+    def encode(self, col: str, ids: pd.Series) -> pd.Series:
+        known = self.values.get(col, pd.Index([], dtype=object))
+        codes = known.get_indexer(ids)
+        new = pd.Index(ids[codes < 0].dropna().unique())
+        if len(new):
+            known = known.append(new)
+            self.values[col] = known
+            codes = known.get_indexer(ids)
+        # nulls stay at -1
+        return pd.Series(codes.astype("int64"), index=ids.index, name=ids.name)
+
+    def decode(self, col: str, codes: pd.Series) -> pd.Series:
+        values = self.values[col].to_numpy(dtype=object)
+        arr = codes.to_numpy(dtype="int64")
+        out = np.full(len(arr), np.nan, dtype=object)
+        known = arr >= 0
+        out[known] = values[arr[known]]
+        return pd.Series(out, index=codes.index, name=codes.name)
+
+    def save(self, directory: Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for col, values in self.values.items():
+            write_table(pd.DataFrame({col: values}), directory / f"{col}.parquet")
+
+    @classmethod
+    def load(cls, directory: Path) -> "IdDictionary":
+        directory = Path(directory)
+        values = {p.stem: pd.Index(pd.read_parquet(p)[p.stem]) for p in sorted(directory.glob("*.parquet"))}
+        return cls(values)
+
+
+def compact_frame(
+    df: pd.DataFrame,
+    categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+    ids: Optional[IdDictionary] = None,
+    binary_ids: bool = False,
+    downcast_floats: bool = False,
+) -> pd.DataFrame:
+    """
+    Apply the memory-compact schema to a freshly loaded frame:
+      - low-cardinality text columns -> category
+      - integers -> smallest safe dtype (floats only with downcast_floats)
+      - with `ids`: hex id columns -> int64 codes from the shared dictionary
+      - with `binary_ids`: hex id columns -> 16-byte fixed-width values
+    Use `restore_frame` before exporting.
+    """
+    before = df.memory_usage(deep=True).sum()
+    for c in set(categorical) & set(df.columns):
+        if not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
+
+    df = downcast_numeric(df, floats=downcast_floats)
+
+    # after the downcast: codes stay int64, so every frame's codes for an id column share a dtype
+    id_cols = [c for c in ID_COLUMNS if c in df.columns and is_text(df[c])]
+    if ids is not None:
+        for c in id_cols:
+            df[c] = ids.encode(c, df[c])
+    elif binary_ids:
+        for c in id_cols:
+            df[c] = encode_hex_binary(df[c])
+    after = df.memory_usage(deep=True).sum()
+    logging.debug("Compacted frame: %.1f MB -> %.1f MB", before / 2**20, after / 2**20)
+    return df
+
+
+def restore_frame(df: pd.DataFrame, ids: Optional[IdDictionary] = None) -> pd.DataFrame:
+    """
+    Undo `compact_frame` for export: categoricals back to plain strings and
+    encoded id columns back to their hex text. Numeric downcasts are kept.
+    """
+    df = df.copy(deep=False)
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(object)
+        elif c in ID_COLUMNS and is_binary_id(df[c]):
+            df[c] = decode_hex_binary(df[c].to_numpy(dtype="S16"))
+        elif ids is not None and c in ids.values and pd.api.types.is_integer_dtype(df[c]):
+            df[c] = ids.decode(c, df[c])
+    return df
@@ -0,0 +1,262 @@
+"""
+Mergeable quantile sketches for the abnormal-item thresholds.
+
+KLLSketch is a KLL-style compactor sketch: values enter level 0, and when a
+level is over its capacity it is sorted and every other item (random offset)
+moves up a level with double the weight. Memory is O(k) regardless of the
+stream length. The rank error is roughly 1.7/k in the worst case and much
+smaller in practice, so the default k=1000 keeps p99 within a fraction of a
+percentile. Until the first compaction (about 1.5k values) the sketch is
+exact. Sketches built over different chunks or partitions merge into the same
+result as one built over the whole stream, up to that error.
+
+CategoryThresholds turns a set of per-category sketches into the per-row
+weight/volume limits used by compute_order_metrics.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from storage import atomic_write_text
+
+DEFAULT_K = 1000
+# Categories with fewer items than this use the global thresholds
+MIN_CATEGORY_ITEMS = 50
+GLOBAL_KEY = "__global__"
+
+
+class KLLSketch:
+    def __init__(self, k: int = DEFAULT_K, seed: int = 0):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values) -> "KLLSketch":
+        """Add a batch of values (NaN is ignored)."""
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item stays behind so no weight is lost
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[: len(items) - len(keep)]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h, dtype="int64") for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """Lower-interpolated quantile, q in [0, 1]. NaN for an empty sketch."""
+        if self.n == 0:
+            return float("nan")
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cum = self._weighted()
+        # same convention as pandas' linear interpolation on the exact (level-0 only) case
+        pos = q * (cum[-1] - 1)
+        lo = int(np.searchsorted(cum, math.floor(pos) + 1))
+        hi = int(np.searchsorted(cum, math.ceil(pos) + 1))
+        frac = pos - math.floor(pos)
+        return float(values[lo] + (values[min(hi, len(values) - 1)] - values[lo]) * frac)
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k,
+            "n": self.n,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            "levels": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, seed: int = 0) -> "KLLSketch":
+        sketch = cls(k=data["k"], seed=seed)
+        sketch.n = data["n"]
+        if sketch.n:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.levels = [np.asarray(items, dtype="float64") for items in data["levels"]] or [np.empty(0)]
+        return sketch
+
+
+class CategoryThresholds:
+    """
+    Weight/volume outlier limits: one global pair plus optional per-category
+    pairs (categories below MIN_CATEGORY_ITEMS items fall back to the global ones,
+    as does a NaN category limit, e.g. a category whose volumes are all null).
+    """
+
+    def __init__(self, weight: float, volume: float, by_category: Optional[pd.DataFrame] = None):
+        self.weight = float(weight)
+        self.volume = float(volume)
+        # index: product_category_name, columns: weight, volume
+        self.by_category = by_category
+
+    def for_rows(self, categories: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        if self.by_category is None or self.by_category.empty:
+            n = len(categories)
+            return np.full(n, self.weight), np.full(n, self.volume)
+        pos = self.by_category.index.get_indexer(categories.astype(object))
+        known = pos >= 0
+        weight = np.full(len(categories), self.weight)
+        volume = np.full(len(categories), self.volume)
+        weight[known] = self.by_category["weight"].to_numpy(dtype="float64")[pos[known]]
+        volume[known] = self.by_category["volume"].to_numpy(dtype="float64")[pos[known]]
+        weight[np.isnan(weight)] = self.weight
+        volume[np.isnan(volume)] = self.volume
+        return weight, volume
+
+    def to_dict(self) -> dict:
+        data = {"weight": self.weight, "volume": self.volume}
+        if self.by_category is not None:
+            data["by_category"] = {
+                c: [float(w), float(v)] for c, w, v in self.by_category[["weight", "volume"]].itertuples()
+            }
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CategoryThresholds":
+        by_category = None
+        if "by_category" in data:
+            by_category = pd.DataFrame.from_dict(data["by_category"], orient="index", columns=["weight", "volume"])
+            by_category.index.name = "product_category_name"
+        return cls(data["weight"], data["volume"], by_category)
+
+
+class ThresholdSketches:
+    """
+    Weight and volume sketches, globally and per product category, plus the
+    item count of each category. The sketches skip nulls, so the counts (all
+    items, as in the exact path) decide which categories get their own limits.
+    """
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.weight: Dict[str, KLLSketch] = {}
+        self.volume: Dict[str, KLLSketch] = {}
+        self.items: Dict[str, int] = {}
+
+    def _sketch(self, table: Dict[str, KLLSketch], key: str) -> KLLSketch:
+        if key not in table:
+            table[key] = KLLSketch(self.k)
+        return table[key]
+
+    def update(self, order_items_products: pd.DataFrame) -> "ThresholdSketches":
+        """Add one chunk of joined order items (one vectorized update per category)."""
+        weight = order_items_products["product_weight_g"].to_numpy(dtype="float64")
+        volume = (
+            order_items_products["product_length_cm"]
+            * order_items_products["product_height_cm"]
+            * order_items_products["product_width_cm"]
+        ).to_numpy(dtype="float64")
+        self._sketch(self.weight, GLOBAL_KEY).update(weight)
+        self._sketch(self.volume, GLOBAL_KEY).update(volume)
+
+        codes, categories = pd.factorize(order_items_products["product_category_name"].astype(object))
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+        for i, category in enumerate(categories):
+            rows = order[bounds[i]:bounds[i + 1]]
+            self._sketch(self.weight, category).update(weight[rows])
+            self._sketch(self.volume, category).update(volume[rows])
+            self.items[category] = self.items.get(category, 0) + len(rows)
+        return self
+
+    def merge(self, other: "ThresholdSketches") -> "ThresholdSketches":
+        for mine, theirs in ((self.weight, other.weight), (self.volume, other.volume)):
+            for key, sketch in theirs.items():
+                self._sketch(mine, key).merge(sketch)
+        for key, n in other.items.items():
+            self.items[key] = self.items.get(key, 0) + n
+        return self
+
+    def thresholds(
+        self,
+        q: float,
+        per_category: bool = False,
+        min_items: int = MIN_CATEGORY_ITEMS,
+    ) -> CategoryThresholds:
+        weight = self.weight[GLOBAL_KEY].quantile(q) if GLOBAL_KEY in self.weight else float("nan")
+        volume = self.volume[GLOBAL_KEY].quantile(q) if GLOBAL_KEY in self.volume else float("nan")
+        by_category = None
+        if per_category:
+            rows = {
+                c: (s.quantile(q), self.volume[c].quantile(q))
+                for c, s in self.weight.items()
+                if c != GLOBAL_KEY and self.items.get(c, 0) >= min_items
+            }
+            by_category = pd.DataFrame.from_dict(rows, orient="index", columns=["weight", "volume"]).sort_index()
+            by_category.index.name = "product_category_name"
+        return CategoryThresholds(weight, volume, by_category)
+
+    def save(self, path: Path) -> None:
+        data = {
+            "k": self.k,
+            "weight": {c: s.to_dict() for c, s in self.weight.items()},
+            "volume": {c: s.to_dict() for c, s in self.volume.items()},
+            "items": self.items,
+        }
+        atomic_write_text(path, json.dumps(data))
+        logging.info("Saved threshold sketches (%d categories) to: %s", len(self.weight) - 1, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ThresholdSketches":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        sketches = cls(k=data["k"])
+        sketches.weight = {c: KLLSketch.from_dict(s) for c, s in data["weight"].items()}
+        sketches.volume = {c: KLLSketch.from_dict(s) for c, s in data["volume"].items()}
+        # sketches saved before item counts were kept: the larger non-null count is the best estimate
+        sketches.items = data.get("items") or {
+            c: max(s.n, sketches.volume[c].n if c in sketches.volume else 0)
+            for c, s in sketches.weight.items() if c != GLOBAL_KEY
+        }
+        return sketches
@@ -0,0 +1,146 @@
+"""
+Run the staging sanity checks in sql/99_staging_counts.sql as one parallel
+batch and write docs/validation_results/stg_checks_summary.csv.
+
+Each UNION ALL branch of the SQL file is a standalone one-row query, so the
+branches are run as separate statements, each on its own pooled connection.
+Every check is timed, and the summary gets an elapsed_ms column next to the
+check_name/value pair. The integrity checks are NOT EXISTS probes against
+the keys created by sql/01_create_staging_tables.sql (and by load_staging.py).
+
+Usage:
+    OLIST_PG_DSN="dbname=ecommerce_project user=postgres" python src/transform/staging_checks.py
+    python src/transform/staging_checks.py --sqlite /tmp/staging.db
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from storage import write_table
+
+try:
+    import psycopg2
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError:  # optional: only needed for Postgres targets
+    psycopg2 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+CHECKS_SQL = PROJECT_ROOT / "sql" / "99_staging_counts.sql"
+SUMMARY_PATH = PROJECT_ROOT / "docs" / "validation_results" / "stg_checks_summary.csv"
+DSN_ENV = "OLIST_PG_DSN"
+
+
+def load_checks(path: Path = CHECKS_SQL) -> List[str]:
+    """Split the check file into its UNION ALL branches, one SELECT per check."""
+    text = "\n".join(
+        line for line in path.read_text(encoding="utf-8").splitlines()
+        if not line.lstrip().startswith("--")
+    )
+    branches = re.split(r"^\s*UNION\s+ALL\s*$", text, flags=re.IGNORECASE | re.MULTILINE)
+    return [b.strip().rstrip(";").strip() for b in branches if b.strip()]
+
+
+def sqlite_dialect(query: str) -> str:
+    """The few Postgres-only bits of the check file, rewritten for the SQLite stand-in."""
+    query = re.sub(r"::text\b", "", query)
+    return query.replace("current_database()", "'sqlite'")
+
+
+def run_checks(
+    checks: List[str],
+    run_query: Callable[[str], Tuple[str, object]],
+    jobs: int = 4,
+) -> pd.DataFrame:
+    """Run every check concurrently; returns check_name, value, elapsed_ms in file order."""
+
+    def timed(query: str) -> dict:
+        start = time.perf_counter()
+        name, value = run_query(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        logging.info("%-30s %-20s %8.1f ms", name, value, elapsed)
+        return {"check_name": name, "value": str(value), "elapsed_ms": round(elapsed, 1)}
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        rows = list(pool.map(timed, checks))
+    return pd.DataFrame(rows, columns=["check_name", "value", "elapsed_ms"])
+
+
+def postgres_runner(dsn: str, jobs: int):
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 is required for Postgres checks (pip install psycopg2-binary)")
+    pool = ThreadedConnectionPool(1, max(jobs, 1), dsn)
+
+    def run_query(query: str) -> Tuple[str, object]:
+        conn = pool.getconn()
+        try:
+            # read-only autocommit: no transaction is held open across checks
+            conn.set_session(readonly=True, autocommit=True)
+            with conn.cursor() as cur:
+                cur.execute(query)
+                return cur.fetchone()
+        finally:
+            pool.putconn(conn)
+
+    return run_query, pool.closeall
+
+
+def sqlite_runner(path: Path):
+    def run_query(query: str) -> Tuple[str, object]:
+        # sqlite3 connections are per thread
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute(sqlite_dialect(query)).fetchone()
+        finally:
+            conn.close()
+
+    return run_query, lambda: None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the staging sanity checks as one parallel batch.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--dsn", default=os.environ.get(DSN_ENV), help=f"Postgres DSN (default: ${DSN_ENV}).")
+    target.add_argument("--sqlite", type=Path, default=None, help="Run against this SQLite file instead.")
+    parser.add_argument("--checks", type=Path, default=CHECKS_SQL, help="SQL file with the checks.")
+    parser.add_argument("--output", type=Path, default=SUMMARY_PATH, help="Where to write the summary CSV.")
+    parser.add_argument("--jobs", type=int, default=4, help="Checks run at the same time.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+
+    if args.sqlite is not None:
+        run_query, close = sqlite_runner(args.sqlite)
+    elif args.dsn:
+        run_query, close = postgres_runner(args.dsn, args.jobs)
+    else:
+        logging.error("No target: pass --dsn, set %s, or use --sqlite", DSN_ENV)
+        return 2
+
+    checks = load_checks(args.checks)
+    logging.info("Running %d checks from %s", len(checks), args.checks)
+    start = time.perf_counter()
+    try:
+        summary = run_checks(checks, run_query, args.jobs)
+    finally:
+        close()
+    logging.info("All checks done in %.1f ms", (time.perf_counter() - start) * 1000)
+
+    write_table(summary, args.output)
+    logging.info("Saved check summary to: %s", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+import hashlib
+import json
+import logging
+import os
+import pandas as pd
+
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+ARROW_SUFFIXES = {".arrow", ".feather", ".ipc"}
+CSV_SUFFIXES = {".csv"}
+
+# Lookup order when a table is requested without its file existing as named
+TABLE_SUFFIXES = (".parquet", ".arrow", ".csv")
+DEFAULT_COMPRESSION = "zstd"
+
+
+def temp_path(path: Path) -> Path:
+    """Hidden temporary sibling of `path` (same directory, so a rename is atomic)."""
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """
+    Yield a temporary path to write to; on success it is renamed over `path`,
+    on error it is removed. Readers and reruns never see a half-written file,
+    only the previous version or the complete new one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    with atomic_path(path) as tmp:
+        tmp.write_text(text, encoding="utf-8")
+
+
+def csv_path(path: Path) -> Path:
+    """Where write_table(..., csv_export=True) puts the CSV copy of `path`."""
+    return Path(path).with_suffix(".csv")
+
+
+def find_table(path: Path) -> Path:
+    """
+    Return `path` if it exists, otherwise the first sibling with the same stem
+    and a supported suffix (parquet, then arrow, then csv).
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    for suffix in TABLE_SUFFIXES:
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"No table found for {path} (tried {', '.join(TABLE_SUFFIXES)})")
+
+
+def read_table(
+    path: Path,
+    columns: Optional[Sequence[str]] = None,
+    parse_dates: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Read a Parquet, Arrow IPC or CSV table. `columns` projects at read time so
+    only the requested columns are decoded. `parse_dates` only applies to CSV;
+    columnar formats keep their stored types.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    cols = list(columns) if columns is not None else None
+
+    if suffix in PARQUET_SUFFIXES:
+        df = pd.read_parquet(path, columns=cols)
+    elif suffix in ARROW_SUFFIXES:
+        df = pd.read_feather(path, columns=cols)
+    elif suffix in CSV_SUFFIXES:
+        dates = [c for c in (parse_dates or []) if cols is None or c in cols]
+        # utf-8-sig also strips the byte-order mark some exports start with
+        df = pd.read_csv(path, usecols=cols, parse_dates=dates or False, low_memory=False, encoding="utf-8-sig")
+        if cols is not None:
+            df = df[cols]
+    else:
+        raise ValueError(f"Unsupported table format: {path}")
+
+    logging.info("Read %s (%d rows, %d cols)", path.name, len(df), df.shape[1])
+    return df
+
+
+def write_table(
+    df: pd.DataFrame,
+    path: Path,
+    csv_export: bool = False,
+    compression: str = DEFAULT_COMPRESSION,
+) -> Path:
+    """
+    Write `df` in the format implied by the suffix of `path` (Parquet by
+    default). With `csv_export=True` a CSV copy is written next to it. Each
+    file is written to a temporary sibling and renamed into place.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in PARQUET_SUFFIXES | ARROW_SUFFIXES | CSV_SUFFIXES:
+        raise ValueError(f"Unsupported table format: {path}")
+
+    with atomic_path(path) as tmp:
+        if suffix in PARQUET_SUFFIXES:
+            df.to_parquet(tmp, index=False, compression=compression)
+        elif suffix in ARROW_SUFFIXES:
+            df.reset_index(drop=True).to_feather(tmp, compression=compression)
+        else:
+            df.to_csv(tmp, index=False)
+
+    if csv_export and suffix not in CSV_SUFFIXES:
+        csv_copy = csv_path(path)
+        with atomic_path(csv_copy) as tmp:
+            df.to_csv(tmp, index=False)
+        logging.info("Exported CSV copy to: %s", csv_copy)
+
+    return path
+
+
+def iter_table(
+    path: Path,
+    chunksize: int,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield `path` in chunks of at most `chunksize` rows so callers can keep peak
+    memory proportional to the chunk instead of the file.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    cols = list(columns) if columns is not None else None
+
+    if suffix in PARQUET_SUFFIXES:
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(path) as pf:
+            for batch in pf.iter_batches(batch_size=chunksize, columns=cols):
+                yield batch.to_pandas()
+    elif suffix in CSV_SUFFIXES:
+        for chunk in pd.read_csv(path, usecols=cols, chunksize=chunksize, low_memory=False, encoding="utf-8-sig"):
+            yield chunk[cols] if cols is not None else chunk
+    else:
+        raise ValueError(f"Chunked reads are not supported for: {path}")
+
+
+class TableWriter:
+    """
+    Append-only writer for building one Parquet (or CSV) file from many chunks.
+    The schema is fixed by the first chunk; later chunks are cast to it so a
+    chunk with an all-null column does not change the column type. Chunks go
+    to temporary files that replace the targets on a clean close; if the block
+    raises, they are discarded and the previous output stays in place. A clean
+    close without any chunk written removes the targets, so a previous run's
+    output is not left behind as if this run had produced it.
+    """
+
+    def __init__(self, path: Path, csv_export: bool = False, compression: str = DEFAULT_COMPRESSION):
+        self.path = Path(path)
+        self.csv_export = csv_export
+        self.compression = compression
+        self.rows_written = 0
+        self._suffix = self.path.suffix.lower()
+        self._writer = None
+        self._schema = None
+        self._csv_path = None
+
+        if self._suffix not in PARQUET_SUFFIXES | CSV_SUFFIXES:
+            raise ValueError(f"Chunked writes are not supported for: {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self._suffix in CSV_SUFFIXES:
+            self._csv_path = self.path
+        elif csv_export:
+            self._csv_path = self.path.with_suffix(".csv")
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._suffix in PARQUET_SUFFIXES:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(temp_path(self.path), self._schema, compression=self.compression)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+
+        if self._csv_path is not None:
+            df.to_csv(temp_path(self._csv_path), index=False, mode="w" if self.rows_written == 0 else "a",
+                      header=self.rows_written == 0)
+        self.rows_written += len(df)
+
+    def _targets(self):
+        if self._suffix in PARQUET_SUFFIXES:
+            yield self.path
+        if self._csv_path is not None:
+            yield self._csv_path
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for target in self._targets():
+            if temp_path(target).exists():
+                os.replace(temp_path(target), target)
+            elif target.exists():
+                logging.warning("No chunks written; removing stale %s", target)
+                target.unlink()
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for target in self._targets():
+            if temp_path(target).exists():
+                temp_path(target).unlink()
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a file's content, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def manifest_path(output: Path) -> Path:
+    output = Path(output)
+    return output.with_name(output.name + ".manifest.json")
+
+
+def build_manifest(inputs: Sequence[Path], code: Sequence[Path]) -> Dict[str, Dict[str, str]]:
+    return {
+        "inputs": {str(Path(p).name): file_digest(p) for p in inputs},
+        "code": {str(Path(p).name): file_digest(p) for p in code},
+    }
+
+
+def stage_is_current(
+    inputs: Sequence[Path],
+    output: Path,
+    code: Sequence[Path],
+    extra_outputs: Sequence[Path] = (),
+) -> bool:
+    """
+    True when `output` exists and its manifest records the same input and code
+    digests as now, and the output itself has not changed since it was written.
+    `extra_outputs` (e.g. the CSV copy a run was asked for) must also exist and
+    match what the manifest recorded for them.
+    """
+    output = Path(output)
+    mpath = manifest_path(output)
+    if not output.exists() or not mpath.exists():
+        return False
+    try:
+        recorded = json.loads(mpath.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    current = build_manifest(inputs, code)
+    recorded_extra = recorded.get("extra_outputs", {})
+    return (
+        recorded.get("inputs") == current["inputs"]
+        and recorded.get("code") == current["code"]
+        and recorded.get("output") == file_digest(output)
+        and all(
+            Path(p).exists() and recorded_extra.get(Path(p).name) == file_digest(p) for p in extra_outputs
+        )
+    )
+
+
+def write_stage_manifest(
+    inputs: Sequence[Path],
+    output: Path,
+    code: Sequence[Path],
+    extra_outputs: Sequence[Path] = (),
+) -> None:
+    manifest = build_manifest(inputs, code)
+    manifest["output"] = file_digest(output)
+    manifest["extra_outputs"] = {Path(p).name: file_digest(p) for p in extra_outputs}
+    atomic_write_text(manifest_path(output), json.dumps(manifest, indent=2))
@@ -0,0 +1,376 @@
+"""
+Declarative data-quality rules and a single-scan evaluator.
+
+    rules = [
+        ForeignKey("orders", "customer_id", "customers"),
+        Unique("order_items", ["order_id", "order_item_id"]),
+        Range("order_items", "price", min=0, min_inclusive=False),
+        TimestampOrder("orders", "order_purchase_timestamp", "order_approved_at"),
+    ]
+    report = validate({"orders": ORDERS_RAW, ...}, rules, timestamp_columns={"orders": DATE_COLS})
+    report.to_frame()
+
+Each table is read once, projected to the columns its rules need, either
+whole or in chunks. Every rule on that table is evaluated against the same
+frame. Timestamp columns are parsed once per table. Key sets referenced by
+foreign keys are collected while the referenced table is scanned, and turned
+into one hashed pd.Index that every rule pointing at it reuses. Tables are
+scanned in dependency order (referenced tables first); tables that don't
+depend on each other are scanned in parallel. A foreign key into its own
+table (e.g. a parent id) needs the whole key set before the first chunk is
+checked, so those key columns are read in a separate pass first.
+
+Rule names key the report, so they must be unique; pass `name=` to tell
+apart two rules that would get the same default name.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Union
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import hash_values
+from storage import iter_table, read_table
+from timestamps import parse_timestamp_columns
+
+KeyIndex = Dict[Tuple[str, str], pd.Index]
+
+
+class Rule:
+    """Base class. Subclasses implement `check`, which returns the failing rows in one chunk."""
+
+    kind = "rule"
+
+    def __init__(self, table: str, name: Optional[str] = None, severity: str = "error"):
+        self.table = table
+        self.name = name or self.default_name()
+        self.severity = severity
+
+    def default_name(self) -> str:
+        return f"{self.kind}:{self.table}"
+
+    @property
+    def columns(self) -> List[str]:
+        return []
+
+    def references(self) -> List[Tuple[str, str]]:
+        """(table, column) key sets this rule looks up."""
+        return []
+
+    def reset(self) -> None:
+        pass
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        raise NotImplementedError
+
+    def finish(self) -> int:
+        """Failures only known after the last chunk (e.g. duplicates across chunks)."""
+        return 0
+
+
+class NotNull(Rule):
+    kind = "not_null"
+
+    def __init__(self, table: str, column: str, **kwargs):
+        self.column = column
+        super().__init__(table, **kwargs)
+
+    def default_name(self) -> str:
+        return f"{self.kind}:{self.table}.{self.column}"
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.column]
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        return int(chunk[self.column].isna().sum())
+
+
+class Unique(Rule):
+    """Counts rows whose key already appeared earlier (the `duplicated()` count), across chunks."""
+
+    kind = "unique"
+
+    def __init__(self, table: str, columns: Union[str, Sequence[str]], **kwargs):
+        self.key = [columns] if isinstance(columns, str) else list(columns)
+        self._hashes: List[np.ndarray] = []
+        super().__init__(table, **kwargs)
+
+    def default_name(self) -> str:
+        return f"{self.kind}:{self.table}.{'+'.join(self.key)}"
+
+    @property
+    def columns(self) -> List[str]:
+        return self.key
+
+    def reset(self) -> None:
+        self._hashes = []
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        # 8 bytes per row instead of the key strings themselves; numeric keys hash as float64
+        # so a chunk that reads them as int64 and one that reads float64 (nulls) agree
+        self._hashes.append(hash_values(chunk[self.key]))
+        return 0
+
+    def finish(self) -> int:
+        if not self._hashes:
+            return 0
+        hashes = np.concatenate(self._hashes)
+        self._hashes = []
+        return int(len(hashes) - len(np.unique(hashes)))
+
+
+class ForeignKey(Rule):
+    """Non-null values of `column` that are missing from `ref_table.ref_column`."""
+
+    kind = "foreign_key"
+
+    def __init__(self, table: str, column: str, ref_table: str, ref_column: Optional[str] = None, **kwargs):
+        self.column = column
+        self.ref_table = ref_table
+        self.ref_column = ref_column or column
+        super().__init__(table, **kwargs)
+
+    def default_name(self) -> str:
+        return f"{self.kind}:{self.table}.{self.column}->{self.ref_table}.{self.ref_column}"
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.column]
+
+    def references(self) -> List[Tuple[str, str]]:
+        return [(self.ref_table, self.ref_column)]
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        values = chunk[self.column]
+        # get_indexer reuses the index's hash table; isin would rebuild one per call
+        missing = keys[(self.ref_table, self.ref_column)].get_indexer(values) < 0
+        return int((missing & values.notna().to_numpy()).sum())
+
+
+class Range(Rule):
+    """Non-null values outside [min, max]; either bound may be open or omitted."""
+
+    kind = "range"
+
+    def __init__(
+        self,
+        table: str,
+        column: str,
+        min: Optional[float] = None,
+        max: Optional[float] = None,
+        min_inclusive: bool = True,
+        max_inclusive: bool = True,
+        **kwargs,
+    ):
+        self.column = column
+        self.min, self.max = min, max
+        self.min_inclusive, self.max_inclusive = min_inclusive, max_inclusive
+        super().__init__(table, **kwargs)
+
+    def default_name(self) -> str:
+        lo = "" if self.min is None else f"{self.min}{'<=' if self.min_inclusive else '<'}"
+        hi = "" if self.max is None else f"{'<=' if self.max_inclusive else '<'}{self.max}"
+        return f"{self.kind}:{lo}{self.table}.{self.column}{hi}"
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.column]
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        values = pd.to_numeric(chunk[self.column], errors="coerce")
+        bad = np.zeros(len(values), dtype=bool)
+        if self.min is not None:
+            bad |= (values < self.min if self.min_inclusive else values <= self.min).to_numpy()
+        if self.max is not None:
+            bad |= (values > self.max if self.max_inclusive else values >= self.max).to_numpy()
+        return int(bad.sum())
+
+
+class TimestampOrder(Rule):
+    """Rows where both timestamps are set and `later` is before `earlier`."""
+
+    kind = "timestamp_order"
+
+    def __init__(self, table: str, earlier: str, later: str, **kwargs):
+        self.earlier = earlier
+        self.later = later
+        super().__init__(table, **kwargs)
+
+    def default_name(self) -> str:
+        return f"{self.kind}:{self.table}.{self.earlier}<={self.later}"
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.earlier, self.later]
+
+    def check(self, chunk: pd.DataFrame, keys: KeyIndex) -> int:
+        # NaT comparisons are False, so rows missing either side never fail
+        return int((chunk[self.later] < chunk[self.earlier]).sum())
+
+
+class ValidationReport:
+    """Outcome of `validate`: one row per rule, plus timestamp parse counts and rows scanned per table."""
+
+    def __init__(self):
+        self.results: List[dict] = []
+        self.parse_failures: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.rows: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, rule: Rule, checked: int, failed: int) -> None:
+        self.results.append({
+            "rule": rule.name,
+            "kind": rule.kind,
+            "table": rule.table,
+            "severity": rule.severity,
+            "checked": checked,
+            "failed": failed,
+        })
+
+    def __getitem__(self, rule_name: str) -> int:
+        for r in self.results:
+            if r["rule"] == rule_name:
+                return r["failed"]
+        raise KeyError(rule_name)
+
+    @property
+    def passed(self) -> bool:
+        return not any(r["failed"] and r["severity"] == "error" for r in self.results)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.results, columns=["rule", "kind", "table", "severity", "checked", "failed"])
+
+    def parse_frame(self) -> pd.DataFrame:
+        rows = [
+            {"table": t, "column": c, "null": n["null"], "invalid": n["invalid"], "nat": n["null"] + n["invalid"]}
+            for t, cols in self.parse_failures.items() for c, n in cols.items()
+        ]
+        return pd.DataFrame(rows, columns=["table", "column", "null", "invalid", "nat"])
+
+
+def _scan_order(tables: Sequence[str], rules: Sequence[Rule]) -> List[List[str]]:
+    """Group tables into levels so every referenced table is scanned before the tables pointing at it."""
+    deps: Dict[str, Set[str]] = {t: set() for t in tables}
+    for rule in rules:
+        for ref_table, _ in rule.references():
+            if ref_table != rule.table:
+                deps[rule.table].add(ref_table)
+
+    levels, done = [], set()
+    while len(done) < len(deps):
+        level = sorted(t for t in deps if t not in done and deps[t] <= done)
+        if not level:
+            raise ValueError(f"Foreign keys form a cycle among: {sorted(set(deps) - done)}")
+        levels.append(level)
+        done.update(level)
+    return levels
+
+
+def _chunks(path: Path, columns: List[str], chunksize: Optional[int]) -> Iterator[pd.DataFrame]:
+    if chunksize:
+        yield from iter_table(path, chunksize, columns=columns)
+    else:
+        yield read_table(path, columns=columns)
+
+
+def _key_index(parts: List[np.ndarray]) -> pd.Index:
+    return pd.Index(pd.unique(np.concatenate(parts)) if parts else [])
+
+
+def _check_rule_names(rules: Sequence[Rule]) -> None:
+    names = pd.Series([r.name for r in rules], dtype=object)
+    duplicated = sorted(set(names[names.duplicated()]))
+    if duplicated:
+        raise ValueError(f"Duplicate rule names (pass name= to tell them apart): {duplicated}")
+
+
+def validate(
+    tables: Mapping[str, Path],
+    rules: Sequence[Rule],
+    timestamp_columns: Optional[Mapping[str, Sequence[str]]] = None,
+    chunksize: Optional[int] = None,
+    workers: int = 1,
+) -> ValidationReport:
+    """
+    Evaluate `rules` over `tables` (name -> file) with one read per table.
+    `timestamp_columns` lists columns to parse per table; their null/invalid
+    counts go to `report.parse_failures`. With `chunksize`, tables are
+    streamed and peak memory follows the chunk size (plus 8 bytes per row
+    for each Unique rule and the referenced key sets).
+    """
+    _check_rule_names(rules)
+    timestamp_columns = {t: list(c) for t, c in (timestamp_columns or {}).items()}
+    missing = {r.table for r in rules} - set(tables) | {t for r in rules for t, _ in r.references()} - set(tables)
+    if missing:
+        raise ValueError(f"Rules refer to unknown tables: {sorted(missing)}")
+
+    by_table: Dict[str, List[Rule]] = {t: [] for t in tables}
+    for rule in rules:
+        rule.reset()
+        by_table[rule.table].append(rule)
+    key_columns: Dict[str, Set[str]] = {t: set() for t in tables}
+    for rule in rules:
+        for ref_table, ref_column in rule.references():
+            key_columns[ref_table].add(ref_column)
+
+    keys: KeyIndex = {}
+    report = ValidationReport()
+
+    def scan(table: str) -> Tuple[str, int, Dict[str, int], Dict[str, Dict[str, int]], KeyIndex]:
+        start = time.perf_counter()
+        ts_cols = timestamp_columns.get(table, [])
+        cols = list(dict.fromkeys(
+            [c for r in by_table[table] for c in r.columns] + sorted(key_columns[table]) + ts_cols
+        ))
+        failed = {r.name: 0 for r in by_table[table]}
+        parsed: Dict[str, Dict[str, int]] = {c: {"null": 0, "invalid": 0} for c in ts_cols}
+        # keys of this table that its own rules look up: complete before the first check
+        self_keys: KeyIndex = {}
+        self_columns = sorted({c for r in by_table[table] for t, c in r.references() if t == table})
+        if self_columns:
+            parts: Dict[str, List[np.ndarray]] = {c: [] for c in self_columns}
+            for chunk in _chunks(tables[table], self_columns, chunksize):
+                for c in self_columns:
+                    parts[c].append(chunk[c].dropna().unique())
+            self_keys = {(table, c): _key_index(p) for c, p in parts.items()}
+        lookup = {**keys, **self_keys}
+        collected: Dict[str, List[np.ndarray]] = {c: [] for c in key_columns[table] if c not in self_columns}
+        rows = 0
+
+        for chunk in _chunks(tables[table], cols, chunksize):
+            rows += len(chunk)
+            if ts_cols:
+                chunk, counts = parse_timestamp_columns(chunk, ts_cols)
+                for c, n in counts.items():
+                    parsed[c]["null"] += n["null"]
+                    parsed[c]["invalid"] += n["invalid"]
+            for c in collected:
+                collected[c].append(chunk[c].dropna().unique())
+            for rule in by_table[table]:
+                failed[rule.name] += rule.check(chunk, lookup)
+
+        for rule in by_table[table]:
+            failed[rule.name] += rule.finish()
+        table_keys = {**self_keys, **{(table, c): _key_index(p) for c, p in collected.items()}}
+        report.seconds[table] = round(time.perf_counter() - start, 3)
+        logging.info("Validated %s: %d rows, %d rules", table, rows, len(by_table[table]))
+        return table, rows, failed, parsed, table_keys
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for level in _scan_order(list(tables), rules):
+            for table, rows, failed, parsed, table_keys in pool.map(scan, level):
+                report.rows[table] = rows
+                if parsed:
+                    report.parse_failures[table] = parsed
+                keys.update(table_keys)
+                for rule in by_table[table]:
+                    report.add(rule, rows, failed[rule.name])
+
+    # Keep the caller's rule order in the report
+    order = {r.name: i for i, r in enumerate(rules)}
+    report.results.sort(key=lambda r: order[r["rule"]])
+    return report